@@ -0,0 +1,20 @@
+import json
+import sys
+
+from mtsssigner.cff_planner import COST_PROFILE_PATH, measure_cost_profile
+from mtsssigner.signature_scheme import SigScheme
+
+# Measures the hashing throughput of this host for every hash function and stores
+# it as the cost profile used by the CFF planner (pre_sign without -k)
+# python calibrate_cff_planner.py [profile path]
+
+HASHES = ["SHA256", "SHA512", "SHA3-256", "SHA3-512", "BLAKE2B", "BLAKE2S"]
+
+if __name__ == '__main__':
+    profile_path = sys.argv[1] if len(sys.argv) > 1 else COST_PROFILE_PATH
+    profiles = {}
+    for hash_function in HASHES:
+        profiles[hash_function] = measure_cost_profile(SigScheme("PKCS#1 v1.5", hash_function))
+        print(hash_function, profiles[hash_function], flush=True)
+    with open(profile_path, "w", encoding="utf-8") as profile_file:
+        json.dump(profiles, profile_file, indent=4)
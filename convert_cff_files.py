@@ -0,0 +1,60 @@
+import glob
+import os
+import sys
+from math import isqrt, log
+
+import numpy
+
+from mtsssigner.cff import CFF, SparseCFF
+from mtsssigner.cff_builder import create_1_cff, create_cff, get_d, get_t_for_1_cff
+from mtsssigner.utils.cff_file_utils import (CFF_DIRECTORY, get_cff_file_path,
+                                             read_cff_from_txt_file, write_cff_to_binary_file)
+from mtsssigner.utils.prime_utils import is_prime_power
+
+
+# Converts the space-separated CFF matrices of the cffs/ store to the binary format
+# python convert_cff_files.py [txt files...] [--remove]
+# Without files, every cffs/*.txt is converted. With --remove, the txt files are
+# deleted after their conversion. The binary file is named after the actual
+# dimensions of the matrix, which may differ from the txt file name.
+
+
+def __same_incidences(cff: SparseCFF, other: CFF) -> bool:
+    other = SparseCFF.from_cff(other)
+    return (cff.n == other.n and cff.t == other.t and
+            numpy.array_equal(cff.block_indptr, other.block_indptr) and
+            numpy.array_equal(cff.block_tests, other.block_tests))
+
+
+# Returns the construction (name, q, k) that generates the given CFF, or ("", 0, 0)
+def detect_construction(cff: SparseCFF):
+    if cff.d == 1 and cff.t == get_t_for_1_cff(cff.n) and __same_incidences(cff, create_1_cff(cff.n)):
+        return "sperner", 0, 0
+    q = isqrt(cff.t)
+    if q ** 2 == cff.t and is_prime_power(q):
+        k = round(log(cff.n, q))
+        if q ** k == cff.n and get_d(q, k) == cff.d > 1 and __same_incidences(cff, create_cff(q, k)):
+            return "polynomial", q, k
+    return "", 0, 0
+
+
+def convert_file(txt_file_path: str) -> str:
+    d = int(os.path.basename(txt_file_path).split("-", 1)[0])
+    cff = read_cff_from_txt_file(txt_file_path, d)
+    construction, q, k = detect_construction(cff)
+    binary_file_path = os.path.join(os.path.dirname(txt_file_path),
+                                    os.path.basename(get_cff_file_path(cff.t, cff.n, cff.d)))
+    write_cff_to_binary_file(cff, binary_file_path, construction, q, k)
+    return binary_file_path
+
+
+if __name__ == '__main__':
+    remove = "--remove" in sys.argv
+    paths = [arg for arg in sys.argv[1:] if arg != "--remove"]
+    if not paths:
+        paths = sorted(glob.glob(os.path.join(CFF_DIRECTORY, "*.txt")))
+    for path in paths:
+        converted_path = convert_file(path)
+        print(f"{path} -> {converted_path}")
+        if remove:
+            os.remove(path)
@@ -0,0 +1,111 @@
+import argparse
+import os
+import sys
+from multiprocessing import Pool
+from timeit import default_timer as timer
+from typing import List, Tuple
+
+from mtsssigner.cff import SparseCFF
+from mtsssigner.cff_builder import create_1_cff, create_cff, get_d, get_t_for_1_cff
+from mtsssigner.utils.cff_file_utils import CFF_DIRECTORY, get_cff_file_path, write_cff_to_binary_file
+from mtsssigner.utils.prime_utils import is_prime_power
+
+# Builds many CFFs across a process pool and writes them to the CFF store, so the
+# cache can be warmed in a single (CI) step. Entries already present are skipped,
+# and each file is written atomically, so an interrupted run can simply be resumed.
+#
+# python generate_cffs.py --q 5,7-13 --k 2-4 --n 4096,32768 --workers 4
+#
+# --q/--k select polynomial CFFs (every prime power q >= k, falling back to the
+# 1-CFF(q^k) when d = 1, just like create_cff), --n selects optimal 1-CFFs.
+# Values are comma separated numbers or inclusive ranges (a-b).
+
+# (construction, q, k, n)
+Entry = Tuple[str, int, int, int]
+
+
+def parse_values(values: str) -> List[int]:
+    result = []
+    for value in values.split(","):
+        if "-" in value:
+            start, end = value.split("-")
+            result.extend(range(int(start), int(end) + 1))
+        elif value:
+            result.append(int(value))
+    return result
+
+
+def get_entries(q_values: List[int], k_values: List[int], n_values: List[int]) -> List[Entry]:
+    entries = []
+    for q in q_values:
+        if not is_prime_power(q):
+            continue
+        for k in k_values:
+            if k < 2 or q < k:
+                continue
+            if get_d(q, k) == 1:
+                entries.append(("sperner", 0, 0, q ** k))
+            else:
+                entries.append(("polynomial", q, k, q ** k))
+    entries.extend(("sperner", 0, 0, n) for n in n_values)
+    # the same 1-CFF may be requested both ways
+    return list(dict.fromkeys(entries))
+
+
+def get_entry_file_path(entry: Entry, directory: str) -> str:
+    construction, q, k, n = entry
+    if construction == "polynomial":
+        return get_cff_file_path(q ** 2, n, get_d(q, k), directory=directory)
+    return get_cff_file_path(get_t_for_1_cff(n), n, 1, directory=directory)
+
+
+# Builds and writes a single entry, returning (file path, status, seconds, size in bytes)
+def build_entry(entry: Entry, directory: str) -> Tuple[str, str, float, int]:
+    file_path = get_entry_file_path(entry, directory)
+    if os.path.exists(file_path):
+        return file_path, "skipped", 0.0, os.path.getsize(file_path)
+    construction, q, k, n = entry
+    try:
+        start = timer()
+        if construction == "polynomial":
+            cff = create_cff(q, k)
+        else:
+            cff = create_1_cff(n)
+        write_cff_to_binary_file(SparseCFF.from_cff(cff), file_path, construction, q, k)
+        end = timer()
+    except Exception as exception:
+        return file_path, f"failed ({exception!r})", 0.0, 0
+    return file_path, "built", end - start, os.path.getsize(file_path)
+
+
+def __build_entry_star(arguments) -> Tuple[str, str, float, int]:
+    return build_entry(*arguments)
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Builds CFFs in parallel and writes them to the CFF store")
+    parser.add_argument("--q", default="", help="q values of polynomial CFFs")
+    parser.add_argument("--k", default="", help="k values of polynomial CFFs")
+    parser.add_argument("--n", default="", help="number of blocks of optimal 1-CFFs")
+    parser.add_argument("--workers", type=int, default=os.cpu_count(), help="size of the process pool")
+    parser.add_argument("--output", default=CFF_DIRECTORY, help="CFF store directory")
+    arguments = parser.parse_args()
+
+    entries = get_entries(parse_values(arguments.q), parse_values(arguments.k), parse_values(arguments.n))
+    os.makedirs(arguments.output, exist_ok=True)
+
+    failures = 0
+    start = timer()
+    with Pool(arguments.workers) as process_pool:
+        for file_path, status, seconds, size in process_pool.imap_unordered(
+                __build_entry_star, [(entry, arguments.output) for entry in entries]):
+            failures += status.startswith("failed")
+            print(f"{file_path}: {status}, {seconds:.3f} s, {size} bytes", flush=True)
+    end = timer()
+
+    print(f"{len(entries)} entries, {failures} failed, {end - start:.3f} s")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
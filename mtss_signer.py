@@ -1,13 +1,17 @@
+import json
 import sys
 import traceback
 from datetime import timedelta
 from timeit import default_timer as timer
-from typing import List, Tuple
+from typing import Any, Callable, List, Tuple
 
-from mtsssigner import logger
+from mtsssigner import cff_cache, digest_matrix, logger
+from mtsssigner.cff_planner import AUTO_GROUP_SIZE
+from mtsssigner.server import serve
 from mtsssigner.signature_scheme import SigScheme, SCHEME_NOT_SUPPORTED
-from mtsssigner.signer import pre_sign, sign_raw
-from mtsssigner.utils.file_and_block_utils import (get_signature_file_path,
+from mtsssigner.signer import pre_sign, pre_sign_stream, sign_raw, sign_stream
+from mtsssigner.utils.file_and_block_utils import (TxtDocument,
+                                                   get_signature_file_path,
                                                    get_correction_file_path,
                                                    write_correction_to_file,
                                                    write_signature_to_file)
@@ -38,13 +42,37 @@ def __print_operation_result(enabled: bool, operation: str, message_file_path: s
         print(f"\nCorrection written to {get_correction_file_path(message_file_path)}")
 
 
+def __get_option_value(option: str) -> str:
+    for argument in sys.argv:
+        if argument.startswith(f"{option}="):
+            return argument[len(option) + 1:]
+    return ""
+
+
+# Signs with the parameters of pre_sign or pre_sign_stream, unmapping the file of
+# the streamed blocks (see get_txt_stream) once signed
+def __sign(sign_file: Callable[..., bytearray], parameters: Tuple[Any, ...]) -> bytearray:
+    try:
+        return sign_file(*parameters)
+    finally:
+        blocks = parameters[1]
+        if isinstance(blocks, TxtDocument):
+            blocks.close()
+
+
 # python mtss_signer.py sign rsa messagepath privkeypath -k number hashfunc
+# python mtss_signer.py sign rsa messagepath privkeypath -s maxsignaturebytes hashfunc
 # python mtss_signer.py sign ed25519 messagepath privkeypath -k number
 # python mtss_signer.py verify rsa messagepath pubkeypath signaturepath hashfunc
 # python mtss_signer.py verify ed25519 messagepath pubkeypath signaturepath
 # python mtss_signer.py verify-correct rsa messagepath pubkeypath signaturepath hashfunc
 # python mtss_signer.py verify-correct ed25519 messagepath pubkeypath signaturepath hashfunc
-# optional --debug or --time-only flag comes last
+# python mtss_signer.py serve rsa address privkeypath -k number hashfunc --public-key=pubkeypath
+# optional --pad, --construction=name, --parameters=json, --group-size=number (or auto) and
+# --in-memory (txt files are otherwise signed as a stream of lines) flags (sign only),
+# the --public-key=path and --server-workers=number (processes handling requests)
+# options (serve only), and the --cff-cache=directory and --workers=number (threads
+# or processes hashing a document) options follow, then the optional --debug or --time-only flag comes last
 
 # If "time only" mode is enabled, the function will print only the total time measurement
 # of the execution. Otherwise, it will print the result of the operation
@@ -58,10 +86,24 @@ if __name__ == '__main__':
     flag = sys.argv[5]
     signature_file_path = sys.argv[5]
     number = sys.argv[6]
-    hash_function = sys.argv[7].upper() if operation == "sign" else sys.argv[6].upper()
+    hash_function = sys.argv[7].upper() if operation in ["sign", "serve"] else sys.argv[6].upper()
     logger.enabled = (sys.argv[-1] == "--debug")
     output_time: bool = (sys.argv[-1] == "--time-only")
+    padding: bool = "--pad" in sys.argv
+    construction: str = __get_option_value("--construction")
+    construction_parameters = __get_option_value("--parameters")
+    construction_parameters = json.loads(construction_parameters) if construction_parameters else None
+    group_size_option = __get_option_value("--group-size")
+    group_size: int = AUTO_GROUP_SIZE if group_size_option == "auto" else int(group_size_option or 0)
+    if __get_option_value("--cff-cache"):
+        cff_cache.cache_directory = __get_option_value("--cff-cache")
+    if __get_option_value("--workers"):
+        digest_matrix.workers = int(__get_option_value("--workers"))
     print_results: bool = not output_time
+    # txt files are streamed from disk, unless --in-memory is given
+    streaming: bool = message_file_path.endswith(".txt") and "--in-memory" not in sys.argv
+    pre_sign_file = pre_sign_stream if streaming else pre_sign
+    sign_file = sign_stream if streaming else sign_raw
 
     try:
         if sig_algorithm.lower() == "rsa":
@@ -81,8 +123,17 @@ if __name__ == '__main__':
             number = int(number)
             if flag == "-k":
                 start = timer()
-                parameters = pre_sign(sig_scheme, message_file_path, key_file_path, number)
-                signature = sign_raw(*parameters)
+                parameters = pre_sign_file(sig_scheme, message_file_path, key_file_path, number, padding=padding,
+                                           construction=construction, parameters=construction_parameters,
+                                           group_size=group_size)
+                signature = __sign(sign_file, parameters)
+                end = timer()
+            elif flag == "-s":
+                start = timer()
+                parameters = pre_sign_file(sig_scheme, message_file_path, key_file_path, max_size_bytes=number,
+                                           padding=padding, construction=construction,
+                                           parameters=construction_parameters, group_size=group_size)
+                signature = __sign(sign_file, parameters)
                 end = timer()
             else:
                 raise ValueError("Invalid option for sign operation (must be '-s' or '-k')")
@@ -110,8 +161,19 @@ if __name__ == '__main__':
                 __print_operation_result(print_results, operation, message_file_path, result)
             elif len(result[1]) > 0:
                 print(f"\nFile {message_file_path} could not be corrected")
+        elif operation == "serve":
+            # message_file_path is the address of the server (a socket path or host:port)
+            if flag not in ["-k", "-s"]:
+                raise ValueError("Invalid option for serve operation (must be '-s' or '-k')")
+            number = int(number)
+            start = timer()
+            serve(sig_scheme, message_file_path, key_file_path, __get_option_value("--public-key"),
+                  int(__get_option_value("--server-workers") or 0), k=number if flag == "-k" else 0,
+                  max_size_bytes=number if flag == "-s" else 0, padding=padding, construction=construction,
+                  parameters=construction_parameters, group_size=group_size)
+            end = timer()
         else:
-            raise ValueError("Unsupported operation (must be 'sign', 'verify' or 'verify-correct')")
+            raise ValueError("Unsupported operation (must be 'sign', 'verify', 'verify-correct' or 'serve')")
         if output_time:
             print(end - start)
         logger.log_execution_end(timedelta(seconds=end - start))
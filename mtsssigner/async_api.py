@@ -0,0 +1,153 @@
+import asyncio
+import threading
+from concurrent.futures import CancelledError, Executor, ThreadPoolExecutor
+from typing import Any, Callable, List, Set, Tuple, TypeVar, Union
+
+from mtsssigner.server import (create_worker_executor, sign_in_worker, start_workers, verification_lock,
+                               verify_in_worker)
+from mtsssigner.signature_scheme import SigScheme
+from mtsssigner.utils.file_and_block_utils import get_signature_file_path
+from mtsssigner.verifier import pre_verify, verify_and_correct, verify_raw
+
+# asyncio API of the signer and verifier. An AsyncSigningPool keeps the keys, the
+# signing context and the CFFs loaded in a bounded pool of workers (the workers of
+# the signing server, see mtsssigner/server.py), which read the files and do the
+# hashing and the asymmetric operations, so the event loop is never blocked. At
+# most max_pending requests are submitted to the workers at once; the others wait
+# for a free slot (backpressure). Cancelling a request that has not started yet
+# removes it, and cancelling a correction (or closing the pool) stops its search
+# and its processes.
+#
+# The verifier keeps the state of a verification in module variables, so the
+# corrections and in-process verifications of every pool of a process run one at
+# a time (see server.verification_lock): a correction of a pool waits for those
+# of the other pools, and a correction cancelled while waiting does not start.
+#
+#     async with AsyncSigningPool(sig_scheme, private_key_path, public_key_path, k=2) as pool:
+#         signature = await pool.sign_file("document.txt")
+#         valid, modified_blocks = await pool.verify_file("document.txt", "document_signature.mts")
+
+# pending requests per worker, by default
+PENDING_REQUESTS_PER_WORKER = 4
+# seconds between checks of the cancellation of a correction waiting for the verifier
+VERIFICATION_LOCK_POLL_SECONDS = 0.1
+
+Result = TypeVar("Result")
+
+
+class AsyncSigningPool:
+    sig_scheme: SigScheme
+    private_key_path: str
+    public_key_path: str
+    workers: int
+    max_pending: int
+
+    # options are those of sign (k, max_size_bytes, target_d, padding, construction,
+    # parameters, group_size). workers defaults to one process per core; a single
+    # worker is a thread of the calling process.
+    def __init__(self, sig_scheme: SigScheme, private_key_path: str = "", public_key_path: str = "",
+                 workers: int = 0, max_pending: int = 0, **options: Any):
+        self.sig_scheme = sig_scheme
+        self.private_key_path = private_key_path
+        self.public_key_path = public_key_path
+        self.workers = workers
+        self.max_pending = max_pending
+        self.options = options
+        self.__executor: Union[Executor, None] = None
+        self.__correction_executor: Union[Executor, None] = None
+        self.__pending: Union[asyncio.Semaphore, None] = None
+        self.__public_key: Any = None
+        # cancellation events of the running corrections, set when the pool closes
+        self.__corrections: Set[threading.Event] = set()
+
+    # Starts the workers, which load the keys
+    async def start(self) -> None:
+        if self.__executor is not None:
+            return
+        executor, self.workers = create_worker_executor(self.sig_scheme, self.private_key_path,
+                                                        self.public_key_path, self.workers, self.options)
+        try:
+            await start_workers(executor, self.workers)
+            # corrections run in this process, which owns their process pool, one at a time
+            self.__correction_executor = executor if self.workers == 1 else ThreadPoolExecutor(1)
+            if self.public_key_path:
+                self.__public_key = await asyncio.get_running_loop().run_in_executor(
+                    self.__correction_executor, self.sig_scheme.get_public_key, self.public_key_path)
+        except BaseException:
+            executor.shutdown(wait=False, cancel_futures=True)
+            raise
+        self.max_pending = self.max_pending or self.workers * PENDING_REQUESTS_PER_WORKER
+        self.__pending = asyncio.Semaphore(self.max_pending)
+        self.__executor = executor
+
+    # Signs a file, given by its path
+    async def sign_file(self, message_file_path: str) -> bytes:
+        return await self.__submit(sign_in_worker, message_file_path)
+
+    # Signs the content of a txt or xml message
+    async def sign(self, content: str, file_type: str = "txt") -> bytes:
+        return await self.__submit(sign_in_worker, content, file_type)
+
+    # Verifies a file and localizes its modified blocks (see verify); the signature
+    # is read from the default signature path when not given
+    async def verify_file(self, message_file_path: str, signature_file_path: str = "") -> Tuple[bool, List[int]]:
+        return await self.__submit(verify_in_worker, message_file_path, signature_file_path)
+
+    async def verify(self, content: str, signature: bytes, file_type: str = "txt") -> Tuple[bool, List[int]]:
+        return await self.__submit(verify_in_worker, content, bytes(signature), file_type)
+
+    # Verifies a file, localizes and corrects its modified blocks (see verify_and_correct)
+    async def verify_and_correct(self, message_file_path: str,
+                                 signature_file_path: str = "") -> Tuple[bool, List[int], str]:
+        cancelled = threading.Event()
+        self.__corrections.add(cancelled)
+        try:
+            return await self.__submit(self.__verify_and_correct, message_file_path,
+                                       signature_file_path or get_signature_file_path(message_file_path), cancelled,
+                                       executor=self.__correction_executor)
+        except asyncio.CancelledError:
+            cancelled.set()
+            raise
+        finally:
+            self.__corrections.discard(cancelled)
+
+    # Stops the workers; requests not started yet are cancelled, and so are the
+    # running corrections, which would keep their processes busy otherwise
+    async def close(self) -> None:
+        if self.__executor is None:
+            return
+        for cancelled in self.__corrections:
+            cancelled.set()
+        executor, correction_executor = self.__executor, self.__correction_executor
+        self.__executor = self.__correction_executor = None
+        for pool in {executor, correction_executor}:
+            pool.shutdown(wait=False, cancel_futures=True)
+
+    async def __aenter__(self) -> "AsyncSigningPool":
+        await self.start()
+        return self
+
+    async def __aexit__(self, *exception) -> None:
+        await self.close()
+
+    async def __submit(self, function: Callable[..., Result], *arguments: Any,
+                       executor: Union[Executor, None] = None) -> Result:
+        if self.__executor is None:
+            raise RuntimeError("The pool is not started")
+        async with self.__pending:
+            return await asyncio.get_running_loop().run_in_executor(executor or self.__executor, function,
+                                                                    *arguments)
+
+    def __verify_and_correct(self, message_file_path: str, signature_file_path: str,
+                             cancelled: threading.Event) -> Tuple[bool, List[int], str]:
+        if self.__public_key is None:
+            raise ValueError("The pool has no public key")
+        while not verification_lock.acquire(timeout=VERIFICATION_LOCK_POLL_SECONDS):
+            if cancelled.is_set():
+                raise CancelledError("The correction was cancelled")
+        try:
+            result = verify_raw(*pre_verify(message_file_path, signature_file_path, self.sig_scheme,
+                                            self.public_key_path, self.__public_key))
+            return verify_and_correct(result, self.sig_scheme, message_file_path, cancelled)
+        finally:
+            verification_lock.release()
@@ -0,0 +1,173 @@
+import multiprocessing
+import os
+from itertools import islice
+from typing import Any, Dict, Hashable, Iterable, Iterator, List, NamedTuple, Tuple, Union
+
+from mtsssigner import cff_cache, digest_matrix
+from mtsssigner.digest_memo import DigestMemo
+from mtsssigner.signature_header import encode_signature_header, split_signature_header
+from mtsssigner.signature_scheme import SigScheme
+from mtsssigner.signer import Signer
+from mtsssigner.utils.file_and_block_utils import get_signature_file_path, write_signature_to_file
+from mtsssigner.verifier import pre_verify, verify_raw
+
+# Bulk signing and verification of many files in one process pool, instead of one
+# process per file paying interpreter startup, imports, key parsing and CFF loading.
+# Every worker loads the key once and keeps a Signer (or the public key), the CFFs
+# (shared through the CFF cache and its memory-mapped files) and a memo of block
+# digests across its files. Files are grouped by size (signing) or by signature
+# layout (verification), so the files of a task usually share their CFF, and the
+# results are yielded in completion order. An error in a file is reported in its
+# result and does not abort the batch.
+
+# Files of a task, handled by a worker at once
+FILES_PER_TASK = 8
+# Files read ahead from the iterable of paths to group them
+GROUPING_WINDOW_FILES = 1024
+
+
+# Result of a file: the signature (sign_many) or the verification result, a
+# (valid, modified blocks) tuple (verify_many), or the error raised for the file
+class BatchResult(NamedTuple):
+    path: str
+    result: Any
+    error: Union[str, None] = None
+
+
+# (operation, scheme, signer or public key, options) of a batch worker
+batch_worker: Union[Tuple[str, SigScheme, Any, Dict[str, Any]], None] = None
+# error raised while starting a batch worker, reported in the results of its files
+batch_worker_error: Union[str, None] = None
+
+
+# Signs the files, writing their signatures next to them (see write_signature_to_file)
+# unless write_signatures is False. options are those of sign (k, max_size_bytes,
+# target_d, padding, construction, parameters, group_size). workers defaults to one
+# per core; with a single worker, files are signed in the calling process.
+def sign_many(sig_scheme: SigScheme, message_file_paths: Iterable[str], private_key_path: str,
+              workers: int = 0, write_signatures: bool = True, **options: Any) -> Iterator[BatchResult]:
+    return __run("sign", sig_scheme, message_file_paths, private_key_path, workers,
+                 dict(options, write_signatures=write_signatures))
+
+
+# Verifies the files, given by their paths (their signatures are read from the
+# default signature path) or by (message path, signature path) tuples
+def verify_many(sig_scheme: SigScheme, message_file_paths: Iterable[Union[str, Tuple[str, str]]],
+                public_key_path: str, workers: int = 0) -> Iterator[BatchResult]:
+    return __run("verify", sig_scheme, message_file_paths, public_key_path, workers, {})
+
+
+# The key is loaded in the calling process first, so a missing or invalid key
+# raises at once instead of failing every worker of the pool
+def __run(operation: str, sig_scheme: SigScheme, paths: Iterable[Union[str, Tuple[str, str]]], key_path: str,
+          workers: int, options: Dict[str, Any]) -> Iterator[BatchResult]:
+    workers = workers or os.cpu_count() or 1
+    initargs = (operation, sig_scheme.sig_algorithm, sig_scheme.hash_function, key_path, options,
+                cff_cache.cache_directory, workers > 1)
+    if workers == 1:
+        __init_batch_worker(*initargs)
+    elif operation == "sign":
+        Signer(sig_scheme, key_path, **__get_signer_options(options))
+    else:
+        sig_scheme.get_public_key(key_path)
+    return __run_tasks(__get_tasks(operation, paths), workers, initargs)
+
+
+def __run_tasks(tasks: Iterator[List[Any]], workers: int, initargs: Tuple[Any, ...]) -> Iterator[BatchResult]:
+    if workers == 1:
+        for task in tasks:
+            yield from __run_task(task)
+        return
+    # workers are spawned, keeping the (not fork-safe) JIT state of galois out
+    context = multiprocessing.get_context("spawn")
+    with context.Pool(workers, initializer=__init_batch_worker, initargs=initargs) as process_pool:
+        for results in process_pool.imap_unordered(__run_task, tasks):
+            yield from results
+
+
+# Groups the paths of every window of files by the key of their CFF and splits
+# the groups into tasks
+def __get_tasks(operation: str, paths: Iterable[Union[str, Tuple[str, str]]]) -> Iterator[List[Any]]:
+    paths = iter(paths)
+    while True:
+        window = list(islice(paths, GROUPING_WINDOW_FILES))
+        if not window:
+            return
+        groups: Dict[Hashable, List[Any]] = {}
+        for path in window:
+            groups.setdefault(__get_group_key(operation, path), []).append(path)
+        for group in groups.values():
+            for start in range(0, len(group), FILES_PER_TASK):
+                yield group[start:start + FILES_PER_TASK]
+
+
+# Files signed with the same options share their CFF when they have as many blocks,
+# which files of the same size (e.g. filled from the same template) often have;
+# blocks are not counted here, which would read every file once more. Signatures
+# share their CFF when they have the same size and header.
+def __get_group_key(operation: str, path: Union[str, Tuple[str, str]]) -> Hashable:
+    try:
+        if operation == "sign":
+            return os.path.getsize(path)
+        _, signature_file_path = __get_verification_paths(path)
+        with open(signature_file_path, "rb") as signature_file:
+            signature = signature_file.read()
+        metadata, _ = split_signature_header(signature)
+        return len(signature), encode_signature_header(metadata) if metadata else b""
+    except OSError:
+        # reported by the worker
+        return None
+
+
+def __get_verification_paths(path: Union[str, Tuple[str, str]]) -> Tuple[str, str]:
+    if isinstance(path, str):
+        return path, get_signature_file_path(path)
+    return path
+
+
+def __init_batch_worker(operation: str, sig_algorithm: str, hash_function: str, key_path: str,
+                        options: Dict[str, Any], cache_directory: str, in_pool: bool) -> None:
+    global batch_worker, batch_worker_error
+    try:
+        sig_scheme = SigScheme(sig_algorithm, hash_function)
+        if in_pool:
+            cff_cache.cache_directory = cache_directory
+            # files are already hashed in parallel, one per worker
+            digest_matrix.workers = 1
+            digest_matrix.shared_memo = DigestMemo()
+        if operation == "sign":
+            batch_worker = (operation, sig_scheme, Signer(sig_scheme, key_path, **__get_signer_options(options)),
+                            options)
+        else:
+            batch_worker = (operation, sig_scheme, (sig_scheme.get_public_key(key_path), key_path), options)
+    except Exception as exception:
+        if not in_pool:
+            raise
+        # the pool would start a new worker, failing again, for ever
+        batch_worker_error = repr(exception)
+
+
+def __get_signer_options(options: Dict[str, Any]) -> Dict[str, Any]:
+    return {option: value for option, value in options.items() if option != "write_signatures"}
+
+
+def __run_task(paths: List[Union[str, Tuple[str, str]]]) -> List[BatchResult]:
+    if batch_worker_error is not None:
+        return [BatchResult(path, None, batch_worker_error) for path in paths]
+    operation, sig_scheme, key, options = batch_worker
+    results = []
+    for path in paths:
+        try:
+            if operation == "sign":
+                signature = key.sign_file(path)
+                if options["write_signatures"]:
+                    write_signature_to_file(signature, path)
+                results.append(BatchResult(path, signature))
+            else:
+                public_key, public_key_path = key
+                message_file_path, signature_file_path = __get_verification_paths(path)
+                results.append(BatchResult(path, verify_raw(*pre_verify(
+                    message_file_path, signature_file_path, sig_scheme, public_key_path, public_key))))
+        except Exception as exception:
+            results.append(BatchResult(path, None, repr(exception)))
+    return results
@@ -0,0 +1,152 @@
+from typing import List, Tuple
+
+import numpy
+
+# Contains the in-memory representations of CFFs used by the signer and verifier.
+
+
+# Returns the smallest unsigned dtype able to index t tests
+def get_test_index_dtype(t: int) -> numpy.dtype:
+    return numpy.dtype(numpy.uint16) if t <= numpy.iinfo(numpy.uint16).max + 1 else numpy.dtype(numpy.int32)
+
+
+# Interface shared by every CFF representation. A d-CFF(t, n) only has to answer which
+# blocks belong to a test and which tests contain a block; implementations are free to
+# keep the incidences in memory or to compute them on demand.
+class CFF:
+    __slots__ = ("t", "n", "d")
+
+    t: int
+    n: int
+    d: int
+
+    # Returns the indexes of the blocks contained in test i, in ascending order
+    def blocks_of_test(self, i: int) -> numpy.ndarray:
+        raise NotImplementedError
+
+    # Returns the indexes of the tests that contain block b, in ascending order
+    def tests_of_block(self, b: int) -> numpy.ndarray:
+        raise NotImplementedError
+
+    # Returns the tests of blocks start to end - 1 in CSR form (indptr, tests): the
+    # tests of block start + b are tests[indptr[b]:indptr[b + 1]]
+    def tests_of_blocks(self, start: int, end: int) -> Tuple[numpy.ndarray, numpy.ndarray]:
+        tests_of_blocks = [numpy.asarray(self.tests_of_block(b), dtype=numpy.int64) for b in range(start, end)]
+        indptr = numpy.zeros(len(tests_of_blocks) + 1, dtype=numpy.int64)
+        numpy.cumsum([len(tests) for tests in tests_of_blocks], out=indptr[1:])
+        tests = numpy.concatenate(tests_of_blocks) if tests_of_blocks else numpy.zeros(0, dtype=numpy.int64)
+        return indptr, tests
+
+    # Returns the dense incidence matrix, as previously used throughout the project
+    def to_dense(self) -> List[List[int]]:
+        matrix = numpy.zeros((self.t, self.n), dtype=numpy.int8)
+        for test in range(self.t):
+            matrix[test, self.blocks_of_test(test)] = 1
+        return matrix.tolist()
+
+    # Number of bytes held in memory by the representation
+    @property
+    def nbytes(self) -> int:
+        return 0
+
+    def __len__(self) -> int:
+        return self.t
+
+    def __repr__(self) -> str:
+        return f"{type(self).__name__}({self.d}-CFF({self.t}, {self.n}))"
+
+
+# Compact d-CFF(t, n) that stores only the incidences of the matrix. The incidences
+# are kept twice in CSR form: the blocks of every test (row view, used to build the
+# tests) and the tests of every block (column view, used to localize and correct),
+# so both lookups cost the number of incidences instead of t * n cells.
+class SparseCFF(CFF):
+    __slots__ = ("test_indptr", "test_blocks", "block_indptr", "block_tests")
+
+    test_indptr: numpy.ndarray
+    test_blocks: numpy.ndarray
+    block_indptr: numpy.ndarray
+    block_tests: numpy.ndarray
+
+    def __init__(self, t: int, n: int, d: int, block_indptr: numpy.ndarray, block_tests: numpy.ndarray):
+        self.t = t
+        self.n = n
+        self.d = d
+        self.block_indptr = numpy.ascontiguousarray(block_indptr, dtype=numpy.int64)
+        self.block_tests = numpy.ascontiguousarray(block_tests, dtype=get_test_index_dtype(t))
+
+        # the stable sort keeps the blocks of each test in ascending order
+        block_of_incidence = numpy.repeat(numpy.arange(n, dtype=numpy.int32), numpy.diff(self.block_indptr))
+        order = numpy.argsort(self.block_tests, kind="stable")
+        self.test_blocks = block_of_incidence[order]
+        self.test_indptr = numpy.zeros(t + 1, dtype=numpy.int64)
+        numpy.cumsum(numpy.bincount(self.block_tests, minlength=t), out=self.test_indptr[1:])
+
+    # Builds the CFF from both CSR views without copying them, e.g. from a memory-mapped file
+    @classmethod
+    def from_arrays(cls, t: int, n: int, d: int, test_indptr: numpy.ndarray, test_blocks: numpy.ndarray,
+                    block_indptr: numpy.ndarray, block_tests: numpy.ndarray) -> "SparseCFF":
+        cff = cls.__new__(cls)
+        cff.t = t
+        cff.n = n
+        cff.d = d
+        cff.test_indptr = test_indptr
+        cff.test_blocks = test_blocks
+        cff.block_indptr = block_indptr
+        cff.block_tests = block_tests
+        return cff
+
+    # Materializes the incidences of any CFF, e.g. to write it to a file
+    @classmethod
+    def from_cff(cls, cff: CFF) -> "SparseCFF":
+        if isinstance(cff, SparseCFF):
+            return cff
+        test_blocks = [numpy.asarray(cff.blocks_of_test(test), dtype=numpy.int64) for test in range(cff.t)]
+        blocks = numpy.concatenate(test_blocks) if test_blocks else numpy.zeros(0, dtype=numpy.int64)
+        tests = numpy.repeat(numpy.arange(cff.t), [len(test) for test in test_blocks])
+        order = numpy.argsort(blocks, kind="stable")
+        block_indptr = numpy.zeros(cff.n + 1, dtype=numpy.int64)
+        numpy.cumsum(numpy.bincount(blocks, minlength=cff.n), out=block_indptr[1:])
+        return cls(cff.t, cff.n, cff.d, block_indptr, tests[order])
+
+    # Builds the CFF from a (n, c) matrix, where row b holds the c tests of block b
+    @classmethod
+    def from_block_tests(cls, t: int, n: int, d: int, block_tests: numpy.ndarray) -> "SparseCFF":
+        tests_per_block = block_tests.shape[1]
+        block_indptr = numpy.arange(n + 1, dtype=numpy.int64) * tests_per_block
+        return cls(t, n, d, block_indptr, numpy.sort(block_tests, axis=1).ravel())
+
+    # Builds the CFF from a dense (t, n) incidence matrix
+    @classmethod
+    def from_dense(cls, matrix, d: int) -> "SparseCFF":
+        matrix = numpy.asarray(matrix)
+        t, n = matrix.shape
+        blocks, tests = numpy.nonzero(matrix.T)
+        block_indptr = numpy.zeros(n + 1, dtype=numpy.int64)
+        numpy.cumsum(numpy.bincount(blocks, minlength=n), out=block_indptr[1:])
+        return cls(t, n, d, block_indptr, tests)
+
+    # Returns the indexes of the blocks contained in test i, in ascending order
+    def blocks_of_test(self, i: int) -> numpy.ndarray:
+        return self.test_blocks[self.test_indptr[i]:self.test_indptr[i + 1]]
+
+    # Returns the indexes of the tests that contain block b, in ascending order
+    def tests_of_block(self, b: int) -> numpy.ndarray:
+        return self.block_tests[self.block_indptr[b]:self.block_indptr[b + 1]]
+
+    def tests_of_blocks(self, start: int, end: int) -> Tuple[numpy.ndarray, numpy.ndarray]:
+        indptr = self.block_indptr[start:end + 1]
+        return indptr - indptr[0], self.block_tests[indptr[0]:indptr[-1]]
+
+    # Returns the dense incidence matrix, as previously used throughout the project
+    def to_dense(self) -> List[List[int]]:
+        matrix = numpy.zeros((self.t, self.n), dtype=numpy.int8)
+        blocks = numpy.repeat(numpy.arange(self.n), numpy.diff(self.block_indptr))
+        matrix[self.block_tests, blocks] = 1
+        return matrix.tolist()
+
+    # Number of bytes held by the index arrays
+    @property
+    def nbytes(self) -> int:
+        return (self.test_indptr.nbytes + self.test_blocks.nbytes +
+                self.block_indptr.nbytes + self.block_tests.nbytes)
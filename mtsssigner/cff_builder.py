@@ -1,37 +1,33 @@
 import itertools
 from math import sqrt, log, comb
-from typing import List
+from typing import Tuple
 
 import galois
 import numpy
 from galois import FieldArray
-from numpy.polynomial import Polynomial
 from sympy import factorint
 
 from mtsssigner import logger
-from mtsssigner.utils.math_utils import get_all_polynomials_with_deg_up_to_k
+from mtsssigner.cff import CFF, SparseCFF
+from mtsssigner.utils.math_utils import get_polynomial_coefficient_matrix, get_vandermonde_matrix
 from mtsssigner.utils.prime_utils import is_prime_power
 
 
 # Creates either a 1-CFF or a polynomial d-CFF, according to the obtainable
 # amount of max modifiable blocks (d) provided by the parameters q and k.
-def create_cff(q: int, k: int) -> List[List[int]]:
+def create_cff(q: int, k: int) -> CFF:
     d: int = get_d(q, k)
     if d == 1 or k < 2:
         return create_1_cff(q ** k)
     return __create_polynomial_cff(q, k)
 
 
-# Creates an 1-CFF with the minimum amount of
-# tests possible (using Sperner set systems)
-def create_1_cff(n: int) -> List[List[int]]:
-    t: int = get_t_for_1_cff(n)
-    tests: List[list] = __get_1_cff_columns(t)
-    cff = numpy.zeros((t, n), dtype=int)
-    for block in range(n):
-        for incidence in tests[block]:
-            cff[incidence][block] = 1
-    return cff.tolist()
+# Creates an 1-CFF with the minimum amount of tests possible (using Sperner
+# set systems). The CFF is lazy: its columns are computed on demand by
+# (un)ranking floor(t/2)-subsets, so nothing proportional to n is built.
+# SparseCFF.from_cff materializes it when the index arrays are needed.
+def create_1_cff(n: int) -> CFF:
+    return SpernerCFF(n)
 
 
 # Returns the number of tests required for building
@@ -53,13 +49,6 @@ def get_t_for_1_cff(n: int) -> int:
             return index
 
 
-# Returns the columns of an optimal 1-CFF, built using every
-# combination of floor(t/2) elements each from the column
-def __get_1_cff_columns(t: int) -> List[int]:
-    result = itertools.combinations(range(t), int(numpy.floor(t / 2)))
-    return list(result)
-
-
 # Creates a d-CFF(q^2, q^k) using a polynomial construction.
 # Considering its construction, q must be a prime power and k must
 # be equal or bigger than 2, and k cannot not be bigger than q. If k = 2,
@@ -67,7 +56,7 @@ def __get_1_cff_columns(t: int) -> List[int]:
 # final signed document, compared to hashing each block individually,
 # considering the resulting signature size. If q = k, the polynomial
 # 1-CFF is less eficient in size than an optimal 1-CFF.
-def __create_polynomial_cff(q: int, k: int) -> List[List[int]]:
+def __create_polynomial_cff(q: int, k: int) -> SparseCFF:
     if not is_prime_power(q):
         raise ValueError("For polynomial CFFs, q must be a prime power")
     if not k >= 2:
@@ -75,31 +64,266 @@ def __create_polynomial_cff(q: int, k: int) -> List[List[int]]:
     if not q >= k:
         raise ValueError("For polynomial CFFs, q must be bigger than k")
 
+    incidences = get_polynomial_cff_incidences(q, k)
+    return SparseCFF.from_block_tests(q ** 2, q ** k, get_d(q, k), incidences)
+
+
+# Returns the incidence structure of the polynomial d-CFF(q^2, q^k) as a
+# (q^k, q) matrix, where row b holds the q tests that contain block b.
+# Block b is the polynomial whose coefficients are the base-q digits of b and
+# test x*q + y is the point (x, y) of GF(q)^2, so block b belongs to test
+# x*q + poly_b(x) for every x. All polynomials are evaluated at every field
+# element at once by multiplying the coefficient matrix by a Vandermonde matrix.
+def get_polynomial_cff_incidences(q: int, k: int) -> numpy.ndarray:
     finite_field: FieldArray = galois.GF(q)
-    b_set = __get_b_set(finite_field, k)
-    x_set = __get_x_set(finite_field)
+    coefficients: FieldArray = get_polynomial_coefficient_matrix(finite_field, k)
+    evaluations: FieldArray = coefficients @ get_vandermonde_matrix(finite_field, k)
+    x_offsets = numpy.arange(q, dtype=numpy.int64) * q
+    return evaluations.view(numpy.ndarray).astype(numpy.int64) + x_offsets
+
+
+# Creates a CFF equivalent to create_cff(q, k) that computes its incidences on
+# demand, so no matrix is built in memory nor read from a file
+def create_implicit_cff(q: int, k: int) -> CFF:
+    d: int = get_d(q, k)
+    if d == 1 or k < 2:
+        return create_1_cff(q ** k)
+    return PolynomialCFF(q, k)
+
+
+# Polynomial d-CFF(q^2, q^k) whose incidences are computed arithmetically. Block b
+# is the polynomial whose coefficients are the base-q digits of b (highest degree
+# first), and it belongs to test x*q + y exactly when poly_b(x) == y over GF(q).
+# This is a Reed-Solomon code concatenated with the identity code (Kautz-Singleton):
+# evaluating only at the first m field elements and keeping only the first n
+# polynomials gives a d-CFF(m*q, n) with d = floor((m-1)/(k-1)), since two
+# polynomials of degree < k agree on at most k-1 points.
+class PolynomialCFF(CFF):
+    __slots__ = ("q", "k", "m", "field", "place_values", "vandermonde", "x_offsets")
+
+    def __init__(self, q: int, k: int, m: int = 0, n: int = 0):
+        if not is_prime_power(q):
+            raise ValueError("For polynomial CFFs, q must be a prime power")
+        if not k >= 2:
+            raise ValueError("For polynomial CFFs, k must be >=2")
+        if not q >= k:
+            raise ValueError("For polynomial CFFs, q must be bigger than k")
+        m = m if m > 0 else q
+        n = n if n > 0 else q ** k
+        if not k <= m <= q:
+            raise ValueError("For polynomial CFFs, the number of points m must be between k and q")
+        if not n <= q ** k:
+            raise ValueError(f"A polynomial CFF with q = {q} and k = {k} has at most q^k blocks")
+        self.t = m * q
+        self.n = n
+        self.d = get_reed_solomon_d(k, m)
+        self.q = q
+        self.k = k
+        self.m = m
+        self.field = galois.GF(q)
+        self.place_values = q ** numpy.arange(k - 1, -1, -1, dtype=numpy.int64)
+        self.vandermonde = get_vandermonde_matrix(self.field, k)[:, :m]
+        self.x_offsets = numpy.arange(m, dtype=numpy.int64) * q
+
+    # The m tests of block b are (x, poly_b(x)) for the first m elements x of GF(q)
+    def tests_of_block(self, b: int) -> numpy.ndarray:
+        coefficients = self.field((b // self.place_values) % self.q)
+        evaluations = coefficients @ self.vandermonde
+        return evaluations.view(numpy.ndarray).astype(numpy.int64) + self.x_offsets
+
+    # Every block is in m tests, evaluated for all blocks at once
+    def tests_of_blocks(self, start: int, end: int) -> Tuple[numpy.ndarray, numpy.ndarray]:
+        blocks = numpy.arange(start, end, dtype=numpy.int64)
+        coefficients = self.field((blocks[:, None] // self.place_values) % self.q)
+        evaluations = (coefficients @ self.vandermonde).view(numpy.ndarray).astype(numpy.int64) + self.x_offsets
+        return numpy.arange(len(blocks) + 1, dtype=numpy.int64) * self.m, evaluations.ravel()
+
+    # The blocks of test (x, y) are the q^(k-1) polynomials whose constant
+    # coefficient equals y minus the evaluation of their other terms at x
+    def blocks_of_test(self, i: int) -> numpy.ndarray:
+        x, y = divmod(i, self.q)
+        higher_coefficients = get_polynomial_coefficient_matrix(self.field, self.k - 1)
+        higher_terms = higher_coefficients @ self.vandermonde[:-1, x]
+        constant_coefficients = self.field(y) - higher_terms
+        prefixes = numpy.arange(self.q ** (self.k - 1), dtype=numpy.int64) * self.q
+        blocks = prefixes + constant_coefficients.view(numpy.ndarray)
+        return blocks if self.n == self.q ** self.k else blocks[blocks < self.n]
+
+    @property
+    def nbytes(self) -> int:
+        return self.place_values.nbytes + self.vandermonde.nbytes + self.x_offsets.nbytes
+
+
+# Optimal 1-CFF(t, n) built from a Sperner set system whose incidences are
+# computed on demand: column b is the b-th floor(t/2)-subset of the t tests, in
+# the lexicographic order produced by itertools.combinations. Columns are found
+# with the combinatorial number system: choosing c as the j-th element of a
+# subset skips comb(t-c'-1, w-j-1) subsets for every smaller candidate c'.
+class SpernerCFF(CFF):
+    __slots__ = ("weight", "skipped_subsets")
 
-    cff_dimensions = (q ** 2, q ** k)
-    cff = numpy.zeros(cff_dimensions, dtype=int)
+    def __init__(self, n: int):
+        self.t = get_t_for_1_cff(n)
+        self.n = n
+        self.d = 1
+        self.weight = int(numpy.floor(self.t / 2))
+        # skipped_subsets[j][a] = number of subsets skipped by choosing a as the
+        # j-th element, counting candidates from 0 (sum of comb(t-c-1, w-j-1), c < a)
+        self.skipped_subsets = numpy.zeros((self.weight, self.t + 1), dtype=numpy.int64)
+        for j in range(self.weight):
+            for a in range(self.t):
+                self.skipped_subsets[j][a + 1] = (self.skipped_subsets[j][a] +
+                                                  comb(self.t - a - 1, self.weight - j - 1))
 
-    for test in range(cff_dimensions[0]):
-        for block in range(cff_dimensions[1]):
-            if b_set[block](x_set[test][0]) == x_set[test][1]:
-                cff[test][block] = 1
+    # Unranks b into its floor(t/2)-subset of tests
+    def tests_of_block(self, b: int) -> numpy.ndarray:
+        if not 0 <= b < self.n:
+            raise IndexError(f"Block {b} out of range for {self}")
+        tests = []
+        candidate = 0
+        for j in range(self.weight):
+            remaining = self.weight - j - 1
+            while comb(self.t - candidate - 1, remaining) <= b:
+                b -= comb(self.t - candidate - 1, remaining)
+                candidate += 1
+            tests.append(candidate)
+            candidate += 1
+        return numpy.array(tests, dtype=numpy.int64)
 
-    return cff.tolist()
+    # Unranks all blocks at once: the j-th element of every subset is the first
+    # candidate after the (j-1)-th whose skipped subsets exceed the remaining rank
+    def tests_of_blocks(self, start: int, end: int) -> Tuple[numpy.ndarray, numpy.ndarray]:
+        ranks = numpy.arange(start, end, dtype=numpy.int64)
+        tests = numpy.zeros((len(ranks), self.weight), dtype=numpy.int64)
+        first_candidates = numpy.zeros(len(ranks), dtype=numpy.int64)
+        for j in range(self.weight):
+            skipped_before = self.skipped_subsets[j][first_candidates]
+            tests[:, j] = numpy.searchsorted(self.skipped_subsets[j], ranks + skipped_before, side="right") - 1
+            ranks -= self.skipped_subsets[j][tests[:, j]] - skipped_before
+            first_candidates = tests[:, j] + 1
+        return numpy.arange(len(ranks) + 1, dtype=numpy.int64) * self.weight, tests.ravel()
 
+    # Ranks every floor(t/2)-subset that contains test i and keeps those below n
+    def blocks_of_test(self, i: int) -> numpy.ndarray:
+        if self.weight == 0:
+            return numpy.zeros(0, dtype=numpy.int64)
+        other_tests = [test for test in range(self.t) if test != i]
+        other_subsets = list(itertools.combinations(other_tests, self.weight - 1))
+        subsets = numpy.array(other_subsets, dtype=numpy.int64).reshape((len(other_subsets), self.weight - 1))
+        subsets = numpy.sort(numpy.column_stack([subsets, numpy.full(len(subsets), i)]), axis=1)
+        blocks = self.rank(subsets)
+        return numpy.sort(blocks[blocks < self.n])
 
-# Returns the B set for constructing a polynomial CFF
-def __get_b_set(field: FieldArray, k: int) -> List[Polynomial]:
-    return get_all_polynomials_with_deg_up_to_k(field, k)
+    # Ranks a (m, floor(t/2)) matrix of sorted subsets, returning their block indexes
+    def rank(self, subsets: numpy.ndarray) -> numpy.ndarray:
+        first_candidates = numpy.zeros_like(subsets)
+        first_candidates[:, 1:] = subsets[:, :-1] + 1
+        positions = numpy.arange(self.weight)
+        return (self.skipped_subsets[positions, subsets] -
+                self.skipped_subsets[positions, first_candidates]).sum(axis=1)
 
+    @property
+    def nbytes(self) -> int:
+        return self.skipped_subsets.nbytes
 
-# Returns the X set for constructing a polynomial CFF
-def __get_x_set(field: FieldArray) -> List[list]:
-    field_elements: List[int] = field.elements
-    result = itertools.product(field_elements, repeat=2)
-    return [tuple(element) for element in result]
+
+# Creates a 2-CFF(v, n) from a Steiner triple system S(2, 3, v): every block is a
+# triple of tests, and two triples share at most one test, so the tests of a block
+# cannot be covered by two other blocks. v must be 3 mod 6 (Bose construction),
+# holding up to v(v-1)/6 blocks; only the first n triples are used.
+def create_steiner_cff(v: int, n: int) -> SparseCFF:
+    triples = get_steiner_triples(v)
+    if n > len(triples):
+        raise ValueError(f"A Steiner 2-CFF with {v} tests has at most {len(triples)} blocks")
+    return SparseCFF.from_block_tests(v, n, 2, triples[:n])
+
+
+# Returns the triples of the Steiner triple system S(2, 3, v) given by the Bose
+# construction, for v = 3(2m+1). Points are the pairs (x, i) of Z_(2m+1) x Z_3,
+# numbered i*(2m+1) + x, and the triples are {(x,0), (x,1), (x,2)} for every x and
+# {(x,i), (y,i), (x o y, i+1)} for every x < y and i, where x o y = (m+1)(x+y) is
+# the idempotent commutative quasigroup of order 2m+1.
+def get_steiner_triples(v: int) -> numpy.ndarray:
+    if v < 3 or v % 6 != 3:
+        raise ValueError("Steiner triple systems are built for v = 3 mod 6")
+    order = v // 3
+    m = (order - 1) // 2
+    points = numpy.arange(order, dtype=numpy.int64)
+    triples = [numpy.column_stack([points, points + order, points + 2 * order])]
+    x, y = numpy.triu_indices(order, 1)
+    product = ((m + 1) * (x + y)) % order
+    for i in range(3):
+        triples.append(numpy.column_stack([x + i * order, y + i * order, product + ((i + 1) % 3) * order]))
+    return numpy.concatenate(triples)
+
+
+# Gets the number of tests of the smallest Steiner 2-CFF with at least n blocks
+def get_v_for_steiner_cff(n: int) -> int:
+    v = 3
+    while v * (v - 1) // 6 < n:
+        v += 6
+    return v
+
+
+# Kronecker product of a d1-CFF(t1, n1) and a d2-CFF(t2, n2), a min(d1, d2)-CFF(t1*t2,
+# n1*n2): block a*n2 + c belongs to test i*t2 + j exactly when a belongs to test i of
+# the first CFF and c to test j of the second. Given d other blocks, a test of a that
+# avoids those with a different first index, paired with a test of c that avoids those
+# with the same first index, isolates the block.
+class KroneckerCFF(CFF):
+    __slots__ = ("first", "second")
+
+    def __init__(self, first: CFF, second: CFF):
+        self.t = first.t * second.t
+        self.n = first.n * second.n
+        self.d = min(first.d, second.d)
+        self.first = first
+        self.second = second
+
+    def tests_of_block(self, b: int) -> numpy.ndarray:
+        a, c = divmod(b, self.second.n)
+        first_tests = numpy.asarray(self.first.tests_of_block(a), dtype=numpy.int64)
+        second_tests = numpy.asarray(self.second.tests_of_block(c), dtype=numpy.int64)
+        return (first_tests[:, None] * self.second.t + second_tests).ravel()
+
+    def tests_of_blocks(self, start: int, end: int) -> Tuple[numpy.ndarray, numpy.ndarray]:
+        blocks = numpy.arange(start, end, dtype=numpy.int64)
+        first_blocks, second_blocks = numpy.divmod(blocks, self.second.n)
+        first_start = start // self.second.n
+        first_indptr, first_tests = self.first.tests_of_blocks(first_start, (end - 1) // self.second.n + 1)
+        # the second blocks of a range within a single first block, or all of them
+        second_start = start % self.second.n if len(blocks) and first_blocks[-1] == first_start else 0
+        second_end = (end - 1) % self.second.n + 1 if second_start else self.second.n
+        second_indptr, second_tests = self.second.tests_of_blocks(second_start, second_end)
+        first_offsets = first_indptr[first_blocks - first_start]
+        second_offsets = second_indptr[second_blocks - second_start]
+        first_counts = first_indptr[first_blocks - first_start + 1] - first_offsets
+        second_counts = second_indptr[second_blocks - second_start + 1] - second_offsets
+        # incidence p of a block pairs its (p // second count)-th first test with its
+        # (p % second count)-th second test
+        indptr = numpy.zeros(len(blocks) + 1, dtype=numpy.int64)
+        numpy.cumsum(first_counts * second_counts, out=indptr[1:])
+        positions = numpy.arange(indptr[-1], dtype=numpy.int64) - numpy.repeat(indptr[:-1], numpy.diff(indptr))
+        repeated_second_counts = numpy.repeat(second_counts, numpy.diff(indptr))
+        first_positions = numpy.repeat(first_offsets, numpy.diff(indptr)) + positions // repeated_second_counts
+        second_positions = numpy.repeat(second_offsets, numpy.diff(indptr)) + positions % repeated_second_counts
+        return indptr, first_tests[first_positions] * self.second.t + second_tests[second_positions]
+
+    def blocks_of_test(self, i: int) -> numpy.ndarray:
+        first_test, second_test = divmod(i, self.second.t)
+        first_blocks = numpy.asarray(self.first.blocks_of_test(first_test), dtype=numpy.int64)
+        second_blocks = numpy.asarray(self.second.blocks_of_test(second_test), dtype=numpy.int64)
+        return (first_blocks[:, None] * self.second.n + second_blocks).ravel()
+
+    @property
+    def nbytes(self) -> int:
+        return self.first.nbytes + self.second.nbytes
+
+
+# Gets the d value of the Reed-Solomon CFF evaluating polynomials of
+# degree < k at m points, d = floor((m-1)/(k-1))
+def get_reed_solomon_d(k: int, m: int) -> int:
+    return (m - 1) // (k - 1)
 
 
 # Gets the d value for the d-CFF according to the relation d = floor((q-1)/(k-1))
@@ -146,6 +370,18 @@ def get_q_from_k_and_n(k: int, n: int) -> int:
     return q
 
 
+# Gets the smallest prime power q for which the polynomial CFF with the supplied
+# k has at least n blocks and tolerates more than one modification (d > 1), so
+# a document with n blocks can be padded up to q^k blocks
+def get_padded_q(k: int, n: int) -> int:
+    if k < 2:
+        raise ValueError(f"Padding requires a polynomial CFF (k >= 2), got k = {k}")
+    q = max(int(numpy.ceil(numpy.power(n, 1 / k))) - 1, 2)
+    while q ** k < n or get_d(q, k) < 2:
+        q += 1
+    return q
+
+
 # Gets the k value for the d-CFF(t=q^2,n=q^k) according to
 # the desired number of blocks (n) and a given q
 def get_k_from_n_and_q(n: int, q: int) -> int:
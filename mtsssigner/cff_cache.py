@@ -0,0 +1,175 @@
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, Tuple, Union
+
+from mtsssigner import logger
+from mtsssigner.cff import CFF, SparseCFF
+from mtsssigner.cff_builder import get_d
+from mtsssigner.cff_constructions import CFFConstruction, get_construction, get_parameters_key
+from mtsssigner.utils.cff_file_utils import get_cff_file_path, read_or_build_cff_file
+from mtsssigner.utils.file_and_block_utils import read_cff_from_file
+
+# Process-wide cache of CFFs, so signing or verifying many documents with the
+# same CFF parameters reads or builds the CFF only once. Entries are keyed by
+# (construction, t, n, d, parameters) and evicted in least recently used order whenever
+# the memory held by the cached CFFs exceeds the configured byte budget.
+#
+# Below it, CFFs built by a process are written through to a persistent cache
+# directory shared by every process of the host (or fleet, on a shared volume),
+# so each CFF is built only once. Files are written atomically under a file lock
+# and checked on load (see read_or_build_cff_file).
+
+DEFAULT_MAX_BYTES = 256 * 1024 * 1024
+CACHE_DIRECTORY_VARIABLE = "MTSS_CFF_CACHE_DIRECTORY"
+
+CacheKey = Tuple[str, int, int, int, str]
+
+
+class CFFCache:
+    max_bytes: int
+    current_bytes: int
+    hits: int
+    misses: int
+    evictions: int
+
+    def __init__(self, max_bytes: int = DEFAULT_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self.current_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.__entries: "OrderedDict[Hashable, CFF]" = OrderedDict()
+        self.__lock = threading.Lock()
+
+    # Returns the cached CFF for the key, calling loader to obtain it on a miss
+    def get(self, key: Hashable, loader: Callable[[], CFF]) -> CFF:
+        with self.__lock:
+            cff = self.__entries.get(key)
+            if cff is not None:
+                self.__entries.move_to_end(key)
+                self.hits += 1
+                return cff
+            self.misses += 1
+        cff = loader()
+        self.put(key, cff)
+        return cff
+
+    # Stores a CFF, evicting the least recently used entries to respect the budget.
+    # CFFs bigger than the whole budget are not stored.
+    def put(self, key: Hashable, cff: CFF) -> None:
+        size = cff.nbytes
+        with self.__lock:
+            if size > self.max_bytes:
+                return
+            previous = self.__entries.pop(key, None)
+            if previous is not None:
+                self.current_bytes -= previous.nbytes
+            self.__entries[key] = cff
+            self.current_bytes += size
+            self.__evict()
+
+    # Changes the byte budget, evicting entries if needed
+    def resize(self, max_bytes: int) -> None:
+        with self.__lock:
+            self.max_bytes = max_bytes
+            self.__evict()
+
+    def clear(self) -> None:
+        with self.__lock:
+            self.__entries.clear()
+            self.current_bytes = 0
+
+    def stats(self) -> Dict[str, int]:
+        with self.__lock:
+            return {
+                "entries": len(self.__entries),
+                "bytes": self.current_bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+            }
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self.__entries
+
+    def __len__(self) -> int:
+        return len(self.__entries)
+
+    def __evict(self) -> None:
+        while self.current_bytes > self.max_bytes and self.__entries:
+            _, evicted = self.__entries.popitem(last=False)
+            self.current_bytes -= evicted.nbytes
+            self.evictions += 1
+
+
+cache = CFFCache()
+
+
+# Returns the CFF built by a registered construction with the given parameters.
+# On the first request, it is read from the cffs/ store (when the construction is
+# identified by its dimensions) or from the persistent cache directory; otherwise
+# it is built and written through to the cache directory for the next processes.
+def get_cff_from_construction(name: str, parameters: Dict[str, Any]) -> CFF:
+    construction = get_construction(name)
+    t, n, d, _ = construction.get_capabilities(parameters)
+    key: CacheKey = (name, t, n, d, get_parameters_key(parameters))
+    return cache.get(key, lambda: __read_or_create(key, construction, parameters))
+
+
+# Returns the CFF used for q and k (a polynomial d-CFF(q^2, q^k), or an optimal
+# 1-CFF(q^k) when d = 1)
+def get_cff(q: int, k: int) -> CFF:
+    d: int = get_d(q, k)
+    if d == 1 or k < 2:
+        return get_1_cff(q ** k)
+    return get_cff_from_construction("polynomial", {"q": q, "k": k})
+
+
+# Returns the optimal 1-CFF for n blocks
+def get_1_cff(n: int) -> CFF:
+    return get_cff_from_construction("sperner", {"n": n})
+
+
+# Gets the default persistent cache directory: $MTSS_CFF_CACHE_DIRECTORY, or
+# mtss-signer/cffs in the user's cache directory
+def get_default_cache_directory() -> str:
+    if os.environ.get(CACHE_DIRECTORY_VARIABLE):
+        return os.environ[CACHE_DIRECTORY_VARIABLE]
+    user_cache_directory = os.environ.get("XDG_CACHE_HOME") or os.path.join(os.path.expanduser("~"), ".cache")
+    return os.path.join(user_cache_directory, "mtss-signer", "cffs")
+
+
+# Directory where built CFFs are persisted; None disables the write-through
+cache_directory: Union[str, None] = get_default_cache_directory()
+
+
+def __read_or_create(key: CacheKey, construction: CFFConstruction, parameters: Dict[str, Any]) -> CFF:
+    name, t, n, d, parameters_key = key
+    if construction.implied_by_dimensions:
+        try:
+            cff = read_cff_from_file(t, n, d)
+            logger.log_cff_from_file()
+            return cff
+        except IOError:
+            pass
+        except ValueError as exception:
+            logger.log_error(f"Ignoring CFF from the store: {exception}")
+
+    if cache_directory is None or not construction.persisted:
+        return construction.create(parameters)
+    # CFFs not identified by their dimensions are told apart by their parameters
+    tag = "" if construction.implied_by_dimensions else \
+        f"{name}-{hashlib.sha256(parameters_key.encode()).hexdigest()[:16]}"
+    file_path = get_cff_file_path(t, n, d, directory=cache_directory, tag=tag)
+    try:
+        cff = read_or_build_cff_file(file_path, lambda: SparseCFF.from_cff(construction.create(parameters)),
+                                     name, parameters.get("q", 0), parameters.get("k", 0))
+        logger.log_cff_from_file()
+        return cff
+    except OSError as exception:
+        # e.g. a read-only cache directory
+        logger.log_error(f"Could not persist CFF to {file_path}: {exception}")
+        return construction.create(parameters)
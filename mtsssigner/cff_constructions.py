@@ -0,0 +1,209 @@
+import json
+from math import log
+from typing import Any, Dict, List, NamedTuple
+
+import numpy
+
+from mtsssigner.cff import CFF
+from mtsssigner.cff_builder import (create_1_cff,
+                                    create_steiner_cff,
+                                    get_d,
+                                    get_padded_q,
+                                    get_reed_solomon_d,
+                                    get_t_for_1_cff,
+                                    get_v_for_steiner_cff,
+                                    KroneckerCFF,
+                                    PolynomialCFF)
+from mtsssigner.utils.prime_utils import get_next_prime_power, is_prime_power
+
+# Registry of the CFF constructions available to the signer, verifier, cache and
+# planner. A construction builds CFFs from a dictionary of integer parameters (or
+# nested constructions) and declares the (t, n, d) of every CFF it can build, so
+# every part of the project handles all constructions the same way: a CFF is
+# identified by its construction name and parameters.
+#
+# New constructions subclass CFFConstruction and are added with register_construction.
+
+# Paddings that more than double the number of blocks are not proposed
+MAX_PADDING_RATIO = 2
+
+
+# Dimensions of a CFF, plus its number of incidences (blocks summed over all
+# tests), which is proportional to the hashing work of signing and verifying
+class CFFCapabilities(NamedTuple):
+    t: int
+    n: int
+    d: int
+    incidences: int
+
+
+class CFFConstruction:
+    name: str = ""
+    # CFFs of the construction are identified by their (t, n) alone: the verifier
+    # infers them from signatures without header, and they may be in the cffs/ store
+    implied_by_dimensions: bool = False
+    # built CFFs are worth persisting to the cache directory
+    persisted: bool = True
+
+    # Lists the parameters of the CFFs this construction offers for n blocks with
+    # at least d modifiable blocks. With padding, CFFs with more blocks may be listed.
+    def get_parameters(self, n: int, d: int = 1, padding: bool = False) -> List[Dict[str, Any]]:
+        return []
+
+    def get_capabilities(self, parameters: Dict[str, Any]) -> CFFCapabilities:
+        raise NotImplementedError
+
+    # Creates the CFF, computing its incidences on demand whenever possible
+    def create(self, parameters: Dict[str, Any]) -> CFF:
+        raise NotImplementedError
+
+
+# Optimal 1-CFF(t, n) from Sperner set systems; parameters: n
+class SpernerConstruction(CFFConstruction):
+    name = "sperner"
+    implied_by_dimensions = True
+
+    def get_parameters(self, n: int, d: int = 1, padding: bool = False) -> List[Dict[str, Any]]:
+        return [{"n": n}] if d <= 1 else []
+
+    def get_capabilities(self, parameters: Dict[str, Any]) -> CFFCapabilities:
+        t = get_t_for_1_cff(parameters["n"])
+        return CFFCapabilities(t, parameters["n"], 1, parameters["n"] * int(numpy.floor(t / 2)))
+
+    def create(self, parameters: Dict[str, Any]) -> CFF:
+        return create_1_cff(parameters["n"])
+
+
+# Polynomial d-CFF(q^2, q^k); parameters: q, k
+class PolynomialConstruction(CFFConstruction):
+    name = "polynomial"
+    implied_by_dimensions = True
+
+    def get_parameters(self, n: int, d: int = 1, padding: bool = False) -> List[Dict[str, Any]]:
+        parameters = []
+        for k in range(2, int(log(n, 2)) + 1 if n > 1 else 2):
+            q = round(n ** (1 / k))
+            if not (q ** k == n and is_prime_power(q) and q >= k):
+                if not padding or get_padded_q(k, n) ** k > MAX_PADDING_RATIO * n:
+                    continue
+                q = get_padded_q(k, n)
+            if get_d(q, k) > 1 and get_d(q, k) >= d:
+                parameters.append({"q": q, "k": k})
+        return parameters
+
+    def get_capabilities(self, parameters: Dict[str, Any]) -> CFFCapabilities:
+        q, k = parameters["q"], parameters["k"]
+        return CFFCapabilities(q ** 2, q ** k, get_d(q, k), q ** (k + 1))
+
+    def create(self, parameters: Dict[str, Any]) -> CFF:
+        return PolynomialCFF(parameters["q"], parameters["k"])
+
+
+# Reed-Solomon code of length m over GF(q) concatenated with the identity code,
+# truncated to n blocks: a floor((m-1)/(k-1))-CFF(m*q, n) for n <= q^k. For a
+# given d, it uses just enough evaluation points, so it needs fewer tests than
+# the polynomial CFF and does not require n to be a prime power.
+# Parameters: q, k, m, n
+class ReedSolomonConstruction(CFFConstruction):
+    name = "reed-solomon"
+
+    def get_parameters(self, n: int, d: int = 1, padding: bool = False) -> List[Dict[str, Any]]:
+        parameters = []
+        for k in range(2, int(log(n, 2)) + 1 if n > 1 else 2):
+            m = max(d, 1) * (k - 1) + 1
+            q = get_next_prime_power(max(m, int(numpy.ceil(n ** (1 / k)))))
+            while q ** k < n:
+                q = get_next_prime_power(q + 1)
+            # the complete code is the polynomial CFF
+            if m == q and q ** k == n:
+                continue
+            parameters.append({"q": q, "k": k, "m": m, "n": n})
+        return parameters
+
+    def get_capabilities(self, parameters: Dict[str, Any]) -> CFFCapabilities:
+        return CFFCapabilities(parameters["m"] * parameters["q"], parameters["n"],
+                               get_reed_solomon_d(parameters["k"], parameters["m"]),
+                               parameters["m"] * parameters["n"])
+
+    def create(self, parameters: Dict[str, Any]) -> CFF:
+        return PolynomialCFF(parameters["q"], parameters["k"], parameters["m"], parameters["n"])
+
+
+# 2-CFF(v, n) from a Steiner triple system S(2, 3, v), n <= v(v-1)/6; parameters: v, n
+class SteinerConstruction(CFFConstruction):
+    name = "steiner"
+
+    def get_parameters(self, n: int, d: int = 1, padding: bool = False) -> List[Dict[str, Any]]:
+        return [{"v": get_v_for_steiner_cff(n), "n": n}] if d <= 2 else []
+
+    def get_capabilities(self, parameters: Dict[str, Any]) -> CFFCapabilities:
+        return CFFCapabilities(parameters["v"], parameters["n"], 2, 3 * parameters["n"])
+
+    def create(self, parameters: Dict[str, Any]) -> CFF:
+        return create_steiner_cff(parameters["v"], parameters["n"])
+
+
+# Kronecker product of two CFFs of any registered constructions, a min(d1, d2)-
+# CFF(t1*t2, n1*n2). Parameters: first and second, each a dictionary with the
+# construction name and parameters of a factor. Only built from explicit parameters.
+class KroneckerConstruction(CFFConstruction):
+    name = "kronecker"
+    # computed on demand from its much smaller factors
+    persisted = False
+
+    def get_capabilities(self, parameters: Dict[str, Any]) -> CFFCapabilities:
+        first = self.__get_factor_capabilities(parameters["first"])
+        second = self.__get_factor_capabilities(parameters["second"])
+        return CFFCapabilities(first.t * second.t, first.n * second.n,
+                               min(first.d, second.d), first.incidences * second.incidences)
+
+    def create(self, parameters: Dict[str, Any]) -> CFF:
+        first, second = parameters["first"], parameters["second"]
+        return KroneckerCFF(get_construction(first["construction"]).create(first["parameters"]),
+                            get_construction(second["construction"]).create(second["parameters"]))
+
+    @staticmethod
+    def __get_factor_capabilities(factor: Dict[str, Any]) -> CFFCapabilities:
+        return get_construction(factor["construction"]).get_capabilities(factor["parameters"])
+
+
+__constructions: Dict[str, CFFConstruction] = {}
+
+
+def register_construction(construction: CFFConstruction) -> CFFConstruction:
+    if not construction.name:
+        raise ValueError("CFF constructions must have a name")
+    __constructions[construction.name] = construction
+    return construction
+
+
+def get_construction(name: str) -> CFFConstruction:
+    try:
+        return __constructions[name]
+    except KeyError:
+        raise ValueError(f"Unknown CFF construction '{name}' "
+                         f"(available: {', '.join(__constructions)})") from None
+
+
+def get_constructions() -> List[CFFConstruction]:
+    return list(__constructions.values())
+
+
+# Returns a hashable and canonical representation of construction parameters
+def get_parameters_key(parameters: Dict[str, Any]) -> str:
+    return json.dumps(parameters, sort_keys=True, separators=(",", ":"))
+
+
+# Returns the metadata a signature must carry in its header for the verifier to
+# rebuild the CFF, or an empty dictionary when the CFF can be inferred from the
+# number of tests and blocks, as in signatures without header
+def get_signature_metadata(name: str, parameters: Dict[str, Any], n: int) -> Dict[str, Any]:
+    construction = get_construction(name)
+    if construction.implied_by_dimensions and construction.get_capabilities(parameters).n == n:
+        return {}
+    return {"construction": name, "n": n, "parameters": parameters}
+
+
+for __construction in [SpernerConstruction(), PolynomialConstruction(), ReedSolomonConstruction(),
+                       SteinerConstruction(), KroneckerConstruction()]:
+    register_construction(__construction)
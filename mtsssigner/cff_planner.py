@@ -0,0 +1,217 @@
+import json
+import math
+import os
+from timeit import default_timer as timer
+from typing import Any, Callable, Dict, List, NamedTuple, Tuple, Union
+
+import numpy
+
+from mtsssigner.cff import CFF
+from mtsssigner.cff_constructions import get_construction, get_constructions, get_signature_metadata
+from mtsssigner.digest_matrix import get_digest_matrix, hash_tests
+from mtsssigner.signature_header import encode_signature_header
+from mtsssigner.signature_scheme import SigScheme
+
+# Chooses the CFF used to sign a document among the ones offered by every
+# registered construction, from the signature size budget and an estimate of the
+# hashing work measured on this host (see calibrate_cff_planner.py).
+
+
+# Feasible CFF for signing a document, as listed by the planner. n is the number
+# of blocks of the CFF, bigger than the document's when it is padded.
+class CFFPlan(NamedTuple):
+    construction: str
+    parameters: Dict[str, Any]
+    t: int
+    n: int
+    d: int
+    signature_size_bytes: int
+    sign_cost_seconds: float
+    verify_cost_seconds: float
+
+
+# Group size of plan_hierarchical_cff letting the planner choose it
+AUTO_GROUP_SIZE = -1
+
+COST_PROFILE_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                                 "data", "cff-planner-profile.json")
+
+# Costs used when no profile was measured for the hash function: seconds spent per
+# block when hashing the blocks of a document, per test and per incidence of the
+# CFF when hashing the tests (see digest_matrix.hash_tests), and per incidence when
+# the verifier marks the blocks of the matching tests as non modified
+DEFAULT_COST_PROFILE: Dict[str, float] = {
+    "block_seconds": 1e-6,
+    "test_seconds": 2e-6,
+    "incidence_seconds": 5e-8,
+    "localization_seconds": 2e-8,
+}
+
+
+# Lists every CFF able to sign n blocks with at least target_d modifiable blocks
+# and whose signature fits in max_size_bytes (0 means no limit), ordered from the
+# best to the worst choice: lowest estimated sign + verify cost, then highest d,
+# then smallest signature. Every registered construction is considered, or only
+# the named ones; padding lets constructions offer CFFs with more than n blocks.
+def get_feasible_cffs(n: int, digest_size_bytes: int, signature_length_bytes: int, target_d: int = 1,
+                      max_size_bytes: int = 0, profile: Dict[str, float] = None,
+                      padding: bool = False, constructions: List[str] = None) -> List[CFFPlan]:
+    profile = profile if profile is not None else DEFAULT_COST_PROFILE
+    if constructions is None:
+        candidates = get_constructions()
+    else:
+        candidates = [get_construction(name) for name in constructions]
+
+    plans = []
+    for construction in candidates:
+        for parameters in construction.get_parameters(n, target_d, padding):
+            t, cff_n, d, incidences = construction.get_capabilities(parameters)
+            signature_size_bytes = (t + 1) * digest_size_bytes + signature_length_bytes
+            metadata = get_signature_metadata(construction.name, parameters, n)
+            if metadata:
+                signature_size_bytes += len(encode_signature_header(metadata))
+            if d < target_d or (max_size_bytes > 0 and signature_size_bytes > max_size_bytes):
+                continue
+            # both operations hash every block of the document and every test; the
+            # verifier then marks the blocks of the matching tests as non modified
+            tests_seconds = (n * profile["block_seconds"] + t * profile["test_seconds"] +
+                             incidences * profile["incidence_seconds"])
+            plans.append(CFFPlan(construction.name, parameters, t, cff_n, d, signature_size_bytes, tests_seconds,
+                                 tests_seconds + incidences * profile["localization_seconds"]))
+    plans.sort(key=lambda plan: (plan.sign_cost_seconds + plan.verify_cost_seconds,
+                                 -plan.d, plan.signature_size_bytes))
+    return plans
+
+
+# Picks the best feasible CFF (see get_feasible_cffs)
+def plan_cff(n: int, digest_size_bytes: int, signature_length_bytes: int, target_d: int = 1,
+             max_size_bytes: int = 0, profile: Dict[str, float] = None, padding: bool = False,
+             constructions: List[str] = None) -> CFFPlan:
+    plans = get_feasible_cffs(n, digest_size_bytes, signature_length_bytes, target_d, max_size_bytes,
+                              profile, padding, constructions)
+    if not plans:
+        raise ValueError(f"No CFF can sign {n} blocks with d >= {target_d}"
+                         f" within a signature of {max_size_bytes} bytes")
+    return plans[0]
+
+
+# Picks the outer and inner CFFs of a hierarchical signature (see sign), which groups
+# the n blocks into super-blocks of group_size blocks. The signature holds t_o * (1 + t_i)
+# test hashes, so each level uses its feasible CFF with the fewest tests (ties broken
+# by the planner's order). Both levels tolerate target_d modifications, as they may
+# fall in target_d super-blocks or in a single one. With AUTO_GROUP_SIZE, the group
+# size giving the fewest test hashes is chosen.
+# Returns None when a flat signature of the n blocks would be smaller, in which case
+# the document should be signed with a flat CFF.
+def plan_hierarchical_cff(n: int, digest_size_bytes: int, signature_length_bytes: int, target_d: int = 1,
+                          max_size_bytes: int = 0, profile: Dict[str, float] = None,
+                          group_size: int = AUTO_GROUP_SIZE) -> Union[Tuple[CFFPlan, CFFPlan], None]:
+    if group_size == AUTO_GROUP_SIZE:
+        candidates = []
+        for candidate_size in __get_group_sizes(n):
+            try:
+                candidates.append(__plan_levels(n, candidate_size, digest_size_bytes, signature_length_bytes,
+                                                target_d, profile))
+            except ValueError:
+                continue
+        if not candidates:
+            return None
+        outer, inner = min(candidates, key=lambda levels: levels[0].t * (1 + levels[1].t))
+        group_size = inner.n
+    else:
+        outer, inner = __plan_levels(n, group_size, digest_size_bytes, signature_length_bytes, target_d, profile)
+
+    metadata = get_signature_metadata("kronecker", {
+        "first": {"construction": outer.construction, "parameters": outer.parameters},
+        "second": {"construction": inner.construction, "parameters": inner.parameters},
+    }, n)
+    signature_size_bytes = ((outer.t * (1 + inner.t) + 1) * digest_size_bytes + signature_length_bytes +
+                            len(encode_signature_header({**metadata, "hierarchical": True})))
+    flat_plans = get_feasible_cffs(n, digest_size_bytes, signature_length_bytes, target_d, max_size_bytes, profile)
+    if flat_plans and min(plan.signature_size_bytes for plan in flat_plans) <= signature_size_bytes:
+        return None
+    if 0 < max_size_bytes < signature_size_bytes:
+        raise ValueError(f"A hierarchical signature of {n} blocks in groups of {group_size} needs "
+                         f"{signature_size_bytes} bytes, more than {max_size_bytes} bytes")
+    return outer, inner
+
+
+# Returns the outer and inner CFFs with the fewest tests for n blocks in groups of group_size
+def __plan_levels(n: int, group_size: int, digest_size_bytes: int, signature_length_bytes: int, target_d: int,
+                  profile: Union[Dict[str, float], None]) -> Tuple[CFFPlan, CFFPlan]:
+    number_of_groups = -(-n // group_size)
+    levels = []
+    for level_n in [number_of_groups, group_size]:
+        plans = get_feasible_cffs(level_n, digest_size_bytes, signature_length_bytes, target_d, profile=profile)
+        if not plans:
+            raise ValueError(f"No CFF can localize {target_d} modifications among {level_n} blocks")
+        levels.append(min(plans, key=lambda plan: plan.t))
+    return levels[0], levels[1]
+
+
+# Group sizes tried when choosing the group size of a hierarchical signature: the
+# powers of two and the square root of n, leaving at least two super-blocks
+def __get_group_sizes(n: int) -> List[int]:
+    group_sizes = {2 ** exponent for exponent in range(1, max(n.bit_length() - 1, 1))}
+    group_sizes.add(max(math.isqrt(n), 2))
+    return sorted(group_size for group_size in group_sizes if group_size < n)
+
+
+# Loads the cost profile measured for a hash function, or the default one
+def load_cost_profile(hash_function: str, profile_path: str = COST_PROFILE_PATH) -> Dict[str, float]:
+    try:
+        with open(profile_path, "r", encoding="utf-8") as profile_file:
+            profiles = json.load(profile_file)
+    except (IOError, ValueError):
+        return DEFAULT_COST_PROFILE
+    return {**DEFAULT_COST_PROFILE, **profiles.get(hash_function, {})}
+
+
+# Measures the cost profile of a signature scheme's hash function on this host,
+# through the engine used by the signer and verifier (see digest_matrix)
+def measure_cost_profile(sig_scheme: SigScheme, repetitions: int = 5) -> Dict[str, float]:
+    blocks = [f"{block:064d}" for block in range(65536)]
+    block_seconds = __get_best_time(lambda: get_digest_matrix(sig_scheme, blocks), repetitions) / len(blocks)
+
+    # the seconds per test and per incidence of hash_tests are solved from two CFFs,
+    # built as for signing, with very different numbers of incidences per test
+    samples = []
+    for cff in [get_construction("sperner").create({"n": 4096}),
+                get_construction("polynomial").create({"q": 64, "k": 2})]:
+        digests = get_digest_matrix(sig_scheme, [str(block) for block in range(cff.n)])
+        seconds = __get_best_time(lambda: hash_tests(sig_scheme, digests, cff), repetitions)
+        samples.append((cff.t, __get_incidences(cff), seconds))
+    (t_1, incidences_1, seconds_1), (t_2, incidences_2, seconds_2) = samples
+    incidence_seconds, test_seconds = numpy.linalg.solve([[incidences_1, t_1], [incidences_2, t_2]],
+                                                         [seconds_1, seconds_2]).tolist()
+
+    # the verifier marks the blocks of every matching test (here, of the last CFF)
+    non_modified = numpy.zeros(cff.n, dtype=bool)
+
+    def mark_non_modified():
+        for test in range(cff.t):
+            non_modified[cff.blocks_of_test(test)] = True
+    localization_seconds = __get_best_time(mark_non_modified, repetitions) / incidences_2
+
+    # timing noise may make one of the solved costs negative when the other dominates
+    return {
+        "block_seconds": block_seconds,
+        "test_seconds": max(test_seconds, 1e-9),
+        "incidence_seconds": max(incidence_seconds, 1e-12),
+        "localization_seconds": localization_seconds,
+    }
+
+
+def __get_incidences(cff: CFF) -> int:
+    return sum(len(cff.blocks_of_test(test)) for test in range(cff.t))
+
+
+# Returns the shortest of the running times of a function, the least disturbed by
+# the rest of the host
+def __get_best_time(function: Callable[[], Any], repetitions: int) -> float:
+    best_seconds = float("inf")
+    for _ in range(repetitions):
+        start = timer()
+        function()
+        best_seconds = min(best_seconds, timer() - start)
+    return best_seconds
@@ -0,0 +1,117 @@
+import socket
+from typing import Any, Dict, List, Tuple, Union
+
+from mtsssigner.server_protocol import (ERROR, LOCATE, OPERATIONS, SIGN, SOURCE_PATH, SOURCES, VERIFY, Request,
+                                        Response, decode_blocks, decode_frame_length, decode_response,
+                                        encode_request, get_frame_length_size, parse_address)
+
+# Client of the signing server (see mtsssigner/server.py). Documents are given by
+# their paths on the server (sign_file, verify_file, locate_file) or by their
+# content (sign, verify, locate), as txt or xml. Requests may be pipelined: send
+# returns the id of a request without waiting for its response, and result waits
+# for the response of a request, keeping the other responses received meanwhile.
+# A client is used by one thread at a time.
+
+class ServerError(Exception):
+    pass
+
+
+class SigningClient:
+
+    def __init__(self, address: str, timeout: Union[float, None] = None):
+        family, socket_address = parse_address(address)
+        self.socket = socket.socket(family, socket.SOCK_STREAM)
+        self.socket.settimeout(timeout)
+        try:
+            self.socket.connect(socket_address)
+        except OSError:
+            self.socket.close()
+            raise
+        if family == socket.AF_INET:
+            self.socket.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self.__stream = self.socket.makefile("rb")
+        self.__next_id = 0
+        # operation of every request whose result was not returned yet
+        self.__operations: Dict[int, int] = {}
+        self.__responses: Dict[int, Response] = {}
+
+    # Sends a request and returns its id. message (and signature) are paths on the
+    # server when file_type is empty, and contents of that type (txt or xml) otherwise.
+    def send(self, operation: str, message: Union[str, bytes], signature: Union[str, bytes] = b"",
+             file_type: str = "") -> int:
+        if operation not in OPERATIONS:
+            raise ValueError(f"Unsupported operation {operation}")
+        if file_type and file_type not in SOURCES:
+            raise ValueError("Unsupported file type (must be txt or xml)")
+        fields = [message.encode("utf-8") if isinstance(message, str) else bytes(message)]
+        if OPERATIONS[operation] != SIGN:
+            fields.append(signature.encode("utf-8") if isinstance(signature, str) else bytes(signature))
+        request_id = self.__next_id
+        self.__next_id = (self.__next_id + 1) % 2 ** 32
+        self.socket.sendall(encode_request(Request(request_id, OPERATIONS[operation],
+                                                   SOURCES[file_type] if file_type else SOURCE_PATH, fields)))
+        self.__operations[request_id] = OPERATIONS[operation]
+        return request_id
+
+    # Waits for the response of a request and returns its result: the signature
+    # (sign), (valid, not modified) (verify) or (valid, modified blocks) (locate).
+    # Raises ServerError when the request failed.
+    def result(self, request_id: int) -> Any:
+        while request_id not in self.__responses:
+            response = self.receive()
+            self.__responses[response.request_id] = response
+        response = self.__responses.pop(request_id)
+        return get_result(self.__operations.pop(request_id), response)
+
+    # Returns the next response received, of any request
+    def receive(self) -> Response:
+        prefix = self.__stream.read(get_frame_length_size())
+        if len(prefix) < get_frame_length_size():
+            raise ConnectionError("Connection closed by the server")
+        length = decode_frame_length(prefix)
+        body = self.__stream.read(length)
+        if len(body) < length:
+            raise ConnectionError("Connection closed by the server")
+        return decode_response(body)
+
+    def sign_file(self, message_file_path: str) -> bytes:
+        return self.result(self.send("sign", message_file_path))
+
+    def sign(self, content: Union[str, bytes], file_type: str = "txt") -> bytes:
+        return self.result(self.send("sign", content, file_type=file_type))
+
+    # An empty signature path means the default signature path of the message
+    def verify_file(self, message_file_path: str, signature_file_path: str = "") -> Tuple[bool, bool]:
+        return self.result(self.send("verify", message_file_path, signature_file_path))
+
+    def verify(self, content: Union[str, bytes], signature: bytes, file_type: str = "txt") -> Tuple[bool, bool]:
+        return self.result(self.send("verify", content, signature, file_type))
+
+    def locate_file(self, message_file_path: str, signature_file_path: str = "") -> Tuple[bool, List[int]]:
+        return self.result(self.send("locate", message_file_path, signature_file_path))
+
+    def locate(self, content: Union[str, bytes], signature: bytes, file_type: str = "txt") -> Tuple[bool, List[int]]:
+        return self.result(self.send("locate", content, signature, file_type))
+
+    def close(self) -> None:
+        self.__stream.close()
+        self.socket.close()
+
+    def __enter__(self) -> "SigningClient":
+        return self
+
+    def __exit__(self, *exception) -> None:
+        self.close()
+
+
+# Result of the response to a request of the operation
+def get_result(operation: int, response: Response) -> Any:
+    if response.status == ERROR:
+        raise ServerError(response.fields[0].decode("utf-8") if response.fields else "Unknown error")
+    if operation == SIGN:
+        return response.fields[0]
+    if operation == VERIFY:
+        return bool(response.fields[0][0]), bool(response.fields[0][1])
+    if operation == LOCATE:
+        return bool(response.fields[0][0]), decode_blocks(response.fields[1])
+    raise ValueError(f"Unsupported operation {operation}")
@@ -0,0 +1,300 @@
+import mmap
+import multiprocessing
+import os
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import nullcontext
+from typing import Dict, Iterable, Iterator, List, Tuple, Union
+
+import numpy
+
+from mtsssigner import logger
+from mtsssigner.cff import CFF, SparseCFF
+from mtsssigner.digest_memo import DigestMemo
+from mtsssigner.signature_header import PADDING_BLOCK
+from mtsssigner.signature_scheme import SigScheme
+from mtsssigner.utils.shared_memory_utils import SharedArrays, get_shared_cff, share_cff
+
+# Contains the engine used by the signer and verifier to build the tests. Every
+# block is hashed exactly once into a contiguous (n, digest size) matrix of bytes.
+# The concatenation of the block digests of a test is then gathered from the
+# matrix by fancy indexing with the blocks of the test: the concatenations of many
+# tests are gathered at once, in a single buffer, and handed to the hash function
+# as zero-copy views, so no Python loop runs over blocks or bytes.
+
+# Tests are gathered in chunks of about this many bytes, bounding the memory used
+# for CFFs with many incidences
+GATHER_CHUNK_BYTES = 16 * 1024 * 1024
+
+# Number of threads or processes hashing blocks and tests; 0 uses one per core,
+# and 1 hashes everything serially
+workers = 0
+
+# Blocks are hashed on threads when they total at least PARALLEL_MIN_BYTES and
+# average at least THREADS_MIN_BLOCK_BYTES, the size from which hashlib releases
+# the GIL while hashing; smaller blocks are hashed serially, where the per-block
+# overhead is lowest
+THREADS_MIN_BLOCK_BYTES = 2048
+
+# Thresholds of the parallel hashing of tests: workloads below PARALLEL_MIN_BYTES
+# are hashed serially. Above it, threads are used when the average test is long
+# enough for the hashing to release the GIL and dominate the overhead; otherwise,
+# processes are used when the workload also exceeds PROCESSES_MIN_BYTES, which
+# pays for starting them.
+PARALLEL_MIN_BYTES = 4 * 1024 * 1024
+THREADS_MIN_TEST_BYTES = 64 * 1024
+PROCESSES_MIN_BYTES = 256 * 1024 * 1024
+
+# Memo of block digests shared by the documents of a batch (see digest_memo), set
+# by callers signing or verifying many documents; None memoizes per document only
+shared_memo: Union[DigestMemo, None] = None
+
+# (scheme, shared digests, CFF) of a process hashing tests
+hashing_worker: Union[Tuple[SigScheme, SharedArrays, CFF], None] = None
+
+
+# Returns the (n, digest size) matrix of the digests of the blocks, where n may
+# exceed the number of blocks of a padded document: the implicit empty blocks
+# that follow all share the digest of an empty block. Repeated blocks are hashed
+# once, and so are blocks already in the memo (by default, shared_memo of this module),
+# which is shared by the documents of a batch.
+def get_digest_matrix(sig_scheme: SigScheme, blocks: List[Union[str, bytes]], n: int = 0,
+                      memo: DigestMemo = None) -> numpy.ndarray:
+    memo = shared_memo if memo is None else memo
+    n = max(n, len(blocks))
+    digests = numpy.empty((n, sig_scheme.digest_size_bytes), dtype=numpy.uint8)
+    positions: Dict[Union[str, bytes], int] = {}
+    indices = [positions.setdefault(block, len(positions)) for block in blocks]
+    distinct_blocks = list(positions)
+
+    memoized = [None] * len(distinct_blocks) if memo is None else memo.get_all(sig_scheme.hash_function,
+                                                                               distinct_blocks)
+    missing = [position for position, digest in enumerate(memoized) if digest is None]
+    missing_blocks = [distinct_blocks[position] for position in missing]
+    missing_digests, size_bytes, block_workers = __hash_blocks(sig_scheme, missing_blocks)
+    if len(missing) == len(distinct_blocks):
+        distinct_digests = missing_digests
+    else:
+        distinct_digests = numpy.frombuffer(b"".join(digest or bytes(sig_scheme.digest_size_bytes)
+                                                     for digest in memoized), dtype=numpy.uint8)
+        distinct_digests = distinct_digests.reshape((len(distinct_blocks), sig_scheme.digest_size_bytes)).copy()
+        distinct_digests[missing] = missing_digests
+    if memo is not None:
+        memo.put_all(sig_scheme.hash_function, missing_blocks, [row.tobytes() for row in missing_digests])
+
+    digests[:len(blocks)] = distinct_digests if len(distinct_blocks) == len(blocks) else distinct_digests[indices]
+    logger.log_block_hashing(len(blocks), len(distinct_blocks), len(missing_blocks), size_bytes, block_workers)
+    __set_padding_digests(sig_scheme, digests, len(blocks))
+    return digests
+
+
+# Same as get_digest_matrix, for blocks given by their bounds in a buffer (block i
+# is buffer[starts[i]:ends[i]], e.g. the lines of a mapped txt file, see TxtDocument),
+# which are hashed without copying them. Blocks are only copied when they are
+# memoized (in memo or, by default, shared_memo), and are otherwise not deduplicated.
+def get_buffer_digest_matrix(sig_scheme: SigScheme, buffer: Union[bytes, memoryview, mmap.mmap],
+                             starts: numpy.ndarray, ends: numpy.ndarray, n: int = 0,
+                             memo: DigestMemo = None) -> numpy.ndarray:
+    memo = shared_memo if memo is None else memo
+    if memo is not None:
+        view = memoryview(buffer)
+        return get_digest_matrix(sig_scheme, [view[start:end].tobytes()
+                                              for start, end in zip(starts.tolist(), ends.tolist())], n, memo)
+    digests = numpy.empty((max(n, len(starts)), sig_scheme.digest_size_bytes), dtype=numpy.uint8)
+    digests[:len(starts)], size_bytes, block_workers = __hash_slices(sig_scheme, buffer, starts, ends)
+    logger.log_block_hashing(len(starts), len(starts), len(starts), size_bytes, block_workers)
+    __set_padding_digests(sig_scheme, digests, len(starts))
+    return digests
+
+
+# The implicit empty blocks that follow the blocks of a padded document all share
+# the digest of an empty block
+def __set_padding_digests(sig_scheme: SigScheme, digests: numpy.ndarray, number_of_blocks: int) -> None:
+    if len(digests) > number_of_blocks:
+        digests[number_of_blocks:] = numpy.frombuffer(sig_scheme.get_digest(PADDING_BLOCK), dtype=numpy.uint8)
+
+
+# Hashes the blocks, joined in a single buffer, with SigScheme.get_digests. Returns
+# their digest matrix, their number of bytes and the number of threads used.
+def __hash_blocks(sig_scheme: SigScheme, blocks: List[Union[str, bytes]]) -> Tuple[numpy.ndarray, int, int]:
+    buffer, offsets = __join_blocks(blocks)
+    return __hash_slices(sig_scheme, buffer, offsets[:-1], offsets[1:])
+
+
+# Hashes the blocks buffer[starts[i]:ends[i]], on threads when they are large
+def __hash_slices(sig_scheme: SigScheme, buffer: Union[bytes, memoryview, mmap.mmap], starts: numpy.ndarray,
+                  ends: numpy.ndarray) -> Tuple[numpy.ndarray, int, int]:
+    sizes = numpy.zeros(len(starts) + 1, dtype=numpy.int64)
+    numpy.cumsum(ends - starts, out=sizes[1:])
+    size_bytes = int(sizes[-1])
+    block_workers = get_default_workers()
+    if (block_workers <= 1 or len(starts) <= 1 or size_bytes < PARALLEL_MIN_BYTES
+            or size_bytes < THREADS_MIN_BLOCK_BYTES * len(starts)):
+        return sig_scheme.get_digests(buffer, starts, ends), size_bytes, 1
+
+    digests = numpy.empty((len(starts), sig_scheme.digest_size_bytes), dtype=numpy.uint8)
+    # batches of contiguous blocks of about the same number of bytes, a few per
+    # thread so that uneven blocks still keep every thread busy
+    bounds = numpy.unique(numpy.searchsorted(
+        sizes, numpy.linspace(0, size_bytes, block_workers * 4 + 1), side="left"))
+    bounds[-1] = len(starts)
+    with ThreadPoolExecutor(block_workers) as executor:
+        batches = zip(bounds, executor.map(lambda batch: sig_scheme.get_digests(
+            buffer, starts[batch[0]:batch[1]], ends[batch[0]:batch[1]]), zip(bounds, bounds[1:])))
+        for start, batch_digests in batches:
+            digests[start:start + len(batch_digests)] = batch_digests
+    return digests, size_bytes, block_workers
+
+
+# Returns the (number of groups, digest size) matrix of the digests of consecutive
+# groups of group_size rows of a digest matrix (the super-blocks of a hierarchical
+# signature), each hashed over the contiguous digests of its rows
+def get_group_digest_matrix(sig_scheme: SigScheme, digests: numpy.ndarray, group_size: int) -> numpy.ndarray:
+    offsets = numpy.append(numpy.arange(0, len(digests), group_size), len(digests))
+    return sig_scheme.get_digests(numpy.ascontiguousarray(digests).reshape(-1), offsets * digests.shape[1])
+
+
+# Returns the blocks joined in one buffer and the offsets of the blocks in it
+def __join_blocks(blocks: List[Union[str, bytes]]) -> Tuple[bytes, numpy.ndarray]:
+    if all(isinstance(block, str) for block in blocks):
+        joined = "".join(blocks)
+        buffer = joined.encode()
+        if len(buffer) == len(joined):
+            # ASCII, one byte per character
+            lengths = list(map(len, blocks))
+        else:
+            lengths = [len(block.encode()) for block in blocks]
+    else:
+        encoded_blocks = [block.encode() if isinstance(block, str) else block for block in blocks]
+        buffer = b"".join(encoded_blocks)
+        lengths = [memoryview(block).nbytes for block in encoded_blocks]
+    offsets = numpy.zeros(len(blocks) + 1, dtype=numpy.int64)
+    numpy.cumsum(lengths, out=offsets[1:])
+    return buffer, offsets
+
+
+# Yields (test, blocks of the test, concatenation of their digests) for every test,
+# in the given order. The concatenations are views over a shared buffer, valid
+# until the next chunk of tests is gathered.
+def get_test_concatenations(digests: numpy.ndarray, cff: CFF,
+                            tests: Iterable[int] = None) -> Iterator[Tuple[int, numpy.ndarray, memoryview]]:
+    tests = list(range(cff.t) if tests is None else tests)
+    digest_size = digests.shape[1]
+    for start, blocks_of_tests, gathered, offsets in __gather_chunks(digests, cff, tests):
+        gathered = memoryview(gathered)
+        for index, test_blocks in enumerate(blocks_of_tests):
+            yield (tests[start + index], test_blocks,
+                   gathered[offsets[index] * digest_size:offsets[index + 1] * digest_size])
+
+
+# Returns the digests of the concatenations of the given tests (by default, all
+# tests), in order. Tests are independent, so large workloads are spread over
+# workers (by default, one per core): threads when the concatenations are long
+# enough for the hash functions to release the GIL, processes otherwise.
+def hash_tests(sig_scheme: SigScheme, digests: numpy.ndarray, cff: CFF, tests: Iterable[int] = None,
+               workers: int = 0) -> List[bytes]:
+    tests = list(range(cff.t) if tests is None else tests)
+    workers = workers or get_default_workers()
+    mode = get_execution_mode(__get_concatenated_bytes(digests, cff, tests), len(tests), workers)
+    if mode == "serial":
+        return __hash_tests_serially(sig_scheme, digests, cff, tests)
+
+    # a few parts per worker, balancing tests of different sizes
+    parts = [tests[start::workers * 4] for start in range(min(workers * 4, len(tests)))]
+    if mode == "threads":
+        with ThreadPoolExecutor(workers) as executor:
+            hashed_parts = list(executor.map(
+                lambda part: __hash_tests_serially(sig_scheme, digests, cff, part), parts))
+    else:
+        # the workers map the digests (and the incidences) instead of receiving copies
+        with SharedArrays.create({"digests": digests}) as shared_digests, \
+                __share_cff_arrays(cff) as shared_cff, \
+                multiprocessing.get_context("spawn").Pool(
+                    workers, initializer=__init_hashing_worker,
+                    initargs=(sig_scheme, shared_digests, shared_cff or cff)) as process_pool:
+            hashed_parts = process_pool.map(__hash_tests_in_worker, parts)
+
+    hashed_tests = [b""] * len(tests)
+    for start, hashed_part in enumerate(hashed_parts):
+        hashed_tests[start::workers * 4] = hashed_part
+    return hashed_tests
+
+
+# Chooses how to hash tests concatenating the given number of bytes
+def get_execution_mode(concatenated_bytes: int, number_of_tests: int, workers: int) -> str:
+    if workers <= 1 or number_of_tests <= 1 or concatenated_bytes < PARALLEL_MIN_BYTES:
+        return "serial"
+    if concatenated_bytes // number_of_tests >= THREADS_MIN_TEST_BYTES:
+        return "threads"
+    if concatenated_bytes >= PROCESSES_MIN_BYTES:
+        return "processes"
+    return "serial"
+
+
+# Number of workers hashing blocks and tests
+def get_default_workers() -> int:
+    return workers or os.cpu_count() or 1
+
+
+def __hash_tests_serially(sig_scheme: SigScheme, digests: numpy.ndarray, cff: CFF, tests: List[int]) -> List[bytes]:
+    digest_size = digests.shape[1]
+    hashed_tests = []
+    for _, _, gathered, offsets in __gather_chunks(digests, cff, tests):
+        hashed_chunk = sig_scheme.get_digests(gathered, offsets * digest_size).tobytes()
+        hashed_tests.extend(hashed_chunk[start:start + sig_scheme.digest_size_bytes]
+                            for start in range(0, len(hashed_chunk), sig_scheme.digest_size_bytes))
+    return hashed_tests
+
+
+# Yields (first index, blocks of the tests, gathered digests, offsets of the tests
+# in blocks) for every chunk of the given tests
+def __gather_chunks(digests: numpy.ndarray, cff: CFF,
+                    tests: List[int]) -> Iterator[Tuple[int, List[numpy.ndarray], numpy.ndarray, numpy.ndarray]]:
+    start = 0
+    while start < len(tests):
+        end, blocks_of_tests = __get_chunk(cff, tests, start, digests.shape[1])
+        offsets = numpy.zeros(end - start + 1, dtype=numpy.int64)
+        numpy.cumsum([len(test_blocks) for test_blocks in blocks_of_tests], out=offsets[1:])
+        yield start, blocks_of_tests, digests[numpy.concatenate(blocks_of_tests)].reshape(-1), offsets
+        start = end
+
+
+# Returns the end of the chunk of tests starting at start and the blocks of its tests
+def __get_chunk(cff: CFF, tests: List[int], start: int, digest_size: int) -> Tuple[int, List[numpy.ndarray]]:
+    blocks_of_tests = []
+    size = 0
+    end = start
+    while end < len(tests) and (end == start or size < GATHER_CHUNK_BYTES):
+        test_blocks = numpy.asarray(cff.blocks_of_test(tests[end]), dtype=numpy.int64)
+        blocks_of_tests.append(test_blocks)
+        size += len(test_blocks) * digest_size
+        end += 1
+    return end, blocks_of_tests
+
+
+# Number of bytes hashed by the tests, estimated from the first test for CFFs
+# computing their incidences on demand
+def __get_concatenated_bytes(digests: numpy.ndarray, cff: CFF, tests: List[int]) -> int:
+    if not tests:
+        return 0
+    if isinstance(cff, SparseCFF):
+        test_sizes = numpy.diff(cff.test_indptr)[tests]
+        return int(test_sizes.sum()) * digests.shape[1]
+    return len(cff.blocks_of_test(tests[0])) * len(tests) * digests.shape[1]
+
+
+# Shares the incidences of sparse CFFs; CFFs computing them on demand are small
+# enough to be sent as they are
+def __share_cff_arrays(cff: CFF) -> Union[SharedArrays, nullcontext]:
+    return share_cff(cff) if isinstance(cff, SparseCFF) else nullcontext()
+
+
+def __init_hashing_worker(sig_scheme: SigScheme, shared_digests: SharedArrays,
+                          cff: Union[SharedArrays, CFF]) -> None:
+    global hashing_worker
+    hashing_worker = (sig_scheme, shared_digests,
+                      get_shared_cff(cff) if isinstance(cff, SharedArrays) else cff)
+
+
+def __hash_tests_in_worker(tests: List[int]) -> List[bytes]:
+    sig_scheme, shared_digests, cff = hashing_worker
+    return __hash_tests_serially(sig_scheme, shared_digests["digests"], cff, tests)
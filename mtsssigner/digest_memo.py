@@ -0,0 +1,116 @@
+import threading
+from collections import OrderedDict
+from typing import Dict, Hashable, List, Tuple, Union
+
+# Content-addressed memo of block digests. Documents repeat many blocks (empty
+# lines, closing tags, boilerplate elements), whose digests are computed only once:
+# within a document, repeated blocks are always hashed once (see get_digest_matrix);
+# across the documents of a batch, a DigestMemo keeps the digests of the blocks
+# seen so far, keyed by hash function and block content. Entries are evicted in
+# least recently used order whenever the memory held by the memoized blocks and
+# digests exceeds the configured byte budget.
+
+DEFAULT_MAX_BYTES = 64 * 1024 * 1024
+# approximate memory used by an entry besides its content and digest
+ENTRY_OVERHEAD_BYTES = 128
+
+MemoKey = Tuple[str, Union[str, bytes]]
+
+
+class DigestMemo:
+    max_bytes: int
+    current_bytes: int
+    hits: int
+    misses: int
+    evictions: int
+
+    def __init__(self, max_bytes: int = DEFAULT_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self.current_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.__entries: "OrderedDict[MemoKey, bytes]" = OrderedDict()
+        self.__lock = threading.Lock()
+
+    # Returns the memoized digest of every block, or None for the blocks not memoized
+    def get_all(self, hash_function: str, blocks: List[Union[str, bytes]]) -> List[Union[bytes, None]]:
+        digests: List[Union[bytes, None]] = []
+        with self.__lock:
+            for block in blocks:
+                key = (hash_function, block)
+                digest = self.__entries.get(key)
+                if digest is not None:
+                    self.__entries.move_to_end(key)
+                digests.append(digest)
+            hits = len(digests) - digests.count(None)
+            self.hits += hits
+            self.misses += len(digests) - hits
+        return digests
+
+    # Stores the digests of the blocks, evicting the least recently used entries to
+    # respect the budget. Blocks bigger than the whole budget are not stored.
+    def put_all(self, hash_function: str, blocks: List[Union[str, bytes]], digests: List[bytes]) -> None:
+        with self.__lock:
+            for block, digest in zip(blocks, digests):
+                size = self.__get_entry_bytes(block, digest)
+                if size > self.max_bytes:
+                    continue
+                previous = self.__entries.pop((hash_function, block), None)
+                if previous is not None:
+                    self.current_bytes -= self.__get_entry_bytes(block, previous)
+                self.__entries[(hash_function, block)] = digest
+                self.current_bytes += size
+            self.__evict()
+
+    # Returns the memoized (block, digest) entries of a hash function, the most
+    # recently used first
+    def get_entries(self, hash_function: str) -> List[Tuple[Union[str, bytes], bytes]]:
+        with self.__lock:
+            return [(block, digest) for (entry_hash_function, block), digest in reversed(self.__entries.items())
+                    if entry_hash_function == hash_function]
+
+    # Changes the byte budget, evicting entries if needed
+    def resize(self, max_bytes: int) -> None:
+        with self.__lock:
+            self.max_bytes = max_bytes
+            self.__evict()
+
+    def clear(self) -> None:
+        with self.__lock:
+            self.__entries.clear()
+            self.current_bytes = 0
+
+    # Fraction of the looked up blocks that were memoized
+    @property
+    def hit_rate(self) -> float:
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+    def stats(self) -> Dict[str, Union[int, float]]:
+        with self.__lock:
+            return {
+                "entries": len(self.__entries),
+                "bytes": self.current_bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": self.hit_rate,
+            }
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self.__entries
+
+    def __len__(self) -> int:
+        return len(self.__entries)
+
+    def __evict(self) -> None:
+        while self.current_bytes > self.max_bytes and self.__entries:
+            (_, block), evicted = self.__entries.popitem(last=False)
+            self.current_bytes -= self.__get_entry_bytes(block, evicted)
+            self.evictions += 1
+
+    @staticmethod
+    def __get_entry_bytes(block: Union[str, bytes], digest: bytes) -> int:
+        return len(block) + len(digest) + ENTRY_OVERHEAD_BYTES
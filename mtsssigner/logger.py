@@ -1,14 +1,16 @@
 from datetime import datetime
 from datetime import timedelta
-from typing import List, Callable, Union
+from typing import List, Callable, Union, TYPE_CHECKING
 
-from mtsssigner.signature_scheme import SigScheme
+if TYPE_CHECKING:
+    # only for annotations, signature_scheme itself logs through this module
+    from mtsssigner.signature_scheme import SigScheme
 
 LOG_FILE_PATH = "./logs.txt"
 enabled = False
 
 
-def log_program_command(command: List[str], sig_scheme: SigScheme) -> None:
+def log_program_command(command: List[str], sig_scheme: "SigScheme") -> None:
     if not enabled:
         return
     command_str = " ".join(command)
@@ -47,7 +49,7 @@ def log_execution_end(elapsed_time: timedelta) -> None:
 
 
 def log_signature_parameters(signed_file: str, private_key_file: str, n: int,
-                             sig_scheme: SigScheme, d: int, t: int, blocks: List[str],
+                             sig_scheme: "SigScheme", d: int, t: int, blocks: Union[List[str], None],
                              q: int = -1, k: int = -1, max_size_bytes: int = -1) -> None:
     if not enabled:
         return
@@ -72,12 +74,47 @@ def log_signature_parameters(signed_file: str, private_key_file: str, n: int,
         log_content += f"Resulting CFF = {d}-CFF({t}, {n})\n"
     modifiable_blocks_proportion = round(d / n, 4)
     log_content += f"Proportion of modifiable blocks: {modifiable_blocks_proportion}%\n"
-    log_content += f"Blocks:\n{blocks}\n"
+    if blocks is not None:
+        # streamed documents are not kept in memory
+        log_content += f"Blocks:\n{blocks}\n"
     __write_to_log_file(log_content)
 
 
+def log_cff_plans(plans: list) -> None:
+    if not enabled:
+        return
+    log_content = "Feasible CFFs (best first):\n"
+    for plan in plans:
+        log_content += (f"  {plan.construction} {plan.d}-CFF({plan.t}, {plan.n}), {plan.parameters}; "
+                        f"signature = {plan.signature_size_bytes} bytes; estimated sign = "
+                        f"{plan.sign_cost_seconds:.6f} s, verify = {plan.verify_cost_seconds:.6f} s\n")
+    __write_to_log_file(log_content)
+
+
+def log_hierarchical_fallback(n: int, group_size: int) -> None:
+    if not enabled:
+        return
+    __write_to_log_file((f"A flat signature of {n} blocks is smaller than a hierarchical one"
+                         f" (group size = {group_size}), signing with a flat CFF\n"))
+
+
+def log_block_padding(n: int, padded_n: int) -> None:
+    if not enabled:
+        return
+    __write_to_log_file(f"Blocks padded with {padded_n - n} empty blocks (from {n} to {padded_n})\n")
+
+
+def log_block_hashing(number_of_blocks: int, distinct_blocks: int, hashed_blocks: int,
+                      size_bytes: int, workers: int) -> None:
+    if not enabled:
+        return
+    __write_to_log_file((f"{number_of_blocks} blocks, {distinct_blocks} distinct, "
+                         f"{distinct_blocks - hashed_blocks} memoized; {hashed_blocks} blocks "
+                         f"({size_bytes} bytes) hashed by {workers} thread(s)\n"))
+
+
 def log_nonmodified_verification_result(verified_file: str, public_key_file: str,
-                                        sig_scheme: SigScheme, result: bool) -> None:
+                                        sig_scheme: "SigScheme", result: bool) -> None:
     if not enabled:
         return
     if sig_scheme.sig_algorithm == "PKCS#1 v1.5":
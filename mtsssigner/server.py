@@ -0,0 +1,250 @@
+import asyncio
+import errno
+import multiprocessing
+import os
+import signal
+import socket
+import stat
+import threading
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Tuple, Union
+
+from mtsssigner import cff_cache, digest_matrix
+from mtsssigner.digest_memo import DigestMemo
+from mtsssigner.server_protocol import (ERROR, FILE_TYPES, LOCATE, OK, SIGN, SOURCE_PATH, VERIFY, Request, Response,
+                                        decode_frame_length, decode_request, encode_blocks, encode_response,
+                                        get_frame_length_size, get_request_id, parse_address)
+from mtsssigner.signature_scheme import SigScheme
+from mtsssigner.signer import Signer
+from mtsssigner.utils.file_and_block_utils import get_message_and_blocks_from_file, get_signature_file_path
+from mtsssigner.verifier import pre_verify, pre_verify_content, verify_raw
+
+# Local signing server: a long-running process that keeps the keys, the signing
+# context, the CFFs and a pool of warm workers, so signing or verifying a small
+# document costs only its hashing and signature instead of starting a process and
+# importing the dependencies. Clients (see mtsssigner/client.py) connect to a Unix
+# domain socket (only accessible by its owner) or to a TCP address, and send
+# requests in the binary protocol of mtsssigner/server_protocol.py. The requests
+# of a connection are handled concurrently by the workers, and every response is
+# sent as soon as it is ready. Paths in requests are relative to the directory
+# of the server.
+
+# requests of a connection handled at once; the next ones wait to be read
+MAX_PENDING_REQUESTS = 256
+
+# (scheme, signer, public key, public key path) of a server worker
+server_worker: Union[Tuple[SigScheme, Union[Signer, None], Any, str], None] = None
+# the verifier keeps the state of a verification in module variables, so the
+# verifications of a process (e.g. by threads of an in-process worker and of
+# the corrections of an AsyncSigningPool) run one at a time
+verification_lock = threading.Lock()
+
+
+# Runs the server until it is interrupted (SIGINT or SIGTERM). options are those
+# of sign (k, max_size_bytes, target_d, padding, construction, parameters,
+# group_size). Without a private key, only verifications are served, and without
+# a public key, only signatures. workers defaults to one process per core; with a
+# single worker, requests are handled by a thread of the server process.
+def serve(sig_scheme: SigScheme, address: str, private_key_path: str = "", public_key_path: str = "",
+          workers: int = 0, **options: Any) -> None:
+    try:
+        asyncio.run(__serve_until_terminated(sig_scheme, address, private_key_path, public_key_path, workers,
+                                             options))
+    except (KeyboardInterrupt, asyncio.CancelledError):
+        pass
+
+
+# Runs the server until the task is cancelled. started is called once the
+# workers are ready and the server is listening.
+async def run_server(sig_scheme: SigScheme, address: str, private_key_path: str = "", public_key_path: str = "",
+                     workers: int = 0, started: Callable[[], None] = None, **options: Any) -> None:
+    family, socket_address = parse_address(address)
+    executor, workers = create_worker_executor(sig_scheme, private_key_path, public_key_path, workers, options)
+    try:
+        await start_workers(executor, workers)
+
+        async def handle_connection(reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+            await __handle_connection(reader, writer, executor)
+
+        if family == socket.AF_UNIX:
+            __remove_stale_socket(socket_address)
+            # the socket is created only accessible by its owner, instead of being
+            # reachable by anyone until a chmod
+            previous_umask = os.umask(0o177)
+            try:
+                server = await asyncio.start_unix_server(handle_connection, path=socket_address)
+            finally:
+                os.umask(previous_umask)
+        else:
+            server = await asyncio.start_server(handle_connection, *socket_address)
+        async with server:
+            if started is not None:
+                started()
+            await server.serve_forever()
+    finally:
+        executor.shutdown(wait=False, cancel_futures=True)
+        if family == socket.AF_UNIX and os.path.exists(socket_address):
+            os.unlink(socket_address)
+
+
+# Creates the executor of the workers of the server, returning it and its number
+# of workers (by default, one per core). A single worker is a thread of the calling
+# process; otherwise, the workers are spawned processes, keeping the (not fork-safe)
+# JIT state of galois out.
+def create_worker_executor(sig_scheme: SigScheme, private_key_path: str, public_key_path: str, workers: int,
+                           options: Dict[str, Any]) -> Tuple[Executor, int]:
+    workers = workers or os.cpu_count() or 1
+    initargs = (sig_scheme.sig_algorithm, sig_scheme.hash_function, private_key_path, public_key_path, options,
+                cff_cache.cache_directory, workers > 1)
+    if workers == 1:
+        return ThreadPoolExecutor(1, initializer=init_server_worker, initargs=initargs), workers
+    return ProcessPoolExecutor(workers, mp_context=multiprocessing.get_context("spawn"),
+                               initializer=init_server_worker, initargs=initargs), workers
+
+
+# Every worker loads the keys before the first request (and fails the start if
+# they cannot be loaded)
+async def start_workers(executor: Executor, workers: int) -> None:
+    loop = asyncio.get_running_loop()
+    await asyncio.gather(*[loop.run_in_executor(executor, os.getpid) for _ in range(workers)])
+
+
+def init_server_worker(sig_algorithm: str, hash_function: str, private_key_path: str, public_key_path: str,
+                       options: Dict[str, Any], cache_directory: str, in_pool: bool) -> None:
+    global server_worker
+    sig_scheme = SigScheme(sig_algorithm, hash_function)
+    if in_pool:
+        cff_cache.cache_directory = cache_directory
+        # requests are already handled in parallel, one per worker
+        digest_matrix.workers = 1
+        digest_matrix.shared_memo = DigestMemo()
+    signer = Signer(sig_scheme, private_key_path, **options) if private_key_path else None
+    public_key = sig_scheme.get_public_key(public_key_path) if public_key_path else None
+    server_worker = (sig_scheme, signer, public_key, public_key_path)
+
+
+# Handles the body of a request, returning the encoded response. Errors are sent
+# to the client in an ERROR response.
+def run_request(body: bytes) -> bytes:
+    try:
+        request = decode_request(body)
+        return encode_response(Response(request.request_id, OK, __run(request)))
+    except Exception as exception:
+        return encode_response(Response(get_request_id(body), ERROR, [repr(exception).encode("utf-8")]))
+
+
+async def __serve_until_terminated(sig_scheme: SigScheme, address: str, private_key_path: str,
+                                   public_key_path: str, workers: int, options: Dict[str, Any]) -> None:
+    asyncio.get_running_loop().add_signal_handler(signal.SIGTERM, asyncio.current_task().cancel)
+    await run_server(sig_scheme, address, private_key_path, public_key_path, workers, **options)
+
+
+async def __handle_connection(reader: asyncio.StreamReader, writer: asyncio.StreamWriter, executor: Executor) -> None:
+    loop = asyncio.get_running_loop()
+    pending = asyncio.Semaphore(MAX_PENDING_REQUESTS)
+    responses = set()
+
+    async def respond(body: bytes) -> None:
+        try:
+            try:
+                response = await loop.run_in_executor(executor, run_request, body)
+            except Exception as exception:
+                # e.g. a worker that died
+                response = encode_response(Response(get_request_id(body), ERROR, [repr(exception).encode("utf-8")]))
+            writer.write(response)
+            await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            pending.release()
+
+    try:
+        while True:
+            try:
+                length = decode_frame_length(await reader.readexactly(get_frame_length_size()))
+                body = await reader.readexactly(length)
+            except asyncio.IncompleteReadError:
+                break
+            await pending.acquire()
+            response = asyncio.ensure_future(respond(body))
+            responses.add(response)
+            response.add_done_callback(responses.discard)
+        # the client may close its side after sending its requests
+        await asyncio.gather(*responses)
+    except (ConnectionError, ValueError):
+        # broken connection or frame, which cannot be answered
+        pass
+    finally:
+        for response in responses:
+            response.cancel()
+        writer.close()
+
+
+# Signs a message given by its path (when file_type is empty) or its content
+def sign_in_worker(message: str, file_type: str = "") -> bytes:
+    _, signer, _, _ = server_worker
+    if signer is None:
+        raise ValueError("The server has no private key")
+    if not file_type:
+        return bytes(signer.sign_file(message))
+    message, blocks = get_message_and_blocks_from_file(f"message.{file_type}", message)
+    return bytes(signer.sign(blocks, message))
+
+
+# Verifies a message and its signature, given by their paths (an empty signature
+# path means the default signature path of the message) when file_type is empty,
+# or by their contents, and localizes the modified blocks (see verify_raw)
+def verify_in_worker(message: str, signature: Union[str, bytes], file_type: str = "") -> Tuple[bool, List[int]]:
+    sig_scheme, _, public_key, public_key_path = server_worker
+    if public_key is None:
+        raise ValueError("The server has no public key")
+    with verification_lock:
+        if not file_type:
+            parameters = pre_verify(message, signature or get_signature_file_path(message), sig_scheme,
+                                    public_key_path, public_key)
+        else:
+            parameters = pre_verify_content(message, signature, sig_scheme, file_type, public_key, public_key_path)
+        return verify_raw(*parameters)
+
+
+def __run(request: Request) -> List[bytes]:
+    if request.operation == SIGN:
+        message, = __get_fields(request, 1)
+        return [sign_in_worker(message.decode("utf-8"), __get_file_type(request))]
+    if request.operation in (VERIFY, LOCATE):
+        message, signature = __get_fields(request, 2)
+        file_type = __get_file_type(request)
+        valid, modified_blocks = verify_in_worker(message.decode("utf-8"),
+                                                  signature if file_type else signature.decode("utf-8"), file_type)
+        if request.operation == VERIFY:
+            return [bytes([valid, not modified_blocks])]
+        return [bytes([valid]), encode_blocks(modified_blocks)]
+    raise ValueError(f"Unsupported operation {request.operation}")
+
+
+def __get_fields(request: Request, count: int) -> List[bytes]:
+    if len(request.fields) != count:
+        raise ValueError(f"Expected {count} fields, received {len(request.fields)}")
+    return request.fields
+
+
+# File type of the contents of a request, or empty for paths
+def __get_file_type(request: Request) -> str:
+    if request.source == SOURCE_PATH:
+        return ""
+    if request.source not in FILE_TYPES:
+        raise ValueError(f"Unsupported source {request.source}")
+    return FILE_TYPES[request.source]
+
+
+# Removes the socket file left by a server that is not running anymore
+def __remove_stale_socket(path: str) -> None:
+    if not os.path.exists(path) or not stat.S_ISSOCK(os.stat(path).st_mode):
+        return
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as probe:
+        try:
+            probe.connect(path)
+        except ConnectionRefusedError:
+            os.unlink(path)
+            return
+    raise OSError(errno.EADDRINUSE, "A server is already listening on", path)
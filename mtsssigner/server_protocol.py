@@ -0,0 +1,154 @@
+import ipaddress
+import socket
+import struct
+from typing import List, NamedTuple, Tuple, Union
+
+# Binary protocol of the signing server (see mtsssigner/server.py). Every message is
+# a frame: the length of its body (uint32, big endian) followed by the body.
+#
+# A request body is: request id (uint32, chosen by the client), operation (uint8),
+# source (uint8) and its fields. A response body is: the id of its request (uint32),
+# status (uint8) and its fields. Fields are byte strings, each prefixed by its length
+# (uint32). Responses are sent as soon as they are ready, so a client may send many
+# requests on a connection (pipelining) and match the responses by id.
+#
+# Operation    Request fields         Response fields (OK)
+# SIGN         message                signature
+# VERIFY       message, signature     valid (uint8), not modified (uint8)
+# LOCATE       message, signature     valid (uint8), modified blocks (uint32 each)
+#
+# With SOURCE_PATH, message and signature are paths (UTF-8) on the server, and an
+# empty signature path means the default signature path of the message. With
+# SOURCE_TXT or SOURCE_XML, they are the content of the message (UTF-8) and of the
+# signature. An ERROR response has the error message (UTF-8) as its only field.
+
+SIGN = 1
+VERIFY = 2
+LOCATE = 3
+OPERATIONS = {"sign": SIGN, "verify": VERIFY, "locate": LOCATE}
+
+SOURCE_PATH = 0
+SOURCE_TXT = 1
+SOURCE_XML = 2
+# file type of the messages of every content source
+FILE_TYPES = {SOURCE_TXT: "txt", SOURCE_XML: "xml"}
+SOURCES = {file_type: source for source, file_type in FILE_TYPES.items()}
+
+OK = 0
+ERROR = 1
+
+MAX_FRAME_BYTES = 1024 * 1024 * 1024
+
+__LENGTH_FORMAT = ">I"
+__LENGTH_SIZE = struct.calcsize(__LENGTH_FORMAT)
+__REQUEST_FORMAT = ">IBB"
+__REQUEST_SIZE = struct.calcsize(__REQUEST_FORMAT)
+__RESPONSE_FORMAT = ">IB"
+__RESPONSE_SIZE = struct.calcsize(__RESPONSE_FORMAT)
+
+
+class Request(NamedTuple):
+    request_id: int
+    operation: int
+    source: int
+    fields: List[bytes]
+
+
+class Response(NamedTuple):
+    request_id: int
+    status: int
+    fields: List[bytes]
+
+
+def encode_request(request: Request) -> bytes:
+    return __encode_frame(struct.pack(__REQUEST_FORMAT, request.request_id, request.operation, request.source),
+                          request.fields)
+
+
+def decode_request(body: bytes) -> Request:
+    if len(body) < __REQUEST_SIZE:
+        raise ValueError("Truncated request")
+    request_id, operation, source = struct.unpack_from(__REQUEST_FORMAT, body)
+    return Request(request_id, operation, source, __decode_fields(body, __REQUEST_SIZE))
+
+
+def encode_response(response: Response) -> bytes:
+    return __encode_frame(struct.pack(__RESPONSE_FORMAT, response.request_id, response.status), response.fields)
+
+
+def decode_response(body: bytes) -> Response:
+    if len(body) < __RESPONSE_SIZE:
+        raise ValueError("Truncated response")
+    request_id, status = struct.unpack_from(__RESPONSE_FORMAT, body)
+    return Response(request_id, status, __decode_fields(body, __RESPONSE_SIZE))
+
+
+# Request id of a request body, read before decoding it (0 when truncated)
+def get_request_id(body: bytes) -> int:
+    return struct.unpack_from(">I", body)[0] if len(body) >= 4 else 0
+
+
+# Returns the length of the body of a frame from its first bytes
+def decode_frame_length(prefix: bytes) -> int:
+    length, = struct.unpack(__LENGTH_FORMAT, prefix)
+    if length > MAX_FRAME_BYTES:
+        raise ValueError(f"Frame of {length} bytes exceeds the limit of {MAX_FRAME_BYTES} bytes")
+    return length
+
+
+def get_frame_length_size() -> int:
+    return __LENGTH_SIZE
+
+
+# Modified blocks of a LOCATE response
+def encode_blocks(blocks: List[int]) -> bytes:
+    return struct.pack(f">{len(blocks)}I", *blocks)
+
+
+def decode_blocks(field: bytes) -> List[int]:
+    return list(struct.unpack(f">{len(field) // 4}I", field))
+
+
+# Addresses are paths of Unix domain sockets, or host:port for TCP, where the host
+# must be a loopback address (by default, 127.0.0.1): the server is local, and
+# serves whoever connects to it
+def parse_address(address: str) -> Tuple[int, Union[str, Tuple[str, int]]]:
+    host, separator, port = address.rpartition(":")
+    if separator and port.isdigit() and "/" not in address:
+        host = host.strip("[]") or "127.0.0.1"
+        if not __is_loopback(host):
+            raise ValueError(f"{host} is not a loopback address; the server only listens on this host")
+        return socket.AF_INET6 if ":" in host else socket.AF_INET, (host, int(port))
+    return socket.AF_UNIX, address
+
+
+def __is_loopback(host: str) -> bool:
+    if host == "localhost":
+        return True
+    try:
+        return ipaddress.ip_address(host).is_loopback
+    except ValueError:
+        return False
+
+
+def __encode_frame(prefix: bytes, fields: List[bytes]) -> bytes:
+    parts = [prefix]
+    for field in fields:
+        parts.append(struct.pack(__LENGTH_FORMAT, len(field)))
+        parts.append(field)
+    body = b"".join(parts)
+    return struct.pack(__LENGTH_FORMAT, len(body)) + body
+
+
+def __decode_fields(body: bytes, offset: int) -> List[bytes]:
+    fields = []
+    while offset < len(body):
+        if offset + __LENGTH_SIZE > len(body):
+            raise ValueError("Truncated field")
+        length, = struct.unpack_from(__LENGTH_FORMAT, body, offset)
+        offset += __LENGTH_SIZE
+        if offset + length > len(body):
+            raise ValueError("Truncated field")
+        fields.append(body[offset:offset + length])
+        offset += length
+    return fields
@@ -0,0 +1,50 @@
+import json
+import struct
+from typing import Any, Dict, Tuple
+
+# Contains the optional header of MTSS signatures. Signatures built with the
+# default options keep the original layout (hashed tests | message hash |
+# signature), so they stay byte-identical. When the signer needs to record
+# parameters the verifier cannot infer (e.g. the real number of blocks of a
+# padded document), it prepends a header, which is covered by the signature:
+#   magic | version (1 byte) | metadata length (2 bytes) | metadata (JSON)
+
+SIGNATURE_HEADER_MAGIC = b"MTSS"
+SIGNATURE_HEADER_VERSION = 1
+
+# Content of the implicit blocks used to pad a document up to the number of blocks
+# of its CFF; their digest is the digest of an empty block
+PADDING_BLOCK = b""
+
+__PREFIX_FORMAT = ">4sBH"
+__PREFIX_SIZE = struct.calcsize(__PREFIX_FORMAT)
+
+
+def encode_signature_header(metadata: Dict[str, Any]) -> bytes:
+    encoded_metadata = json.dumps(metadata, sort_keys=True, separators=(",", ":")).encode("ascii")
+    return struct.pack(__PREFIX_FORMAT, SIGNATURE_HEADER_MAGIC,
+                       SIGNATURE_HEADER_VERSION, len(encoded_metadata)) + encoded_metadata
+
+
+# Splits the signed content of a signature into its header metadata and the
+# remaining content (hashed tests and message hash). Signatures without a
+# header return empty metadata and the content unchanged.
+def split_signature_header(content: bytes) -> Tuple[Dict[str, Any], bytes]:
+    if len(content) < __PREFIX_SIZE or not content.startswith(SIGNATURE_HEADER_MAGIC):
+        return {}, content
+    _, version, length = struct.unpack_from(__PREFIX_FORMAT, content)
+    if version != SIGNATURE_HEADER_VERSION or __PREFIX_SIZE + length > len(content):
+        return {}, content
+    try:
+        metadata = json.loads(content[__PREFIX_SIZE:__PREFIX_SIZE + length].decode("ascii"))
+    except ValueError:
+        # a legacy signature whose first test hash happens to start with the magic
+        return {}, content
+    if not isinstance(metadata, dict):
+        return {}, content
+    return metadata, content[__PREFIX_SIZE + length:]
+
+
+# Tells whether a signature header records a hierarchical signature (see signer.sign)
+def is_hierarchical(header: bytes) -> bool:
+    return bool(split_signature_header(header)[0].get("hierarchical"))
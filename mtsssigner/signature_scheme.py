@@ -1,7 +1,10 @@
 import hashlib
+import mmap
+import threading
 import traceback
 from typing import Dict, Callable, Union
 
+import numpy
 import oqs
 from Crypto.Hash import SHA256, SHA512, SHA3_256, SHA3_512
 from Crypto.PublicKey import RSA, ECC
@@ -14,6 +17,17 @@ import mtsssigner.logger as logger
 SCHEME_NOT_SUPPORTED = ("Signature algorithms must be 'PKCS#1 v1.5' or 'Ed25519' or 'Dilithium2' or 'Dilithium3' or "
                         "'Dilithium5'")
 
+# Native (OpenSSL or built-in) implementations of the hash functions, used to
+# hash many blocks at once; they produce the same digests as PyCryptodome
+HASHLIB_ALGORITHMS = {
+    "SHA256": "sha256",
+    "SHA512": "sha512",
+    "SHA3-256": "sha3_256",
+    "SHA3-512": "sha3_512",
+    "BLAKE2B": "blake2b",
+    "BLAKE2S": "blake2s",
+}
+
 
 class Blake2bHash:
     oid = '1.3.6.1.4.1.1722.12.2.1.16'
@@ -95,6 +109,45 @@ class SigScheme:
             content = content.encode()
         return self.hash[self.hash_function](content).digest()
 
+    # Returns an incremental hash object (update, digest), natively implemented
+    # whenever possible
+    def new_hash(self):
+        try:
+            return hashlib.new(HASHLIB_ALGORITHMS[self.hash_function])
+        except ValueError:
+            # not available in this build of Python
+            return self.hash[self.hash_function]()
+
+    # Returns the (number of blocks, digest size) matrix of the digests of the blocks
+    # of a buffer, where block i is buffer[offsets[i]:offsets[i + 1]], or
+    # buffer[offsets[i]:ends[i]] when the ends of the blocks are given. Every block
+    # is hashed by a copy of a single hash object, with none of the per-call work
+    # of get_digest.
+    def get_digests(self, buffer: Union[bytes, bytearray, memoryview, numpy.ndarray, mmap.mmap],
+                    offsets: numpy.ndarray, ends: numpy.ndarray = None) -> numpy.ndarray:
+        view = memoryview(buffer).cast("B")
+        offsets = numpy.asarray(offsets, dtype=numpy.int64)
+        if ends is None:
+            starts, ends = offsets[:-1].tolist(), offsets[1:].tolist()
+        else:
+            starts, ends = offsets.tolist(), numpy.asarray(ends, dtype=numpy.int64).tolist()
+        try:
+            template = hashlib.new(HASHLIB_ALGORITHMS[self.hash_function])
+        except ValueError:
+            # not available in this build of Python
+            template = None
+        digests = []
+        if template is not None:
+            for start, end in zip(starts, ends):
+                hash_object = template.copy()
+                hash_object.update(view[start:end])
+                digests.append(hash_object.digest())
+        else:
+            hash_constructor = self.hash[self.hash_function]
+            for start, end in zip(starts, ends):
+                digests.append(hash_constructor(view[start:end]).digest())
+        return numpy.frombuffer(b"".join(digests), dtype=numpy.uint8).reshape((len(digests), self.digest_size_bytes))
+
     def sign(self, private_key: Union[RsaKey, EccKey, bytes], content: Union[bytes, bytearray]) -> bytes:
         hash_now = self.hash[self.hash_function](content)
         if self.sig_algorithm == "PKCS#1 v1.5":
@@ -107,6 +160,30 @@ class SigScheme:
         else:
             raise ValueError(SCHEME_NOT_SUPPORTED)
 
+    # Returns a function signing contents like sign, whose signing context (PKCS#1
+    # v1.5, EdDSA or liboqs signer) is created only once for the private key. The
+    # function can be called from several threads.
+    def get_signing_function(self, private_key: Union[RsaKey, EccKey, bytes]) -> Callable[[bytes], bytes]:
+        hash_constructor = self.hash[self.hash_function]
+        if self.sig_algorithm == "PKCS#1 v1.5":
+            rsa_signer = pkcs1_15.new(private_key)
+            return lambda content: rsa_signer.sign(hash_constructor(content))
+        elif self.sig_algorithm == "Ed25519":
+            eddsa_signer = eddsa.new(private_key, 'rfc8032')
+            return lambda content: eddsa_signer.sign(hash_constructor(content))
+        elif self.sig_algorithm.startswith("Dilithium"):
+            oqs_signer = oqs.Signature(self.sig_algorithm, private_key)
+            # liboqs signers are not documented as thread-safe
+            lock = threading.Lock()
+
+            def sign_with_oqs(content: bytes) -> bytes:
+                digest = hash_constructor(content).digest()
+                with lock:
+                    return oqs_signer.sign(digest)
+            return sign_with_oqs
+        else:
+            raise ValueError(SCHEME_NOT_SUPPORTED)
+
     def verify(self, public_key: Union[RsaKey, EccKey, bytes], content: Union[bytearray, bytes], signature: bytes) -> bool:
         hash_now = self.hash[self.hash_function](content)
         if self.sig_algorithm == "PKCS#1 v1.5":
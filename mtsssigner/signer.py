@@ -1,91 +1,429 @@
-from typing import Union, List
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Tuple, Union
 
 from Crypto.PublicKey.ECC import EccKey
 from Crypto.PublicKey.RSA import RsaKey
+import numpy
 
 from mtsssigner import logger
-from mtsssigner.cff_builder import (create_cff,
-                                    get_q_from_k_and_n,
-                                    create_1_cff,
-                                    get_t_for_1_cff,
-                                    get_d)
+from mtsssigner.cff import CFF
+from mtsssigner.cff_builder import get_q_from_k_and_n, get_d, get_padded_q
+from mtsssigner.cff_cache import get_cff_from_construction
+from mtsssigner.cff_constructions import get_signature_metadata
+from mtsssigner.cff_planner import get_feasible_cffs, load_cost_profile, plan_hierarchical_cff
+from mtsssigner.digest_matrix import get_buffer_digest_matrix, get_digest_matrix, get_group_digest_matrix, hash_tests
+from mtsssigner.signature_header import encode_signature_header, is_hierarchical, PADDING_BLOCK
 from mtsssigner.signature_scheme import SigScheme
-from mtsssigner.utils.file_and_block_utils import get_message_and_blocks_from_file, read_cff_from_file
+from mtsssigner.utils.file_and_block_utils import (TxtDocument,
+                                                   get_message_and_blocks_from_file,
+                                                   map_txt_file)
 from mtsssigner.utils.prime_utils import is_prime_power
 
+# Blocks consumed at a time by sign_stream
+STREAM_CHUNK_BLOCKS = 4096
+STREAM_CHUNK_BYTES = 16 * 1024 * 1024
+# CFF plans (one per number of blocks) kept by a Signer
+MAX_SIGNER_PLANS = 1024
+
 
 # Signs a file using a modification tolerant signature scheme, which
 # allows for localization and correction of modifications to the file
 # within certain limitations. The number of blocks created from the file
-# (their creation depends on the file type) must be a prime power.
+# (their creation depends on the file type) must be a prime power, unless
+# padding is enabled: then the blocks are padded with implicit empty blocks
+# up to the next suitable q^k, and the real number of blocks is recorded in
+# the signature header.
+# If k is not supplied, the CFF is chosen by the planner among those with at
+# least target_d modifiable blocks whose signature fits in max_size_bytes,
+# optionally only among the CFFs of the named construction. A CFF can also be
+# given explicitly by its construction name and parameters.
+# With a group_size, the signature is hierarchical: blocks are grouped into
+# super-blocks of group_size blocks, an outer CFF over the super-blocks tells the
+# verifier which super-blocks were modified, and the tests of the Kronecker product
+# of the outer CFF and an inner CFF over the blocks of a super-block localize the
+# modified blocks, rebuilding only the tests of modified super-blocks. The planner
+# chooses the group size when it is AUTO_GROUP_SIZE, and signs with a flat CFF
+# when its signature is smaller (see plan_hierarchical_cff); explicit "kronecker"
+# parameters give both levels instead.
 # https://crypto.stackexchange.com/questions/95878/does-the-signature-length-of-rs256-depend-on-the-size-of-the-rsa-key-used-for-si
 def sign(sig_scheme: SigScheme, message_file_path: str, private_key_path: str,
-         max_size_bytes: int = 0, k: int = 0) -> bytearray:
-    return sign_raw(*pre_sign(sig_scheme, message_file_path, private_key_path, k))
+         max_size_bytes: int = 0, k: int = 0, target_d: int = 1, padding: bool = False,
+         construction: str = "", parameters: Dict[str, Any] = None, group_size: int = 0) -> bytearray:
+    return sign_raw(*pre_sign(sig_scheme, message_file_path, private_key_path, k, max_size_bytes,
+                              target_d, padding, construction, parameters, group_size))
 
 
 # deals with IO operations and CFF create/cache read and separating message in blocks
-def pre_sign(sig_scheme: SigScheme, message_file_path: str, private_key_path: str, k: int = 0):
-    # get blocks from message type specific
-    message, blocks = get_message_and_blocks_from_file(message_file_path)
-    if not is_prime_power(len(blocks)):
-        logger.log_error(("Number of blocks generated must be a prime power "
-                          f"to use polynomial CFF (Number of blocks = {len(blocks)}), using 1-CFF"))
-        k = 1
-    n: int = len(blocks)
-
-    # create/read CFF
-    if k == 1:
-        try:
-            cff = read_cff_from_file(get_t_for_1_cff(n), n, 1)
-            logger.log_cff_from_file()
-        except IOError:
-            cff = create_1_cff(n)
-    elif k > 1:
-        q = get_q_from_k_and_n(k, n)
-        try:
-            cff = read_cff_from_file(q ** 2, q ** k, get_d(q, k))
-            logger.log_cff_from_file()
-        except IOError:
-            cff = create_cff(q, k)
+def pre_sign(sig_scheme: SigScheme, message_file_path: str, private_key_path: str, k: int = 0,
+             max_size_bytes: int = 0, target_d: int = 1, padding: bool = False,
+             construction: str = "", parameters: Dict[str, Any] = None, group_size: int = 0):
+    # get blocks from message type specific; txt files are read through their
+    # mapping, as by sign_stream, so files that are not UTF-8 text are signed too
+    if message_file_path[-3:] == "txt":
+        with map_txt_file(message_file_path) as document:
+            blocks = document.get_blocks()
+        message = b"\n".join(blocks)
     else:
-        raise Exception("Either max size or 'K' value must be provided")
+        message, blocks = get_message_and_blocks_from_file(message_file_path)
+    n: int = len(blocks)
 
+    # read private key and gets object (its signature length is needed for planning)
+    private_key = sig_scheme.get_private_key(private_key_path)
+    cff, header = __get_cff_and_header(sig_scheme, message_file_path, private_key_path, n, blocks, k,
+                                       max_size_bytes, target_d, padding, construction, parameters, group_size)
     cff_dimensions = (len(cff), n)
-    if k > 1:
-        d = get_d(q, k)
-        logger.log_signature_parameters(message_file_path, private_key_path, n,
-                                        sig_scheme, d, len(cff), blocks, q, k, 0)
+
+    # return necessary information to sign raw
+    return sig_scheme, message, blocks, private_key, cff_dimensions, cff, header, is_hierarchical(header)
+
+
+# Same as pre_sign for sign_stream: the (txt) file is mapped in memory and its
+# line breaks located, to choose the CFF, and its blocks are then hashed from the
+# mapping (see TxtDocument)
+def pre_sign_stream(sig_scheme: SigScheme, message_file_path: str, private_key_path: str, k: int = 0,
+                    max_size_bytes: int = 0, target_d: int = 1, padding: bool = False,
+                    construction: str = "", parameters: Dict[str, Any] = None, group_size: int = 0):
+    if message_file_path[-3:] != "txt":
+        raise ValueError("Only txt files can be signed as a stream of blocks")
+    blocks, n = get_txt_stream(message_file_path)
+    try:
+        private_key = sig_scheme.get_private_key(private_key_path)
+        cff, header = __get_cff_and_header(sig_scheme, message_file_path, private_key_path, n, None, k,
+                                           max_size_bytes, target_d, padding, construction, parameters, group_size)
+    except BaseException:
+        blocks.close()
+        raise
+    return sig_scheme, blocks, n, private_key, cff, header, is_hierarchical(header)
+
+
+# Returns the blocks of a txt file for sign_stream, mapped in memory (see
+# map_txt_file), and their number
+def get_txt_stream(message_file_path: str) -> Tuple[TxtDocument, int]:
+    document = map_txt_file(message_file_path)
+    return document, len(document)
+
+
+# Chooses the CFF for n blocks and encodes the signature header it needs, logging
+# the signature parameters
+def __get_cff_and_header(sig_scheme: SigScheme, message_file_path: str, private_key_path: str, n: int,
+                         blocks: Union[List[str], None], k: int, max_size_bytes: int, target_d: int,
+                         padding: bool, construction: str, parameters: Union[Dict[str, Any], None],
+                         group_size: int) -> Tuple[CFF, bytes]:
+    construction, parameters, header = plan_signature(sig_scheme, n, k, max_size_bytes, target_d, padding,
+                                                      construction, parameters, group_size)
+    cff = get_signature_cff(construction, parameters, n)
+    if cff.n != n:
+        logger.log_block_padding(n, cff.n)
+
+    if cff.d > 1:
+        logger.log_signature_parameters(message_file_path, private_key_path, n, sig_scheme, cff.d, len(cff),
+                                        blocks, parameters.get("q", -1), parameters.get("k", -1), max_size_bytes)
     else:
-        d = 1
         logger.log_signature_parameters(message_file_path, private_key_path, n,
-                                        sig_scheme, d, len(cff), blocks)
+                                        sig_scheme, cff.d, len(cff), blocks, max_size_bytes=max_size_bytes)
+    return cff, header
 
-    # read private key and gets object
-    private_key = sig_scheme.get_private_key(private_key_path)
 
-    # return necessary information to sign raw
-    return sig_scheme, message, blocks, private_key, cff_dimensions, cff
-
-
-def sign_raw(sig_scheme: SigScheme, message: str, blocks: List[str], private_key: Union[RsaKey, EccKey, bytes],
-             cff_dimensions, cff) -> bytearray:
-    tests = []
-    for test in range(cff_dimensions[0]):
-        concatenation = bytes()
-        for block in range(cff_dimensions[1]):
-            if cff[test][block] == 1:
-                concatenation += sig_scheme.get_digest(blocks[block])
-        tests.append(concatenation)
-
-    signature = bytearray()
-    for test in tests:
-        test_hash = sig_scheme.get_digest(test)
-        signature += test_hash
+# Chooses the construction and parameters of the CFF for n blocks (see sign) and
+# encodes the signature header they need. The signature length of the scheme
+# (set when its private key is read) must be known.
+def plan_signature(sig_scheme: SigScheme, n: int, k: int = 0, max_size_bytes: int = 0, target_d: int = 1,
+                   padding: bool = False, construction: str = "", parameters: Dict[str, Any] = None,
+                   group_size: int = 0) -> Tuple[str, Dict[str, Any], bytes]:
+    hierarchical = group_size != 0
+    if hierarchical and parameters is None:
+        levels = plan_hierarchical_cff(n, sig_scheme.digest_size_bytes, sig_scheme.signature_length_bytes,
+                                       target_d, max_size_bytes, load_cost_profile(sig_scheme.hash_function),
+                                       group_size)
+        if levels is None:
+            logger.log_hierarchical_fallback(n, group_size)
+            hierarchical = False
+        else:
+            logger.log_cff_plans(list(levels))
+            outer, inner = levels
+            construction, parameters = "kronecker", {
+                "first": {"construction": outer.construction, "parameters": outer.parameters},
+                "second": {"construction": inner.construction, "parameters": inner.parameters},
+            }
+
+    if hierarchical:
+        # explicit parameters of a hierarchical signature give both levels
+        if construction != "kronecker":
+            raise ValueError("The CFF of a hierarchical signature must be a Kronecker product")
+    elif parameters is not None:
+        if not construction:
+            raise ValueError("The construction of the supplied CFF parameters is required")
+    elif k == 0:
+        plans = get_feasible_cffs(n, sig_scheme.digest_size_bytes, sig_scheme.signature_length_bytes,
+                                  target_d, max_size_bytes, load_cost_profile(sig_scheme.hash_function),
+                                  padding, [construction] if construction else None)
+        logger.log_cff_plans(plans)
+        if not plans:
+            raise ValueError(f"No CFF can sign {n} blocks with d >= {target_d} within "
+                             f"a signature of {max_size_bytes} bytes")
+        construction, parameters = plans[0].construction, plans[0].parameters
+    elif k > 1 and padding and (not is_prime_power(n) or round(numpy.power(n, 1 / k)) ** k != n):
+        construction, parameters = "polynomial", {"q": get_padded_q(k, n), "k": k}
+    elif not is_prime_power(n):
+        logger.log_error(("Number of blocks generated must be a prime power "
+                          f"to use polynomial CFF (Number of blocks = {n}), using 1-CFF"))
+        construction, parameters = "sperner", {"n": n}
+    elif k == 1:
+        construction, parameters = "sperner", {"n": n}
+    else:
+        q = get_q_from_k_and_n(k, n)
+        if get_d(q, k) == 1:
+            construction, parameters = "sperner", {"n": n}
+        else:
+            construction, parameters = "polynomial", {"q": q, "k": k}
+
+    header = b""
+    metadata = get_signature_metadata(construction, parameters, n)
+    if hierarchical:
+        metadata["hierarchical"] = True
+    if metadata:
+        header = encode_signature_header(metadata)
+    return construction, parameters, header
+
+
+# Gets the CFF of a plan from the process cache (read from file or computed on first use)
+def get_signature_cff(construction: str, parameters: Dict[str, Any], n: int) -> CFF:
+    cff = get_cff_from_construction(construction, parameters)
+    if cff.n < n:
+        raise ValueError(f"The supplied CFF has {cff.n} blocks, fewer than the {n} blocks of the message")
+    return cff
+
+
+def sign_raw(sig_scheme: SigScheme, message: Union[str, bytes], blocks: List[Union[str, bytes]], private_key: Union[RsaKey, EccKey, bytes],
+             cff_dimensions, cff: CFF, header: bytes = b"", hierarchical: bool = False) -> bytearray:
+    signature = get_signed_content(sig_scheme, message, blocks, cff, header, hierarchical)
+    signature += sig_scheme.sign(private_key, signature)
+    return signature
+
+
+# Returns the content signed by the signature of the message: the header, the
+# hashed tests and the hash of the message
+def get_signed_content(sig_scheme: SigScheme, message: Union[str, bytes], blocks: List[Union[str, bytes]],
+                       cff: CFF, header: bytes = b"", hierarchical: bool = False) -> bytearray:
+    # every block is hashed once; the blocks of a padded document are followed by implicit empty blocks
+    block_hashes = get_digest_matrix(sig_scheme, blocks, cff.n)
+
+    signature = bytearray(header)
+    if hierarchical:
+        # the outer tests hash the digests of the super-blocks, which precede the tests of the CFF
+        super_block_hashes = get_super_block_hashes(sig_scheme, block_hashes, cff.second.n)
+        signature += b"".join(hash_tests(sig_scheme, super_block_hashes, cff.first))
+
+    signature += b"".join(hash_tests(sig_scheme, block_hashes, cff))
     message_hash = sig_scheme.get_digest(message)
     signature += message_hash
+    return signature
+
+
+# Long-lived signer, for signing many documents with the same key and options
+# (those of sign): the private key and its signing context are loaded once, and
+# the CFF planned for each number of blocks is reused, so every signature only
+# costs hashing and signing. A Signer can be shared by threads.
+class Signer:
+    sig_scheme: SigScheme
+    private_key: Union[RsaKey, EccKey, bytes]
+    options: Dict[str, Any]
+
+    def __init__(self, sig_scheme: SigScheme, private_key_path: str, k: int = 0, max_size_bytes: int = 0,
+                 target_d: int = 1, padding: bool = False, construction: str = "",
+                 parameters: Dict[str, Any] = None, group_size: int = 0):
+        self.sig_scheme = sig_scheme
+        self.private_key = sig_scheme.get_private_key(private_key_path)
+        self.options = {"k": k, "max_size_bytes": max_size_bytes, "target_d": target_d, "padding": padding,
+                        "construction": construction, "parameters": parameters, "group_size": group_size}
+        self.__sign_content: Callable[[bytes], bytes] = sig_scheme.get_signing_function(self.private_key)
+        self.__plans: "OrderedDict[int, Tuple[str, Dict[str, Any], bytes]]" = OrderedDict()
+        self.__lock = threading.Lock()
+
+    # Signs a message given by its blocks; without message, the message is made of
+    # the blocks joined by line breaks, as the lines of a txt file
+    def sign(self, blocks: List[Union[str, bytes]], message: Union[str, bytes] = None) -> bytearray:
+        if message is None:
+            message = b"\n".join(block.encode() if isinstance(block, str) else block for block in blocks)
+        cff, header = self.__get_cff_and_header(len(blocks))
+        signature = get_signed_content(self.sig_scheme, message, blocks, cff, header, is_hierarchical(header))
+        signature += self.__sign_content(signature)
+        return signature
+
+    # Signs a file, streaming the lines of txt files (see sign_stream)
+    def sign_file(self, message_file_path: str) -> bytearray:
+        if message_file_path[-3:] != "txt":
+            message, blocks = get_message_and_blocks_from_file(message_file_path)
+            return self.sign(blocks, message)
+        blocks, n = get_txt_stream(message_file_path)
+        try:
+            cff, header = self.__get_cff_and_header(n)
+            signature = get_streamed_signed_content(self.sig_scheme, blocks, n, cff, header,
+                                                    is_hierarchical(header))
+        finally:
+            blocks.close()
+        signature += self.__sign_content(signature)
+        return signature
+
+    def __get_cff_and_header(self, n: int) -> Tuple[CFF, bytes]:
+        with self.__lock:
+            plan = self.__plans.get(n)
+            if plan is not None:
+                self.__plans.move_to_end(n)
+        if plan is None:
+            plan = plan_signature(self.sig_scheme, n, **self.options)
+            with self.__lock:
+                self.__plans[n] = plan
+                if len(self.__plans) > MAX_SIGNER_PLANS:
+                    self.__plans.popitem(last=False)
+        construction, parameters, header = plan
+        return get_signature_cff(construction, parameters, n), header
+
+
+# Signs a document given as an iterable of n blocks (e.g. the lines of a file, rows
+# of a database cursor), producing the same signature as sign_raw for the message
+# made of the blocks joined by separator (as the lines of a txt file). Blocks are
+# consumed in chunks, and the digests of a chunk are appended to the incremental
+# hash of every test containing them (and of the outer tests, for hierarchical
+# signatures), so the memory used depends on t and on the chunk size only.
+def sign_stream(sig_scheme: SigScheme, blocks: Iterable[Union[str, bytes]], n: int,
+                private_key: Union[RsaKey, EccKey, bytes], cff: CFF, header: bytes = b"",
+                hierarchical: bool = False, separator: bytes = b"\n") -> bytearray:
+    signature = get_streamed_signed_content(sig_scheme, blocks, n, cff, header, hierarchical, separator)
+    signature += sig_scheme.sign(private_key, signature)
+    return signature
+
+
+# Same as get_signed_content, for the blocks of sign_stream. The blocks of a
+# TxtDocument (joined by line breaks) are hashed directly from its buffer.
+def get_streamed_signed_content(sig_scheme: SigScheme, blocks: Iterable[Union[str, bytes]], n: int, cff: CFF,
+                                header: bytes = b"", hierarchical: bool = False,
+                                separator: bytes = b"\n") -> bytearray:
+    if isinstance(blocks, TxtDocument) and separator == b"\n":
+        if len(blocks) != n:
+            raise ValueError(f"The stream has {len(blocks)} blocks instead of the {n} blocks announced")
+        signature = __get_streamed_tests(sig_scheme, __get_document_digests(sig_scheme, blocks, cff.n), cff, header,
+                                         hierarchical)
+        signature += get_document_message_hash(sig_scheme, blocks)
+        return signature
+    message_hash = sig_scheme.new_hash()
+    signature = __get_streamed_tests(sig_scheme, __get_stream_digests(sig_scheme, blocks, n, cff.n, separator,
+                                                                      message_hash), cff, header, hierarchical)
+    signature += message_hash.digest()
+    return signature
 
-    signed_t = sig_scheme.sign(private_key, signature)
-    signature += signed_t
 
+# Returns the hash of the message of a mapped txt file (see TxtDocument.get_message_chunks)
+def get_document_message_hash(sig_scheme: SigScheme, document: TxtDocument) -> bytes:
+    message_hash = sig_scheme.new_hash()
+    for chunk in document.get_message_chunks():
+        message_hash.update(chunk)
+    return message_hash.digest()
+
+
+# Returns the header and the hashed tests (outer tests first) of the digests of
+# the blocks, given in consecutive chunks
+def __get_streamed_tests(sig_scheme: SigScheme, digest_chunks: Iterator[numpy.ndarray], cff: CFF, header: bytes,
+                         hierarchical: bool) -> bytearray:
+    test_hashes = [sig_scheme.new_hash() for _ in range(cff.t)]
+    outer_test_hashes = [sig_scheme.new_hash() for _ in range(cff.first.t)] if hierarchical else []
+    # digests of the blocks of the last, incomplete super-block
+    pending_digests = numpy.zeros((0, sig_scheme.digest_size_bytes), dtype=numpy.uint8)
+
+    start = 0
+    for digests in digest_chunks:
+        __update_test_hashes(test_hashes, cff, start, digests)
+        if hierarchical:
+            pending_digests = numpy.concatenate([pending_digests, digests])
+            complete = len(pending_digests) - len(pending_digests) % cff.second.n
+            first_super_block = (start + len(digests) - len(pending_digests)) // cff.second.n
+            super_block_hashes = get_super_block_hashes(sig_scheme, pending_digests[:complete], cff.second.n)
+            __update_test_hashes(outer_test_hashes, cff.first, first_super_block, super_block_hashes)
+            pending_digests = pending_digests[complete:]
+        start += len(digests)
+
+    signature = bytearray(header)
+    for test_hash in outer_test_hashes + test_hashes:
+        signature += test_hash.digest()
     return signature
+
+
+# Yields the digests of the chunks of blocks of a stream, appending the blocks
+# (joined by separator) to the message hash
+def __get_stream_digests(sig_scheme: SigScheme, blocks: Iterable[Union[str, bytes]], n: int, padded_n: int,
+                         separator: bytes, message_hash: Any) -> Iterator[numpy.ndarray]:
+    start = 0
+    for chunk in __get_chunks(blocks, padded_n, n):
+        if start < n:
+            encoded_chunk = [block.encode() if isinstance(block, str) else block for block in chunk]
+            message_hash.update((separator if start > 0 else b"") + separator.join(encoded_chunk))
+            yield get_digest_matrix(sig_scheme, chunk)
+        else:
+            yield __get_padding_digests(sig_scheme, len(chunk))
+        start += len(chunk)
+
+
+# Yields the digests of the chunks of blocks of a mapped document, hashed from its
+# buffer, followed by the digests of its padding blocks up to padded_n
+def __get_document_digests(sig_scheme: SigScheme, document: TxtDocument, padded_n: int) -> Iterator[numpy.ndarray]:
+    for start in range(0, len(document), STREAM_CHUNK_BLOCKS):
+        end = min(start + STREAM_CHUNK_BLOCKS, len(document))
+        yield get_buffer_digest_matrix(sig_scheme, document.buffer, document.starts[start:end],
+                                       document.ends[start:end])
+    for start in range(len(document), padded_n, STREAM_CHUNK_BLOCKS):
+        yield __get_padding_digests(sig_scheme, min(start + STREAM_CHUNK_BLOCKS, padded_n) - start)
+
+
+# the implicit empty blocks of a padded document
+def __get_padding_digests(sig_scheme: SigScheme, count: int) -> numpy.ndarray:
+    return numpy.repeat(numpy.frombuffer(sig_scheme.get_digest(PADDING_BLOCK), dtype=numpy.uint8)[None],
+                        count, axis=0)
+
+
+# Yields the blocks in chunks of up to STREAM_CHUNK_BLOCKS blocks (and about
+# STREAM_CHUNK_BYTES bytes), followed by chunks of padding blocks up to padded_n
+def __get_chunks(blocks: Iterable[Union[str, bytes]], padded_n: int, n: int) -> Iterator[List[Union[str, bytes]]]:
+    count = 0
+    chunk = []
+    size = 0
+    for block in blocks:
+        count += 1
+        if count > n:
+            raise ValueError(f"The stream has more than the {n} blocks announced")
+        chunk.append(block)
+        size += len(block)
+        if len(chunk) == STREAM_CHUNK_BLOCKS or size >= STREAM_CHUNK_BYTES:
+            yield chunk
+            chunk = []
+            size = 0
+    if chunk:
+        yield chunk
+    if count < n:
+        raise ValueError(f"The stream has {count} blocks instead of the {n} blocks announced")
+    for start in range(n, padded_n, STREAM_CHUNK_BLOCKS):
+        yield [PADDING_BLOCK] * (min(start + STREAM_CHUNK_BLOCKS, padded_n) - start)
+
+
+# Appends the digests of blocks start, start + 1, ... to the hashes of their tests,
+# in the order of the blocks
+def __update_test_hashes(test_hashes: List[Any], cff: CFF, start: int, digests: numpy.ndarray) -> None:
+    indptr, tests = cff.tests_of_blocks(start, start + len(digests))
+    if len(tests) == 0:
+        return
+    blocks = numpy.repeat(numpy.arange(len(digests)), numpy.diff(indptr))
+    # the stable sort keeps the blocks of each test in ascending order
+    order = numpy.argsort(tests, kind="stable")
+    tests = tests[order]
+    concatenations = memoryview(digests[blocks[order]].reshape(-1))
+    starts = numpy.concatenate([[0], numpy.flatnonzero(numpy.diff(tests)) + 1])
+    ends = numpy.append(starts[1:], len(tests))
+    digest_size = digests.shape[1]
+    for test, test_start, test_end in zip(tests[starts].tolist(), starts.tolist(), ends.tolist()):
+        test_hashes[test].update(concatenations[test_start * digest_size:test_end * digest_size])
+
+
+# Returns the digest matrix of the super-blocks of a hierarchical signature, each
+# computed over the digests of its group_size blocks
+def get_super_block_hashes(sig_scheme: SigScheme, block_hashes: numpy.ndarray, group_size: int) -> numpy.ndarray:
+    return get_group_digest_matrix(sig_scheme, block_hashes, group_size)
@@ -0,0 +1,183 @@
+import hashlib
+import os
+import struct
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterator, Union
+
+import numpy
+
+from mtsssigner.cff import SparseCFF, get_test_index_dtype
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+# Contains functions for reading and writing CFFs in the binary format of the
+# cffs/ store. A file holds a fixed size header followed by both CSR views of the
+# incidence matrix, each array aligned to 8 bytes, so it can be memory-mapped and
+# used by the signer and verifier without parsing or copying:
+#   header | block_indptr (int64, n+1) | test_indptr (int64, t+1)
+#          | test_blocks (int32, nnz) | block_tests (uint16 or int32, nnz)
+# Version 2 headers also hold a checksum (BLAKE2b-128) of everything after the
+# header, so corrupted files are detected on load.
+
+# The store shipped with the project, independent of the working directory
+CFF_DIRECTORY = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))), "cffs")
+CFF_FILE_EXTENSION = "cff"
+CFF_FILE_MAGIC = b"MTSSCFF\x00"
+CFF_FILE_VERSION = 2
+
+# magic, version, test index itemsize, construction, t, n, d, q, k, nnz[, checksum]
+__HEADER_FORMATS = {1: "<8sHH16sQQIIIQ", 2: "<8sHH16sQQIIIQ16s"}
+__HEADER_SIZES = {1: 64, 2: 96}
+__ALIGNMENT = 8
+
+
+# Gets the path of a CFF in the store, following the "{d}-CFF({t}, {n})" naming.
+# CFFs that are not identified by their dimensions alone are prefixed with a tag.
+def get_cff_file_path(t: int, n: int, d: int, extension: str = CFF_FILE_EXTENSION,
+                      directory: str = CFF_DIRECTORY, tag: str = "") -> str:
+    prefix = f"{tag}-" if tag else ""
+    return os.path.join(directory, f"{prefix}{d}-CFF({t}, {n}).{extension}")
+
+
+# Writes a CFF to a binary file. The construction name and its q and k
+# parameters (0 when not applicable) are recorded in the header. The file is
+# written under a temporary name and renamed, so readers never see it partially.
+def write_cff_to_binary_file(cff: SparseCFF, file_path: str, construction: str = "",
+                             q: int = 0, k: int = 0) -> None:
+    test_index_dtype = get_test_index_dtype(cff.t)
+    arrays = [
+        numpy.ascontiguousarray(cff.block_indptr, dtype=numpy.int64),
+        numpy.ascontiguousarray(cff.test_indptr, dtype=numpy.int64),
+        numpy.ascontiguousarray(cff.test_blocks, dtype=numpy.int32),
+        numpy.ascontiguousarray(cff.block_tests, dtype=test_index_dtype),
+    ]
+    checksum = hashlib.blake2b(digest_size=16)
+    for array in arrays:
+        checksum.update(array.tobytes())
+        checksum.update(b"\x00" * (-array.nbytes % __ALIGNMENT))
+    header = struct.pack(__HEADER_FORMATS[CFF_FILE_VERSION], CFF_FILE_MAGIC, CFF_FILE_VERSION,
+                         test_index_dtype.itemsize, construction.encode("ascii"), cff.t, cff.n, cff.d,
+                         q, k, len(cff.test_blocks), checksum.digest())
+    temporary_file_path = f"{file_path}.{os.getpid()}.tmp"
+    try:
+        with open(temporary_file_path, "wb") as file:
+            file.write(header.ljust(__HEADER_SIZES[CFF_FILE_VERSION], b"\x00"))
+            for array in arrays:
+                file.write(array.tobytes())
+                file.write(b"\x00" * (-array.nbytes % __ALIGNMENT))
+        os.replace(temporary_file_path, file_path)
+    finally:
+        if os.path.exists(temporary_file_path):
+            os.remove(temporary_file_path)
+
+
+# Reads the header of a binary CFF file
+def read_cff_header(file_path: str) -> Dict[str, Union[int, str, bytes]]:
+    with open(file_path, "rb") as file:
+        return __parse_header(file.read(max(__HEADER_SIZES.values())), file_path)
+
+
+# Opens a binary CFF file as a memory map. The index arrays of the returned CFF
+# are read-only views over the mapped file. The file is checked before use: its
+# size, checksum (version 2) and index arrays must be consistent with its header,
+# otherwise ValueError is raised.
+def read_cff_from_binary_file(file_path: str) -> SparseCFF:
+    buffer = numpy.memmap(file_path, dtype=numpy.uint8, mode="r")
+    header = __parse_header(bytes(buffer[:max(__HEADER_SIZES.values())]), file_path)
+    t, n, nnz = header["t"], header["n"], header["nnz"]
+    test_index_dtype = numpy.dtype(numpy.uint16) if header["test_index_size"] == 2 else numpy.dtype(numpy.int32)
+
+    offset = __HEADER_SIZES[header["version"]]
+    arrays = []
+    for dtype, length in [(numpy.int64, n + 1), (numpy.int64, t + 1),
+                          (numpy.int32, nnz), (test_index_dtype, nnz)]:
+        size = numpy.dtype(dtype).itemsize * length
+        if offset + size > len(buffer):
+            raise ValueError(f"CFF file {file_path} is truncated")
+        arrays.append(buffer[offset:offset + size].view(dtype))
+        offset += size + (-size % __ALIGNMENT)
+    if offset != len(buffer):
+        raise ValueError(f"CFF file {file_path} has {len(buffer) - offset} unexpected trailing bytes")
+    if header["version"] >= 2:
+        body = buffer[__HEADER_SIZES[header["version"]]:]
+        if hashlib.blake2b(memoryview(body), digest_size=16).digest() != header["checksum"]:
+            raise ValueError(f"CFF file {file_path} is corrupted (checksum mismatch)")
+
+    block_indptr, test_indptr, test_blocks, block_tests = arrays
+    for indptr, indexes, bound in [(block_indptr, block_tests, t), (test_indptr, test_blocks, n)]:
+        if indptr[0] != 0 or indptr[-1] != nnz or numpy.any(numpy.diff(indptr) < 0):
+            raise ValueError(f"CFF file {file_path} is corrupted (inconsistent index pointers)")
+        if nnz > 0 and (int(indexes.min()) < 0 or int(indexes.max()) >= bound):
+            raise ValueError(f"CFF file {file_path} is corrupted (index out of range)")
+    return SparseCFF.from_arrays(t, n, header["d"], test_indptr, test_blocks, block_indptr, block_tests)
+
+
+# Returns the CFF stored in a binary file, building and writing it when the file
+# is missing or corrupted. Files are replaced atomically, so they are read without
+# locking; only a build takes an exclusive lock on a companion .lock file, which
+# makes concurrent processes wait for the first one to build the CFF, and then read it.
+def read_or_build_cff_file(file_path: str, build: Callable[[], SparseCFF], construction: str = "",
+                           q: int = 0, k: int = 0) -> SparseCFF:
+    cff = __read_if_valid(file_path)
+    if cff is not None:
+        return cff
+    with __locked(file_path):
+        # another process may have built it while this one waited for the lock
+        cff = __read_if_valid(file_path)
+        if cff is not None:
+            return cff
+        write_cff_to_binary_file(build(), file_path, construction, q, k)
+        return read_cff_from_binary_file(file_path)
+
+
+# Reads a binary CFF file, or returns None when it is missing or corrupted
+def __read_if_valid(file_path: str) -> Union[SparseCFF, None]:
+    try:
+        return read_cff_from_binary_file(file_path)
+    except (OSError, ValueError):
+        return None
+
+
+@contextmanager
+def __locked(file_path: str) -> Iterator[None]:
+    os.makedirs(os.path.dirname(file_path) or ".", exist_ok=True)
+    with open(f"{file_path}.lock", "ab") as lock_file:
+        if fcntl is not None:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+def __parse_header(header_bytes: bytes, file_path: str) -> Dict[str, Union[int, str, bytes]]:
+    if len(header_bytes) < min(__HEADER_SIZES.values()) or header_bytes[:len(CFF_FILE_MAGIC)] != CFF_FILE_MAGIC:
+        raise ValueError(f"{file_path} is not a binary CFF file")
+    version = struct.unpack_from("<H", header_bytes, len(CFF_FILE_MAGIC))[0]
+    if version not in __HEADER_FORMATS:
+        raise ValueError(f"Unsupported CFF file version {version} in {file_path}")
+    if len(header_bytes) < __HEADER_SIZES[version]:
+        raise ValueError(f"CFF file {file_path} is truncated")
+    fields = struct.unpack_from(__HEADER_FORMATS[version], header_bytes)
+    _, version, test_index_size, construction, t, n, d, q, k, nnz = fields[:10]
+    return {
+        "version": version,
+        "test_index_size": test_index_size,
+        "construction": construction.rstrip(b"\x00").decode("ascii"),
+        "t": t, "n": n, "d": d, "q": q, "k": k, "nnz": nnz,
+        "checksum": fields[10] if version >= 2 else b"",
+    }
+
+
+# Reads a CFF stored as a space-separated incidence matrix (one test per line),
+# the format previously used by the cffs/ store
+def read_cff_from_txt_file(file_path: str, d: int) -> SparseCFF:
+    with open(file_path, "r", encoding="utf-8") as file:
+        lines = file.read().split("\n")
+    n = len(lines[0].split())
+    cells = numpy.array(" ".join(lines).split(), dtype=numpy.int8)
+    return SparseCFF.from_dense(cells.reshape((-1, n)), d)
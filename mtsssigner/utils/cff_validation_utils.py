@@ -0,0 +1,206 @@
+import multiprocessing
+import os
+from typing import Dict, List, NamedTuple, Tuple, Union
+
+import numpy
+
+from mtsssigner.cff import CFF, SparseCFF
+from mtsssigner.utils.shared_memory_utils import SharedArrays, get_shared_cff, share_cff
+
+# Contains the validation of d-CFFs. A CFF is d-disjunct (a d-CFF) when no column
+# (the tests of a block) is covered by the union of d other columns, so the search
+# is split by covered block: for block b, the columns of the other blocks are
+# restricted to the tests of b and packed into bitsets of one bit per test of b.
+# Finding d of those bitsets whose union is complete is a set cover search, which
+# branches only on the blocks that contain the first uncovered test and is pruned
+# as soon as the d largest remaining bitsets cannot cover the missing tests.
+# The work needed by a block is proportional to the incidences of its tests, so
+# large constructions can be validated, and the blocks are split across processes.
+# Bitsets are packed in 64-bit words in NumPy and searched as Python integers.
+
+# (covered block, covering blocks)
+Violation = Tuple[int, Tuple[int, ...]]
+
+__BLOCKS_PER_TASK = 256
+# below it, starting the workers costs more than the validation
+__MIN_BLOCKS_FOR_WORKERS = 4096
+__WORD_BITS = 64
+__COLUMN_BYTES_PER_INCIDENCE = 16
+__BYTE_BITS = numpy.array([bin(value).count("1") for value in range(256)], dtype=numpy.uint8)
+
+__worker_shared_cff: Union[SharedArrays, None] = None
+__worker_cff: Union[SparseCFF, None] = None
+
+
+# Returns the first violation of d-disjunctness (in order of covered block), or None
+# when the CFF is a d-CFF. d defaults to the d declared by the CFF.
+def find_d_disjunctness_violation(cff: CFF, d: int = 0, workers: int = 1) -> Union[Violation, None]:
+    cff = SparseCFF.from_cff(cff)
+    d = d or cff.d
+    if workers <= 1 or cff.n < __MIN_BLOCKS_FOR_WORKERS:
+        return __find_violation_in_blocks(cff, d, 0, cff.n)
+    tasks = [(d, start, min(start + __BLOCKS_PER_TASK, cff.n)) for start in range(0, cff.n, __BLOCKS_PER_TASK)]
+    # workers only need the CFF arrays, which they map from shared memory; spawning
+    # them keeps the (not fork-safe) JIT state of galois, used to build CFFs, out
+    context = multiprocessing.get_context("spawn")
+    with share_cff(cff) as shared_cff, \
+            context.Pool(workers, initializer=__set_worker_cff, initargs=(shared_cff,)) as process_pool:
+        # ordered, so the first violation found is the one of the lowest block
+        for violation in process_pool.imap(__find_violation_in_worker_blocks, tasks):
+            if violation is not None:
+                return violation
+    return None
+
+
+def is_d_disjunct(cff: CFF, d: int = 0, workers: int = 1) -> bool:
+    return find_d_disjunctness_violation(cff, d, workers) is None
+
+
+# Default number of worker processes of the validation
+def get_default_workers() -> int:
+    return os.cpu_count() or 1
+
+
+def __set_worker_cff(shared_cff: SharedArrays) -> None:
+    global __worker_shared_cff, __worker_cff
+    __worker_shared_cff = shared_cff
+    __worker_cff = get_shared_cff(shared_cff)
+
+
+def __find_violation_in_worker_blocks(task: Tuple[int, int, int]) -> Union[Violation, None]:
+    d, start, end = task
+    return __find_violation_in_blocks(__worker_cff, d, start, end)
+
+
+def __find_violation_in_blocks(cff: SparseCFF, d: int, start: int, end: int) -> Union[Violation, None]:
+    scratch = __create_scratch(cff)
+    for block in range(start, end):
+        covering = __find_covering_blocks(cff, d, block, scratch)
+        if covering is not None:
+            return block, covering
+    return None
+
+
+# Arrays reused across the covered blocks. CFFs with few, large tests (e.g. 1-CFFs)
+# keep the packed columns of every block over all tests, and restrict them with a
+# vectorized AND; the others restrict the columns through the incidences of the tests
+# of each block, accumulated in arrays indexed by block instead of sorting them.
+class __Scratch(NamedTuple):
+    columns: Union[numpy.ndarray, None]
+    counts: Union[numpy.ndarray, None]
+    words: Union[numpy.ndarray, None]
+    first_position: Union[numpy.ndarray, None]
+
+
+def __create_scratch(cff: SparseCFF) -> __Scratch:
+    nnz = len(cff.block_tests)
+    column_bytes = cff.n * -(-cff.t // __WORD_BITS) * 8
+    # bytes scanned per block against incidences visited per block, weighted by
+    # their measured relative costs
+    if column_bytes < __COLUMN_BYTES_PER_INCIDENCE * (nnz / max(cff.n, 1)) * (nnz / max(cff.t, 1)):
+        columns = numpy.zeros((cff.n, -(-cff.t // __WORD_BITS)), dtype=numpy.uint64)
+        blocks = numpy.repeat(numpy.arange(cff.n), numpy.diff(cff.block_indptr))
+        tests = cff.block_tests.astype(numpy.uint64)
+        numpy.bitwise_or.at(columns, (blocks, (tests // __WORD_BITS).astype(numpy.int64)),
+                            numpy.left_shift(numpy.uint64(1), tests % __WORD_BITS))
+        return __Scratch(columns, None, None, None)
+    max_tests = int(numpy.diff(cff.block_indptr).max()) if cff.n > 0 else 0
+    return __Scratch(None, numpy.zeros(cff.n, dtype=numpy.int64),
+                     numpy.zeros((cff.n, max(1, -(-max_tests // __WORD_BITS))), dtype=numpy.uint64),
+                     numpy.zeros(cff.n, dtype=numpy.int64))
+
+
+# Returns up to d blocks (other than block) whose tests include every test of block, or None
+def __find_covering_blocks(cff: SparseCFF, d: int, block: int, scratch: __Scratch) -> Union[Tuple[int, ...], None]:
+    tests = cff.tests_of_block(block)
+    if len(tests) == 0:
+        return ()
+    if scratch.columns is not None:
+        blocks, counts, words = __restrict_columns(block, scratch)
+        uncovered = __to_int(scratch.columns[block].tolist())
+    else:
+        blocks, counts, words = __restrict_incidences(cff, block, tests, scratch)
+        uncovered = (1 << len(tests)) - 1
+    # the d largest columns cannot cover block, which is how every block of a valid
+    # CFF ends, without leaving NumPy
+    largest_counts = counts if len(counts) <= d else numpy.partition(counts, len(counts) - d)[-d:]
+    if int(largest_counts.sum()) < len(tests):
+        return None
+
+    # blocks with identical restricted columns are interchangeable, the first one is kept
+    bitsets_of_blocks: Dict[int, int] = {}
+    for candidate_block, row in zip(blocks.tolist(), words.tolist()):
+        bitsets_of_blocks.setdefault(__to_int(row), candidate_block)
+    # largest bitsets first, so covers are found (and bounds reached) sooner
+    bitsets = sorted(bitsets_of_blocks, key=lambda bitset: -bitset.bit_count())
+    candidate_blocks = [bitsets_of_blocks[bitset] for bitset in bitsets]
+    candidates_of_test: Dict[int, List[int]] = {}
+    for index, bitset in enumerate(bitsets):
+        while bitset:
+            lowest_bit = bitset & -bitset
+            candidates_of_test.setdefault(lowest_bit.bit_length() - 1, []).append(index)
+            bitset ^= lowest_bit
+    # the i largest bitsets hold at most largest_sums[i] tests
+    largest_sums = [0]
+    for bitset in bitsets[:d]:
+        largest_sums.append(largest_sums[-1] + bitset.bit_count())
+
+    def search(uncovered: int, depth: int) -> Union[List[int], None]:
+        if uncovered == 0:
+            return []
+        if depth == 0 or largest_sums[min(depth, len(bitsets))] < uncovered.bit_count():
+            return None
+        first_test = (uncovered & -uncovered).bit_length() - 1
+        for index in candidates_of_test.get(first_test, []):
+            covering = search(uncovered & ~bitsets[index], depth - 1)
+            if covering is not None:
+                return [candidate_blocks[index]] + covering
+        return None
+
+    covering = search(uncovered, d)
+    return None if covering is None else tuple(sorted(covering))
+
+
+# Returns the other blocks, the number of tests of block they are in and their
+# columns restricted to the tests of block (bit i set when the block is in test i)
+def __restrict_columns(block: int, scratch: __Scratch) -> Tuple[numpy.ndarray, numpy.ndarray, numpy.ndarray]:
+    words = scratch.columns & scratch.columns[block]
+    counts = __count_bits(words)
+    counts[block] = 0
+    blocks = numpy.flatnonzero(counts)
+    return blocks, counts[blocks], words[blocks]
+
+
+# Returns the blocks sharing tests with block, the number of tests of block they are
+# in and their columns restricted to the tests of block (bit p set when the block is
+# in tests[p])
+def __restrict_incidences(cff: SparseCFF, block: int, tests: numpy.ndarray,
+                          scratch: __Scratch) -> Tuple[numpy.ndarray, numpy.ndarray, numpy.ndarray]:
+    blocks_of_tests = [cff.blocks_of_test(test) for test in tests]
+    # a block appears at most once in a test
+    for position, test_blocks in enumerate(blocks_of_tests):
+        scratch.counts[test_blocks] += 1
+        scratch.words[test_blocks, position // __WORD_BITS] |= numpy.uint64(1 << (position % __WORD_BITS))
+    blocks = numpy.concatenate(blocks_of_tests)
+    # keeps the first occurrence of every block
+    scratch.first_position[blocks[::-1]] = numpy.arange(len(blocks) - 1, -1, -1)
+    blocks = blocks[scratch.first_position[blocks] == numpy.arange(len(blocks))]
+    blocks = blocks[blocks != block]
+    counts = scratch.counts[blocks]
+    words = scratch.words[blocks, :-(-len(tests) // __WORD_BITS)]
+    scratch.counts[blocks] = 0
+    scratch.words[blocks] = 0
+    scratch.counts[block] = 0
+    scratch.words[block] = 0
+    return blocks, counts, words
+
+
+def __count_bits(words: numpy.ndarray) -> numpy.ndarray:
+    if hasattr(numpy, "bitwise_count"):
+        return numpy.bitwise_count(words).sum(axis=1, dtype=numpy.int64)
+    # NumPy < 2.0
+    return __BYTE_BITS[words.view(numpy.uint8)].reshape(len(words), -1).sum(axis=1, dtype=numpy.int64)
+
+
+def __to_int(words: List[int]) -> int:
+    return sum(value << (__WORD_BITS * word) for word, value in enumerate(words))
@@ -1,12 +1,26 @@
-from typing import List, Tuple, Union
+import mmap
+import os
+from typing import Iterator, List, Tuple, Union
 
 from xml.etree import ElementTree
 
+import numpy
+
+from mtsssigner.cff import SparseCFF
+from mtsssigner.utils.cff_file_utils import (get_cff_file_path,
+                                             read_cff_from_binary_file,
+                                             read_cff_from_txt_file)
+
 
 # Contains functions for opening message files and writing their signature
 # or correction to files, as well as building blocks from their content or
 # rebuilding the message from the generated blocks according to file type.
 
+TXT_READ_CHUNK_CHARACTERS = 1024 * 1024
+# bytes of a mapped txt file scanned for line breaks at once, bounding the memory of the scan
+TXT_SCAN_CHUNK_BYTES = 64 * 1024 * 1024
+
+
 def get_raw_message(file_path: str) -> str:
     with open(file_path, "r", encoding="utf-8") as file:
         return file.read()
@@ -15,13 +29,146 @@ def get_raw_message(file_path: str) -> str:
 # Builds a list of blocks and content string from a txt file.
 # For txt files, each block is a line of text.
 def __get_message_and_blocks_from_txt_file(txt_file_path: str, message: str = None) -> Tuple[str, List[str]]:
-    if not message:
+    if message is None:
         message = get_raw_message(txt_file_path)
     return message, message.split("\n")
 
 
-# Rebuilds the original txt message from its blocks.
-def __rebuild_txt_content_from_blocks(blocks: List[str]) -> str:
+# Yields the blocks (lines) of a txt file one at a time, the same blocks as
+# get_message_and_blocks_from_file, without reading the whole file
+def iterate_txt_blocks(txt_file_path: str) -> Iterator[str]:
+    with open(txt_file_path, "r", encoding="utf-8") as file:
+        last_line_ended = True
+        for line in file:
+            last_line_ended = line.endswith("\n")
+            yield line[:-1] if last_line_ended else line
+        if last_line_ended:
+            yield ""
+
+
+# Counts the blocks (lines) of a txt file, reading it in chunks. "\r\n" and a lone
+# "\r" are line breaks too, as when the file is read as text.
+def count_txt_blocks(txt_file_path: str) -> int:
+    with open(txt_file_path, "rb") as file:
+        line_breaks = 0
+        previous_chunk = b""
+        for chunk in iter(lambda: file.read(TXT_READ_CHUNK_CHARACTERS), b""):
+            line_breaks += chunk.count(b"\n") + chunk.count(b"\r") - chunk.count(b"\r\n")
+            # a "\r\n" split between two chunks
+            if previous_chunk.endswith(b"\r") and chunk.startswith(b"\n"):
+                line_breaks -= 1
+            previous_chunk = chunk
+        return line_breaks + 1
+
+
+# A txt file mapped in memory, whose content is hashed without decoding or copying
+# it: block i (line i, without its line break) is buffer[starts[i]:ends[i]], and
+# the message is the buffer. As when the file is read as text, "\r\n" and a lone
+# "\r" are line breaks, translated to "\n" in the message (see get_message_chunks),
+# so the signatures are the same. Files that are not UTF-8 text (e.g. binary
+# line-oriented files) are supported too.
+class TxtDocument:
+    buffer: Union[mmap.mmap, bytes]
+    starts: numpy.ndarray
+    ends: numpy.ndarray
+    # positions of the "\r" of "\r\n" line breaks, dropped from the message,
+    # and of the lone "\r" line breaks, replaced by "\n"
+    dropped: numpy.ndarray
+    replaced: numpy.ndarray
+
+    def __init__(self, buffer: Union[mmap.mmap, bytes], starts: numpy.ndarray, ends: numpy.ndarray,
+                 dropped: numpy.ndarray = None, replaced: numpy.ndarray = None):
+        self.buffer = buffer
+        self.starts = starts
+        self.ends = ends
+        self.dropped = dropped if dropped is not None else numpy.zeros(0, dtype=numpy.int64)
+        self.replaced = replaced if replaced is not None else numpy.zeros(0, dtype=numpy.int64)
+
+    def __len__(self) -> int:
+        return len(self.starts)
+
+    # Yields the blocks as bytes (e.g. for sign_stream, which hashes documents
+    # directly from the buffer instead)
+    def __iter__(self) -> Iterator[bytes]:
+        for start, end in zip(self.starts.tolist(), self.ends.tolist()):
+            yield self.buffer[start:end]
+
+    # Returns the blocks as bytes slices of the buffer, which are not decoded (see
+    # rebuild_content_from_blocks)
+    def get_blocks(self) -> List[bytes]:
+        return list(self)
+
+    # Yields the message in consecutive chunks: the whole buffer, or, when the file
+    # has carriage returns, chunks of it with its line breaks translated to "\n"
+    def get_message_chunks(self) -> Iterator[Union[memoryview, bytes]]:
+        if len(self.dropped) == 0 and len(self.replaced) == 0:
+            yield memoryview(self.buffer)
+            return
+        size = len(self.buffer)
+        for offset in range(0, size, TXT_SCAN_CHUNK_BYTES):
+            end = min(offset + TXT_SCAN_CHUNK_BYTES, size)
+            chunk = numpy.frombuffer(self.buffer, dtype=numpy.uint8, offset=offset, count=end - offset).copy()
+            chunk[self.__get_positions_in(self.replaced, offset, end)] = ord("\n")
+            kept = numpy.ones(len(chunk), dtype=bool)
+            kept[self.__get_positions_in(self.dropped, offset, end)] = False
+            yield chunk[kept].tobytes()
+
+    # Returns the (sorted) positions between start and end, relative to start
+    @staticmethod
+    def __get_positions_in(positions: numpy.ndarray, start: int, end: int) -> numpy.ndarray:
+        return positions[numpy.searchsorted(positions, start):numpy.searchsorted(positions, end)] - start
+
+    # Unmaps the file; views of the buffer still referenced keep it mapped
+    def close(self) -> None:
+        if isinstance(self.buffer, mmap.mmap):
+            try:
+                self.buffer.close()
+            except BufferError:
+                pass
+
+    def __enter__(self) -> "TxtDocument":
+        return self
+
+    def __exit__(self, *exception) -> None:
+        self.close()
+
+
+# Maps a txt file and locates its line breaks, with a vectorized scan of the
+# mapping: every "\n" and "\r", where the "\r" of a "\r\n" ends its line and
+# the "\n" starts the next one
+def map_txt_file(txt_file_path: str) -> TxtDocument:
+    with open(txt_file_path, "rb") as file:
+        size = os.fstat(file.fileno()).st_size
+        buffer = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) if size > 0 else b""
+    if hasattr(mmap, "MADV_SEQUENTIAL") and isinstance(buffer, mmap.mmap):
+        buffer.madvise(mmap.MADV_SEQUENTIAL)
+    line_feeds = __find_bytes(buffer, size, b"\n")
+    if buffer.find(b"\r") == -1:
+        return TxtDocument(buffer, numpy.concatenate([[0], line_feeds + 1]).astype(numpy.int64),
+                           numpy.append(line_feeds, size).astype(numpy.int64))
+    carriage_returns = __find_bytes(buffer, size, b"\r")
+    followed_by_line_feed = numpy.isin(carriage_returns + 1, line_feeds)
+    line_breaks = numpy.union1d(carriage_returns, numpy.setdiff1d(line_feeds, carriage_returns + 1))
+    line_break_sizes = numpy.isin(line_breaks, carriage_returns[followed_by_line_feed]) + 1
+    return TxtDocument(buffer, numpy.concatenate([[0], line_breaks + line_break_sizes]).astype(numpy.int64),
+                       numpy.append(line_breaks, size).astype(numpy.int64),
+                       carriage_returns[followed_by_line_feed], carriage_returns[~followed_by_line_feed])
+
+
+# Returns the positions of a byte in the buffer, scanned in chunks bounding the memory of the scan
+def __find_bytes(buffer: Union[mmap.mmap, bytes], size: int, byte: bytes) -> numpy.ndarray:
+    positions = [numpy.flatnonzero(numpy.frombuffer(buffer, dtype=numpy.uint8, offset=offset,
+                                                    count=min(TXT_SCAN_CHUNK_BYTES, size - offset)) == ord(byte))
+                 + offset for offset in range(0, size, TXT_SCAN_CHUNK_BYTES)]
+    return numpy.concatenate(positions).astype(numpy.int64) if positions else numpy.zeros(0, dtype=numpy.int64)
+
+
+# Rebuilds the original txt message from its blocks. Blocks of a mapped file
+# (see TxtDocument) are bytes, and bytes that are not UTF-8 are decoded as
+# surrogates, which write_correction_to_file encodes back.
+def __rebuild_txt_content_from_blocks(blocks: List[Union[str, bytes]]) -> str:
+    if blocks and isinstance(blocks[0], bytes):
+        return b"\n".join(blocks).decode("utf-8", "surrogateescape")
     return "\n".join(blocks)
 
 
@@ -30,7 +177,7 @@ def __rebuild_txt_content_from_blocks(blocks: List[str]) -> str:
 # (start/end), while maitaining the inheritance structure of the
 # original file. The process of building the blocks strips the file of identation.
 def __get_message_and_blocks_from_xml_file(xml_file_path: str, message: str = None) -> Tuple[str, List[str]]:
-    if not message:
+    if message is None:
         message = get_raw_message(xml_file_path)
     message = ElementTree.canonicalize(message)
     message = message.replace("\n", "")
@@ -68,7 +215,7 @@ def __rebuild_xml_content_from_blocks(blocks: List[str], ignore_identation=True)
 
 
 # Rebuilds the original message from its blocks and given file type.
-def rebuild_content_from_blocks(blocks: List[str], file_type: str) -> str:
+def rebuild_content_from_blocks(blocks: List[Union[str, bytes]], file_type: str) -> str:
     if file_type == "txt":
         content = __rebuild_txt_content_from_blocks(blocks)
     elif file_type == "xml":
@@ -113,17 +260,18 @@ def write_signature_to_file(signature: Union[bytearray, bytes], message_file_pat
 
 
 # Writes the correction of a modified message to a file,
-# according to the original path of the message.
+# according to the original path of the message. Surrogates
+# (see rebuild_content_from_blocks) are written as the bytes they decode.
 def write_correction_to_file(message_file_path: str, content: str):
     correction_file_path = get_correction_file_path(message_file_path)
-    with open(correction_file_path, "w", encoding="utf-8") as correction_file:
-        correction_file.write(content)
+    with open(correction_file_path, "wb") as correction_file:
+        correction_file.write(content.encode("utf-8", "surrogateescape"))
 
 
-def read_cff_from_file(t: int, n: int, d: int) -> List[List[int]]:
-    with open(f"cffs/{d}-CFF({t}, {n}).txt", "r", encoding="utf-8") as file:
-        cff_lines = file.readlines()
-    cff = []
-    for line in cff_lines:
-        cff.append([int(number) for number in line.split(" ")])
-    return cff
+# Reads a CFF from the cffs/ store, memory-mapping its binary file when
+# available and falling back to the legacy space-separated txt matrix
+def read_cff_from_file(t: int, n: int, d: int) -> SparseCFF:
+    binary_file_path = get_cff_file_path(t, n, d)
+    if os.path.exists(binary_file_path):
+        return read_cff_from_binary_file(binary_file_path)
+    return read_cff_from_txt_file(get_cff_file_path(t, n, d, "txt"), d)
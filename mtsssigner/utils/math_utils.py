@@ -1,12 +1,23 @@
-import itertools
-from typing import List
+import numpy
+from galois import FieldArray
 
-from galois import FieldArray, Poly
 
+# Returns a (q^k, k) matrix over the finite field whose rows are the coefficients
+# of all polynomials of degree up to k: row b holds the base-q digits of b,
+# highest degree first
+def get_polynomial_coefficient_matrix(field: FieldArray, k: int) -> FieldArray:
+    q: int = field.order
+    block_indexes = numpy.arange(q ** k, dtype=numpy.int64)[:, None]
+    place_values = q ** numpy.arange(k - 1, -1, -1, dtype=numpy.int64)
+    return field((block_indexes // place_values) % q)
 
-# https://stackoverflow.com/questions/533905/how-to-get-the-cartesian-product-of-multiple-lists
-# Returns the list of all polynomials of degree up to k, where
-# its coefficients are all members of a given finite field
-def get_all_polynomials_with_deg_up_to_k(field: FieldArray, k: int) -> List[Poly]:
-    result = itertools.product(field.elements, repeat=k)
-    return [Poly(coefs, field=field) for coefs in result]
+
+# Returns a (k, q) Vandermonde matrix over the finite field, where the
+# element in row i and column x is x^(k-1-i). Multiplying the coefficient
+# matrix by it evaluates every polynomial at every element of the field
+def get_vandermonde_matrix(field: FieldArray, k: int) -> FieldArray:
+    elements = field.elements
+    matrix = field(numpy.ones((k, field.order), dtype=numpy.int64))
+    for row in range(k - 2, -1, -1):
+        matrix[row] = matrix[row + 1] * elements
+    return matrix
@@ -33,6 +33,14 @@ def is_prime_power(number: int) -> bool:
     return False
 
 
+# Returns the smallest prime power equal or bigger than number
+def get_next_prime_power(number: int) -> int:
+    number = max(number, 2)
+    while not is_prime_power(number):
+        number += 1
+    return number
+
+
 # Generates a prime power sequence, which contain primes (p¹) up until 'number'
 def generate_prime_power_sequence(number: int):
     prime_power_sequence = list(sieve.primerange(number * 2))
@@ -0,0 +1,109 @@
+import os
+import sys
+from multiprocessing import shared_memory
+from typing import Dict, List, Tuple
+
+import numpy
+
+from mtsssigner.cff import CFF, SparseCFF
+
+# Contains the publication of NumPy arrays (CFF incidences, digests) to shared
+# memory, so the workers of a process pool map them instead of receiving a copy:
+# the memory used by each worker does not grow with the size of the arrays.
+#
+# The parent process creates a segment with SharedArrays.create and hands the
+# object to the workers (e.g. as initargs of the pool); only the name and layout
+# of the segment are pickled, and unpickling attaches the segment in the worker.
+# The creator unlinks the segment on close (SharedArrays is a context manager).
+# Segments are registered with the multiprocessing resource tracker, which
+# unlinks them if the creator dies without closing them (e.g. when it crashes).
+
+# arrays start at cache line boundaries
+SHARED_ARRAY_ALIGNMENT = 64
+
+# (name, dtype, shape, offset) of every array of a segment
+Layout = List[Tuple[str, str, Tuple[int, ...], int]]
+
+
+class SharedArrays:
+
+    def __init__(self, memory: shared_memory.SharedMemory, layout: Layout, creator: int = 0):
+        self.memory = memory
+        self.layout = layout
+        # process id of the creator, since forked workers inherit the object as is
+        self.creator = creator
+        self.arrays: Dict[str, numpy.ndarray] = {
+            name: numpy.ndarray(shape, numpy.dtype(dtype), buffer=memory.buf, offset=offset)
+            for name, dtype, shape, offset in layout
+        }
+
+    # Copies the arrays to a new shared memory segment
+    @classmethod
+    def create(cls, arrays: Dict[str, numpy.ndarray]) -> "SharedArrays":
+        layout: Layout = []
+        size = 0
+        for name, array in arrays.items():
+            size += -size % SHARED_ARRAY_ALIGNMENT
+            layout.append((name, array.dtype.str, tuple(array.shape), size))
+            size += array.nbytes
+        memory = shared_memory.SharedMemory(create=True, size=max(size, 1))
+        shared = cls(memory, layout, os.getpid())
+        for name, array in arrays.items():
+            shared.arrays[name][...] = array
+        return shared
+
+    # Maps the arrays of a segment created by another process
+    @classmethod
+    def attach(cls, name: str, layout: Layout) -> "SharedArrays":
+        if sys.version_info >= (3, 13):
+            # only the creator is responsible for the segment
+            memory = shared_memory.SharedMemory(name=name, track=False)
+        else:
+            # the workers of a pool share the resource tracker of their parent,
+            # where the segment is already registered
+            memory = shared_memory.SharedMemory(name=name)
+        return cls(memory, layout)
+
+    def __reduce__(self):
+        return SharedArrays.attach, (self.memory.name, self.layout)
+
+    def __getitem__(self, name: str) -> numpy.ndarray:
+        return self.arrays[name]
+
+    def __enter__(self) -> "SharedArrays":
+        return self
+
+    def __exit__(self, *exception) -> None:
+        self.close()
+
+    # Unmaps the segment, and unlinks it when called by its creator. Arrays still
+    # referenced elsewhere keep the mapping alive until they are released.
+    def close(self) -> None:
+        self.arrays = {}
+        try:
+            self.memory.close()
+        except BufferError:
+            pass
+        if self.creator == os.getpid():
+            self.creator = 0
+            self.memory.unlink()
+
+
+# Publishes the incidences of a CFF, which workers read with get_shared_cff
+def share_cff(cff: CFF) -> SharedArrays:
+    cff = SparseCFF.from_cff(cff)
+    return SharedArrays.create({
+        "dimensions": numpy.array([cff.t, cff.n, cff.d], dtype=numpy.int64),
+        "test_indptr": cff.test_indptr,
+        "test_blocks": cff.test_blocks,
+        "block_indptr": cff.block_indptr,
+        "block_tests": cff.block_tests,
+    })
+
+
+# Returns the CFF of a segment published with share_cff, backed by the segment
+def get_shared_cff(shared: SharedArrays) -> SparseCFF:
+    t, n, d = shared["dimensions"].tolist()
+    return SparseCFF.from_arrays(t, n, d, shared["test_indptr"], shared["test_blocks"],
+                                 shared["block_indptr"], shared["block_tests"])
+
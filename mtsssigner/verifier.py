@@ -1,42 +1,60 @@
-import functools
 import re
+import threading
+from concurrent.futures import CancelledError
 from math import sqrt, comb
 from multiprocessing import Pool
 from typing import List, Tuple, Union
 
 from Crypto.PublicKey.ECC import EccKey
 from Crypto.PublicKey.RSA import RsaKey
+import numpy
 from numpy import floor
 
-from mtsssigner import logger
-from mtsssigner.cff_builder import (create_cff,
-                                    get_k_from_n_and_q,
-                                    get_d,
-                                    create_1_cff)
+from mtsssigner import digest_matrix, logger
+from mtsssigner.cff import CFF
+from mtsssigner.cff_builder import get_k_from_n_and_q, get_d
+from mtsssigner.cff_cache import get_cff, get_1_cff, get_cff_from_construction
+from mtsssigner.digest_matrix import get_buffer_digest_matrix, get_digest_matrix, hash_tests
+from mtsssigner.signature_header import split_signature_header
 from mtsssigner.signature_scheme import SigScheme
-from mtsssigner.utils.file_and_block_utils import (get_message_and_blocks_from_file,
+from mtsssigner.signer import get_document_message_hash, get_super_block_hashes
+from mtsssigner.utils.file_and_block_utils import (TxtDocument,
+                                                   get_message_and_blocks_from_file,
+                                                   map_txt_file,
                                                    rebuild_content_from_blocks,
-                                                   read_cff_from_file, get_raw_message)
-
-cff: List[List[int]] = [[]]
-message: str
-blocks: List[str]
-block_hashes: List[Union[bytearray, bytes]] = []
+                                                   get_raw_message)
+from mtsssigner.utils.shared_memory_utils import SharedArrays
+
+cff: Union[CFF, None] = None
+# the message, mapped in memory for txt files (see map_txt_file)
+message: Union[str, TxtDocument] = ""
+# the blocks of the message, bytes for a mapped txt file
+blocks: List[Union[str, bytes]]
+# digest matrix of the blocks of the message
+block_hashes: numpy.ndarray = numpy.zeros((0, 0), dtype=numpy.uint8)
 hashed_tests: List[Union[bytearray, bytes]] = []
 corrected = {}
+# (concatenation, hashed test, index of the modified block, corrected, scheme) of a correction worker
+correction_worker: Union[Tuple[bytearray, bytes, int, bool, SigScheme], None] = None
+# bytes hashed when trying the values of known digests as corrections
+MAX_KNOWN_CANDIDATE_BYTES = 64 * 1024 * 1024
 
 
 def clear_globals():
     global cff, message, blocks, block_hashes, hashed_tests, corrected
-    cff = [[]]
+    cff = None
+    if isinstance(message, TxtDocument):
+        message.close()
     message = ""
     blocks = []
-    block_hashes = []
+    block_hashes = numpy.zeros((0, 0), dtype=numpy.uint8)
     hashed_tests = []
     corrected = {}
 
 
-def pre_verify(message_file_path: str, signature_file_path: str, sig_scheme: SigScheme, public_key_file_path: str):
+# The public key may be given already read (e.g. when verifying many files with it)
+def pre_verify(message_file_path: str, signature_file_path: str, sig_scheme: SigScheme, public_key_file_path: str,
+               public_key: Union[RsaKey, EccKey, bytes] = None):
     global message
 
     clear_globals()
@@ -44,16 +62,31 @@ def pre_verify(message_file_path: str, signature_file_path: str, sig_scheme: Sig
     # here, we do not need to parse the file into blocks
     # we only need the blocks for the message if the message was modified
     # this is done in #verify_raw
-    message = get_raw_message(message_file_path)
+    if message_file_path[-3:] == "txt":
+        message = map_txt_file(message_file_path)
+    else:
+        message = get_raw_message(message_file_path)
 
     with open(signature_file_path, "rb") as signature_file:
         signature: bytes = signature_file.read()
 
-    public_key = sig_scheme.get_public_key(public_key_file_path)
+    if public_key is None:
+        public_key = sig_scheme.get_public_key(public_key_file_path)
 
     return signature, public_key, sig_scheme, message_file_path, public_key_file_path
 
 
+# Same as pre_verify, for a message and signature already read (e.g. received by the
+# signing server). file_type (txt or xml) determines how the message is split into blocks.
+def pre_verify_content(message_content: str, signature: bytes, sig_scheme: SigScheme, file_type: str,
+                       public_key: Union[RsaKey, EccKey, bytes], public_key_file_path: str = ""):
+    global message
+
+    clear_globals()
+    message = message_content
+    return signature, public_key, sig_scheme, f"message.{file_type}", public_key_file_path
+
+
 def verify_raw(signature: bytes, public_key: Union[RsaKey, EccKey],
                sig_scheme: SigScheme, message_file_path, public_key_file_path):
     global message, blocks, hashed_tests, cff, block_hashes, corrected
@@ -67,7 +100,10 @@ def verify_raw(signature: bytes, public_key: Union[RsaKey, EccKey],
             message_file_path, public_key_file_path, sig_scheme, verification_result)
         return verification_result, []
 
-    message_hash = sig_scheme.get_digest(message)
+    if isinstance(message, TxtDocument):
+        message_hash = get_document_message_hash(sig_scheme, message)
+    else:
+        message_hash = sig_scheme.get_digest(message)
     signature_message_hash = t[-int(sig_scheme.digest_size_bytes):]
 
     if signature_message_hash == message_hash:
@@ -77,7 +113,11 @@ def verify_raw(signature: bytes, public_key: Union[RsaKey, EccKey],
         return True, []
 
     # now that we know the message has been modified, we need to parse it into blocks
-    _, blocks = get_message_and_blocks_from_file(message_file_path, message)
+    if isinstance(message, TxtDocument):
+        blocks = message.get_blocks()
+    else:
+        _, blocks = get_message_and_blocks_from_file(message_file_path, message)
+    metadata, t = split_signature_header(t)
     joined_hashed_tests: bytearray = t[:-int(sig_scheme.digest_size_bytes)]
     hashed_tests = [
         joined_hashed_tests[i:i + int(sig_scheme.digest_size_bytes)]
@@ -87,57 +127,54 @@ def verify_raw(signature: bytes, public_key: Union[RsaKey, EccKey],
     number_of_tests = len(hashed_tests)
     number_of_blocks = len(blocks)
 
-    q: int = int(sqrt(number_of_tests))
     n: int = number_of_blocks
-    try:
-        k: int = get_k_from_n_and_q(n, q)
-        d: int = get_d(q, k)
-        try:
-            cff = read_cff_from_file(number_of_tests, n, d)
-        except IOError:
-            if d < 2:
-                cff = create_1_cff(n)
-            else:
-                cff = create_cff(q, k)
-    except ValueError as exception:
-        if n <= comb(number_of_tests, int(floor(number_of_tests / 2))):
-            d = 1
-            k = 1
-            try:
-                cff = read_cff_from_file(number_of_tests, n, d)
-            except IOError:
-                cff = create_1_cff(n)
-        else:
-            raise exception
+    if "construction" in metadata:
+        # the CFF cannot be inferred from the signature dimensions (e.g. a padded
+        # document), so its construction and parameters are recorded in the header
+        if n != metadata["n"]:
+            logger.log_error(("The number of blocks of the modified message"
+                              " is different from the original message."))
+            return False, []
+        parameters = metadata["parameters"]
+        cff = get_cff_from_construction(metadata["construction"], parameters)
+        q, k, d = parameters.get("q", -1), parameters.get("k", -1), cff.d
+    else:
+        q, k, d = __get_cff_from_dimensions(number_of_tests, n)
 
-    rebuilt_tests: List[Union[str, bytes]] = []
+    outer_hashed_tests = []
+    if metadata.get("hierarchical"):
+        outer_hashed_tests, hashed_tests = hashed_tests[:cff.first.t], hashed_tests[cff.first.t:]
+        number_of_tests = len(hashed_tests)
 
     if number_of_tests != len(cff):
         logger.log_error(("The number of blocks of the modified message"
                           " is different from the original message."))
         return False, []
 
-    for block in blocks:
-        block_hashes.append(sig_scheme.get_digest(block))
-
-    for test in range(number_of_tests):
-        concatenation = bytes()
-        for block in range(number_of_blocks):
-            if cff[test][block] == 1:
-                concatenation += block_hashes[block]
-        rebuilt_tests.append(concatenation)
-
-    non_modified_blocks: List[int] = []
-
-    for test in range(len(rebuilt_tests)):
-        rebuilt_hashed_test = sig_scheme.get_digest(rebuilt_tests[test])
-        if rebuilt_hashed_test == hashed_tests[test]:
-            for block in range(number_of_blocks):
-                if cff[test][block] == 1:
-                    non_modified_blocks.append(block)
-
-    modified_blocks = [block for block in range(number_of_blocks)
-                       if block not in non_modified_blocks]
+    if isinstance(message, TxtDocument):
+        block_hashes = get_buffer_digest_matrix(sig_scheme, message.buffer, message.starts, message.ends, cff.n)
+    else:
+        block_hashes = get_digest_matrix(sig_scheme, blocks, cff.n)
+
+    non_modified = numpy.zeros(cff.n, dtype=bool)
+    # tests made only of padding blocks cannot be modified, skip rehashing them
+    non_modified[n:] = True
+
+    tests_to_rebuild = range(number_of_tests)
+    if metadata.get("hierarchical"):
+        tests_to_rebuild = __localize_super_blocks(sig_scheme, outer_hashed_tests, non_modified)
+
+    # tests of padding blocks only are not rehashed; without padding, every test
+    # has blocks of the document
+    if n < cff.n:
+        tests_to_rebuild = [test for test in tests_to_rebuild
+                            if numpy.any(numpy.asarray(cff.blocks_of_test(test)) < n)]
+    rebuilt_tests = hash_tests(sig_scheme, block_hashes, cff, tests_to_rebuild)
+    for test, rebuilt_test in zip(tests_to_rebuild, rebuilt_tests):
+        if rebuilt_test == hashed_tests[test]:
+            non_modified[cff.blocks_of_test(test)] = True
+
+    modified_blocks: List[int] = numpy.flatnonzero(~non_modified).tolist()
     modified_blocks_content = [blocks[block] for block in modified_blocks]
     result = len(modified_blocks) <= d
 
@@ -147,6 +184,49 @@ def verify_raw(signature: bytes, public_key: Union[RsaKey, EccKey],
     return result, modified_blocks
 
 
+# First level of the localization of a hierarchical signature: rebuilds the outer
+# tests over the super-block digests and marks the blocks of every super-block in
+# a matching outer test as non modified. Returns the tests of the CFF that must be
+# rebuilt to localize the blocks of the remaining (modified) super-blocks.
+def __localize_super_blocks(sig_scheme: SigScheme, outer_hashed_tests: List[bytes],
+                            non_modified: numpy.ndarray) -> List[int]:
+    outer_cff, inner_cff = cff.first, cff.second
+    super_block_hashes = get_super_block_hashes(sig_scheme, block_hashes, inner_cff.n)
+    non_modified_super_blocks = numpy.zeros(outer_cff.n, dtype=bool)
+    for test, rebuilt_test in enumerate(hash_tests(sig_scheme, super_block_hashes, outer_cff)):
+        if rebuilt_test == outer_hashed_tests[test]:
+            non_modified_super_blocks[outer_cff.blocks_of_test(test)] = True
+    non_modified |= numpy.repeat(non_modified_super_blocks, inner_cff.n)
+
+    outer_tests = set()
+    for super_block in numpy.flatnonzero(~non_modified_super_blocks).tolist():
+        outer_tests.update(outer_cff.tests_of_block(super_block).tolist())
+    return [outer_test * inner_cff.t + inner_test
+            for outer_test in sorted(outer_tests) for inner_test in range(inner_cff.t)]
+
+
+# Gets the CFF of a signature without header from its number of tests and the
+# number of blocks of the message, returning q, k and d
+def __get_cff_from_dimensions(number_of_tests: int, n: int) -> Tuple[int, int, int]:
+    global cff
+    q: int = int(sqrt(number_of_tests))
+    try:
+        k: int = get_k_from_n_and_q(n, q)
+        d: int = get_d(q, k)
+        if d < 2:
+            cff = get_1_cff(n)
+        else:
+            cff = get_cff(q, k)
+    except ValueError as exception:
+        if n <= comb(number_of_tests, int(floor(number_of_tests / 2))):
+            d = 1
+            k = 1
+            cff = get_1_cff(n)
+        else:
+            raise exception
+    return q, k, d
+
+
 # Verifies the signature and localizes the modified blocks
 # The resulting number of blocks from the supplied file must
 # be the same as the one generated by the sign function
@@ -161,7 +241,10 @@ def verify(sig_scheme: SigScheme, message_file_path: str, signature_file_path: s
 # the number of characters of the original values of the modified blocks is
 # small (i.e. 4 or less) or the characters of the file are codifiable by 1
 # byte (UTF-8 equivalent to ASCII), otherwise the correction takes too long.
-def verify_and_correct(verification_result, sig_scheme: SigScheme, message_file_path: str) -> Tuple[bool, List[int], str]:
+# Setting cancelled (e.g. from another thread) stops the correction, terminating
+# its workers, and raises CancelledError.
+def verify_and_correct(verification_result, sig_scheme: SigScheme, message_file_path: str,
+                       cancelled: Union[threading.Event, None] = None) -> Tuple[bool, List[int], str]:
     correction = ""
     if verification_result[1] == [] or not verification_result[0]:
         return verification_result[0], verification_result[1], correction
@@ -169,44 +252,49 @@ def verify_and_correct(verification_result, sig_scheme: SigScheme, message_file_
     process_pool_size = __available_cpu_count()
     MAX_CORRECTABLE_BLOCK_LEN_CHARACTERS = __get_max_block_length(verification_result[1])
     logger.log_correction_parameters(MAX_CORRECTABLE_BLOCK_LEN_CHARACTERS, process_pool_size)
+    # the values whose digests are known are tried before every other value: the
+    # value of a modified block often repeats another block of the document, or a
+    # block memoized with its digest (see digest_memo)
+    known_values = __get_known_values(sig_scheme, verification_result[1])
     for k in verification_result[1]:
-        i_rows = []
         modified_blocks_minus_k = set(verification_result[1]) - {k}
-        for i in range(len(cff)):
-            if cff[i][k] == 1:
-                i_rows.append(i)
-                for j in modified_blocks_minus_k:
-                    if cff[i][j] == 1:
-                        i_rows.pop()
-                        break
+        tests_with_other_modifications = set()
+        for j in modified_blocks_minus_k:
+            tests_with_other_modifications.update(cff.tests_of_block(j).tolist())
+        i_rows = [i for i in cff.tests_of_block(k).tolist() if i not in tests_with_other_modifications]
         i = i_rows[0]
         global corrected
         corrected[k] = False
 
-        i_concatenation = []
-        k_index = -1
-        for block in range(len(cff[i])):
-            if cff[i][block] == 1:
-                if block != k:
-                    i_concatenation.append(block_hashes[block])
-                else:
-                    k_index = len(i_concatenation)
-                    i_concatenation.append(b'0' * sig_scheme.digest_size_bytes)
-        k_index = int((k_index * sig_scheme.digest_size) / 8)
-
-        find_correct_b = functools.partial(
-            __return_if_correct_b,
-            concatenation=bytearray(b''.join(i_concatenation)),
-            k_index=k_index, i=i, k=k, sig_scheme=sig_scheme
-        )
-        with Pool(process_pool_size) as process_pool:
+        # the digest of block k is replaced by the digest of every candidate value
+        i_blocks = numpy.asarray(cff.blocks_of_test(i))
+        k_index = int(numpy.flatnonzero(i_blocks == k)[0]) * sig_scheme.digest_size_bytes
+
+        known_value = __find_correction_among_known_values(known_values, i_blocks, k_index, hashed_tests[i],
+                                                           sig_scheme, cancelled)
+        if known_value is not None:
+            corrected[k] = True
+            blocks[k] = __as_block_type(known_value, blocks[k])
+            logger.log_block_correction(k, blocks[k])
+            continue
+
+        # the workers attach the concatenation and the signed test once, instead
+        # of receiving them with every candidate value of the block
+        correction_state = SharedArrays.create({
+            "concatenation": block_hashes[i_blocks].reshape(-1),
+            "hashed_test": numpy.frombuffer(bytes(hashed_tests[i]), dtype=numpy.uint8),
+        })
+        with correction_state, Pool(process_pool_size, initializer=__init_correction_worker,
+                                    initargs=(correction_state, k_index, corrected[k], sig_scheme)) as process_pool:
             for result in process_pool.imap(
-                    find_correct_b,
+                    __return_if_correct_b,
                     range(2 ** (MAX_CORRECTABLE_BLOCK_LEN_CHARACTERS * 8))):
+                if cancelled is not None and cancelled.is_set():
+                    raise CancelledError("The correction was cancelled")
                 if result is not None:
                     if result[0]:
                         corrected[k] = True
-                        blocks[k] = (__int_to_bytes(result[1])).decode("utf-8")
+                        blocks[k] = __as_block_type(__int_to_bytes(result[1]), blocks[k])
                         logger.log_block_correction(k, blocks[k])
                         break
                     else:
@@ -221,14 +309,72 @@ def verify_and_correct(verification_result, sig_scheme: SigScheme, message_file_
     return verification_result[0], verification_result[1], correction
 
 
+# Returns the (value, digest) pairs whose digests are known: the distinct values
+# of the non modified blocks, from the most repeated, followed by the values
+# memoized for the hash function of the scheme by the memo shared by the documents
+# of a batch (see digest_matrix.shared_memo)
+def __get_known_values(sig_scheme: SigScheme, modified_blocks: List[int]) -> List[Tuple[Union[str, bytes], bytes]]:
+    modified = set(modified_blocks)
+    first_positions = {}
+    repetitions = {}
+    for position, block in enumerate(blocks):
+        if position not in modified:
+            first_positions.setdefault(block, position)
+            repetitions[block] = repetitions.get(block, 0) + 1
+    known_values = [(block, block_hashes[first_positions[block]].tobytes())
+                    for block in sorted(first_positions, key=lambda block: -repetitions[block])]
+
+    memo = digest_matrix.shared_memo
+    if memo is not None:
+        known_values += [(block, digest) for block, digest in memo.get_entries(sig_scheme.hash_function)
+                         if block not in first_positions]
+    return known_values
+
+
+# Returns the known value whose digest, as the digest of the modified block at
+# k_index of the concatenation of test i_blocks, rebuilds the signed test, or None.
+# Values are tried in order, up to a bounded number of bytes hashed.
+def __find_correction_among_known_values(known_values: List[Tuple[Union[str, bytes], bytes]],
+                                         i_blocks: numpy.ndarray, k_index: int, hashed_test: bytes,
+                                         sig_scheme: SigScheme,
+                                         cancelled: Union[threading.Event, None]) -> Union[str, bytes, None]:
+    concatenation = bytearray(block_hashes[i_blocks].tobytes())
+    for value, digest in known_values[:max(1, MAX_KNOWN_CANDIDATE_BYTES // max(len(concatenation), 1))]:
+        if cancelled is not None and cancelled.is_set():
+            raise CancelledError("The correction was cancelled")
+        concatenation[k_index:k_index + sig_scheme.digest_size_bytes] = digest
+        if sig_scheme.get_digest(concatenation) == hashed_test:
+            return value
+    return None
+
+
+# Converts a corrected value to the type (str or bytes) of the blocks of the message
+def __as_block_type(value: Union[str, bytes], block: Union[str, bytes]) -> Union[str, bytes]:
+    if isinstance(block, bytes) and isinstance(value, str):
+        return value.encode("utf-8", "surrogateescape")
+    if isinstance(block, str) and isinstance(value, bytes):
+        return value.decode("utf-8", "surrogateescape")
+    return value
+
+
 def __get_max_block_length(modified_blocks: List[int]):
     return max([len(blocks[block]) for block in modified_blocks])
 
 
-# Checks if the given bytes match the original value for the
-# modified block k, considering the hash value of the signed ith test
-def __return_if_correct_b(b: int, concatenation: bytearray, k_index: int,
-                          i: int, k: int, sig_scheme: SigScheme) -> Union[Tuple[bool, int], None]:
+# Sets the state shared by the candidates of a modified block in a correction worker
+def __init_correction_worker(state: SharedArrays, k_index: int, already_corrected: bool,
+                             sig_scheme: SigScheme) -> None:
+    global correction_worker
+    # every worker overwrites the hash of the candidate in its own copy
+    correction_worker = (bytearray(state["concatenation"].tobytes()), state["hashed_test"].tobytes(),
+                         k_index, already_corrected, sig_scheme)
+    state.close()
+
+
+# Checks if the given bytes match the original value for the modified
+# block, considering the hash value of the signed test of the worker
+def __return_if_correct_b(b: int) -> Union[Tuple[bool, int], None]:
+    concatenation, hashed_test, k_index, already_corrected, sig_scheme = correction_worker
     if (b % 500000) == 0:
         logger.log_correction_progress(b)
 
@@ -236,8 +382,8 @@ def __return_if_correct_b(b: int, concatenation: bytearray, k_index: int,
     concatenation[k_index:(k_index + sig_scheme.digest_size_bytes)] = hash_k
     rebuilt_corrected_test = sig_scheme.get_digest(concatenation)
 
-    if rebuilt_corrected_test == hashed_tests[i]:
-        return not corrected[k], b
+    if rebuilt_corrected_test == hashed_test:
+        return not already_corrected, b
 
 
 # Converts an integer to a bytes object
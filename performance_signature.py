@@ -4,6 +4,7 @@ from timeit import default_timer as timer
 import numpy as np
 from matplotlib import pyplot as plt
 
+from mtsssigner import cff_cache
 from mtsssigner.signer import *
 
 QTD_ITERATION = 100
@@ -34,6 +35,9 @@ def iterate_files(results, sig_scheme, files):
     for index, file in enumerate(files):
         results["pre-sign"].insert(index, 0)
         results["sign"].insert(index, 0)
+        results["session-sign"].insert(index, 0)
+        # key, signing context and CFF loaded once, outside the measured loop
+        signer = Signer(sig_scheme, KEY_FILE, K)
 
         for i in range(1, QTD_ITERATION + 1):
             # MTSS
@@ -47,8 +51,15 @@ def iterate_files(results, sig_scheme, files):
             end = timer()
             diff_mtss = end - start
 
+            # MTSS with a long-lived signer
+            start = timer()
+            signer.sign_file(file)
+            end = timer()
+            diff_session = end - start
+
             results["pre-sign"][index] += math.floor((diff_pre_sign * 1000) / i)
             results["sign"][index] += math.floor((diff_mtss * 1000) / i)
+            results["session-sign"][index] += math.floor((diff_session * 1000) / i)
 
         if DEBUG:
             print(f'finished file {file}')
@@ -60,6 +71,7 @@ def main():
     results = {
         "pre-sign": [],
         "sign": [],
+        "session-sign": [],
     }
 
     files_text = list(map(lambda x: FILE_PATH + x + FILE_EXTENSION, FILES))
@@ -67,6 +79,8 @@ def main():
     files = files_text + files_xml
 
     iterate_files(results, sig_scheme, files)
+    if DEBUG:
+        print(f'CFF cache: {cff_cache.cache.stats()}')
 
     generate_file(results)
     # generate_graph(results)
@@ -78,7 +92,7 @@ def generate_file(results):
     files = files_text + files_xml
 
     for i, file in enumerate(files):
-        print(file, results["pre-sign"][i], results["sign"][i])
+        print(file, results["pre-sign"][i], results["sign"][i], results["session-sign"][i])
 
 
 def generate_graph(results):
@@ -89,7 +103,9 @@ def generate_graph(results):
 
     fig, ax = plt.subplots()
     bottom = np.zeros(len(files))
-    for stage, stage_results in results.items():
+    # the stages of pre_sign and sign_raw, which add up
+    for stage in ["pre-sign", "sign"]:
+        stage_results = results[stage]
         p = ax.bar(files, stage_results, width, label=stage, bottom=bottom)
         bottom += stage_results
 
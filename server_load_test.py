@@ -0,0 +1,72 @@
+import argparse
+import threading
+from timeit import default_timer as timer
+from typing import Dict, List, Tuple
+
+import numpy as np
+
+from mtsssigner.client import SigningClient
+
+# Load test of the signing server (python mtss_signer.py serve ...), which must be
+# running. Every connection keeps up to --pipeline requests in flight, signing
+# (and, with --verify, verifying) generated txt documents of --lines lines sent
+# as content, and the throughput and latency percentiles are printed.
+# python server_load_test.py address [--connections c] [--requests r] [--pipeline p] [--lines l] [--verify]
+
+
+def get_document(index: int, lines: int) -> str:
+    return "\n".join(f"document {index}, line {line}" for line in range(lines))
+
+
+def run_connection(address: str, first: int, requests: int, pipeline: int, lines: int, verify: bool,
+                   latencies: List[float], errors: Dict[str, int]) -> None:
+    with SigningClient(address) as client:
+        # (start, document) of every request in flight
+        sent: Dict[int, Tuple[float, int]] = {}
+        next_document = first
+        while next_document < first + requests or sent:
+            while next_document < first + requests and len(sent) < pipeline:
+                sent[client.send("sign", get_document(next_document, lines), file_type="txt")] = (timer(), next_document)
+                next_document += 1
+            request_id = min(sent)
+            start, document = sent.pop(request_id)
+            try:
+                signature = client.result(request_id)
+                latencies.append(timer() - start)
+                if verify and client.verify(get_document(document, lines), signature) != (True, True):
+                    errors["invalid signature"] = errors.get("invalid signature", 0) + 1
+            except Exception as exception:
+                errors[type(exception).__name__] = errors.get(type(exception).__name__, 0) + 1
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Load test of the signing server")
+    parser.add_argument("address", help="socket path or host:port of the server")
+    parser.add_argument("--connections", type=int, default=4)
+    parser.add_argument("--requests", type=int, default=1000, help="requests per connection")
+    parser.add_argument("--pipeline", type=int, default=16, help="requests in flight per connection")
+    parser.add_argument("--lines", type=int, default=100, help="lines per document")
+    parser.add_argument("--verify", action="store_true", help="also verify every signature")
+    arguments = parser.parse_args()
+
+    latencies: List[float] = []
+    errors: Dict[str, int] = {}
+    threads = [threading.Thread(target=run_connection, args=(
+        arguments.address, connection * arguments.requests, arguments.requests, arguments.pipeline,
+        arguments.lines, arguments.verify, latencies, errors)) for connection in range(arguments.connections)]
+    start = timer()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    end = timer()
+
+    print(f"{len(latencies)} requests in {end - start:.3f} s: {len(latencies) / (end - start):.1f} requests/s")
+    for percentile in [50, 95, 99]:
+        print(f"p{percentile} latency: {np.percentile(latencies, percentile) * 1000:.2f} ms")
+    if errors:
+        print(f"errors: {errors}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,79 @@
+import asyncio
+import shutil
+import time
+
+import pytest
+
+from mtsssigner.async_api import AsyncSigningPool
+from mtsssigner.signer import sign
+from mtsssigner.signature_scheme import SigScheme
+from mtsssigner.utils.file_and_block_utils import get_raw_message, get_signature_file_path, write_signature_to_file
+
+
+def test_concurrent_requests():
+    sig_scheme = SigScheme("Ed25519")
+    expected = sign(sig_scheme, "msg/sample_message.txt", "keys/ed25519_priv.pem", k=1)
+    content = get_raw_message("msg/sample_message.txt")
+
+    async def run():
+        async with AsyncSigningPool(sig_scheme, "keys/ed25519_priv.pem", "keys/ed25519_pub.pem", workers=1,
+                                    max_pending=2, k=1) as pool:
+            assert await pool.sign_file("msg/sample_message.txt") == expected
+            documents = [f"document {document}\nline" for document in range(10)]
+            signatures = await asyncio.gather(*[pool.sign(document) for document in documents])
+            results = await asyncio.gather(*[pool.verify(document, signature)
+                                             for document, signature in zip(documents, signatures)])
+            assert results == [(True, [])] * 10
+            assert await pool.verify(content.replace("441", "442"), expected) == (True, [3])
+            with pytest.raises(FileNotFoundError):
+                await pool.verify_file("msg/missing.txt")
+
+    asyncio.run(run())
+
+
+def test_correction_is_cancelled(tmp_path):
+    sig_scheme = SigScheme("Ed25519")
+    message_file_path = str(tmp_path / "message.txt")
+    shutil.copy("msg/sample_message.txt", message_file_path)
+    write_signature_to_file(sign(sig_scheme, message_file_path, "keys/ed25519_priv.pem", k=1), message_file_path)
+    with open(message_file_path, "w", encoding="utf-8") as message_file:
+        # the original value of block 3 is searched among 2^32 values
+        message_file.write(get_raw_message("msg/sample_message.txt").replace("441", "4421"))
+
+    async def run():
+        async with AsyncSigningPool(sig_scheme, "keys/ed25519_priv.pem", "keys/ed25519_pub.pem", workers=1,
+                                    k=1) as pool:
+            correction = asyncio.ensure_future(pool.verify_and_correct(message_file_path))
+            await asyncio.sleep(1)
+            start = time.monotonic()
+            correction.cancel()
+            with pytest.raises(asyncio.CancelledError):
+                await correction
+            # the correction stops, and the pool keeps working
+            assert await pool.verify_file(message_file_path, get_signature_file_path(message_file_path)) == \
+                (True, [3])
+            assert time.monotonic() - start < 30
+
+    asyncio.run(run())
+
+
+def test_close_cancels_corrections(tmp_path):
+    sig_scheme = SigScheme("Ed25519")
+    message_file_path = str(tmp_path / "message.txt")
+    shutil.copy("msg/sample_message.txt", message_file_path)
+    write_signature_to_file(sign(sig_scheme, message_file_path, "keys/ed25519_priv.pem", k=1), message_file_path)
+    with open(message_file_path, "w", encoding="utf-8") as message_file:
+        message_file.write(get_raw_message("msg/sample_message.txt").replace("441", "4421"))
+
+    async def run():
+        pool = AsyncSigningPool(sig_scheme, "keys/ed25519_priv.pem", "keys/ed25519_pub.pem", workers=1, k=1)
+        await pool.start()
+        correction = asyncio.ensure_future(pool.verify_and_correct(message_file_path))
+        await asyncio.sleep(1)
+        start = time.monotonic()
+        await pool.close()
+        with pytest.raises(asyncio.CancelledError):
+            await correction
+        assert time.monotonic() - start < 30
+
+    asyncio.run(run())
@@ -0,0 +1,66 @@
+import shutil
+
+import pytest
+
+from mtsssigner.batch import sign_many, verify_many
+from mtsssigner.signer import sign
+from mtsssigner.signature_scheme import SigScheme
+from mtsssigner.utils.file_and_block_utils import get_signature_file_path
+
+
+def __write_messages(tmp_path, count):
+    paths = []
+    for document in range(count):
+        path = str(tmp_path / f"message{document}.txt")
+        with open(path, "w", encoding="utf-8") as message_file:
+            message_file.write("\n".join(f"line {line} of {document % 3}" for line in range(10 + document % 3)))
+        paths.append(path)
+    return paths
+
+
+def test_sign_and_verify_many(tmp_path):
+    sig_scheme = SigScheme("Ed25519")
+    paths = __write_messages(tmp_path, 7)
+    missing_path = str(tmp_path / "missing.txt")
+    shutil.copy("msg/sample_xml.xml", tmp_path / "message.xml")
+    xml_path = str(tmp_path / "message.xml")
+    results = {result.path: result for result in
+               sign_many(sig_scheme, paths + [missing_path, xml_path], "keys/ed25519_priv.pem", workers=1, k=1)}
+    assert results[missing_path].result is None and "FileNotFoundError" in results[missing_path].error
+    for path in paths + [xml_path]:
+        assert results[path].error is None
+        assert results[path].result == sign(sig_scheme, path, "keys/ed25519_priv.pem", k=1)
+        with open(get_signature_file_path(path), "rb") as signature_file:
+            assert signature_file.read() == results[path].result
+
+    with open(paths[1], "a", encoding="utf-8") as message_file:
+        message_file.write("changed")
+    results = {result.path: result for result in
+               verify_many(sig_scheme, paths + [missing_path, (xml_path, get_signature_file_path(xml_path))],
+                           "keys/ed25519_pub.pem", workers=1)}
+    assert results[missing_path].error is not None
+    assert results[paths[1]].result == (True, [10])
+    for path in paths[:1] + paths[2:]:
+        assert results[path].result == (True, [])
+    assert results[(xml_path, get_signature_file_path(xml_path))].result == (True, [])
+
+
+def test_sign_many_over_processes(tmp_path):
+    sig_scheme = SigScheme("Ed25519")
+    paths = __write_messages(tmp_path, 5)
+    results = list(sign_many(sig_scheme, paths, "keys/ed25519_priv.pem", workers=2, write_signatures=False, k=1))
+    assert sorted(result.path for result in results) == paths
+    for result in results:
+        assert result.result == sign(sig_scheme, result.path, "keys/ed25519_priv.pem", k=1)
+    list(sign_many(sig_scheme, paths, "keys/ed25519_priv.pem", workers=2, k=1))
+    results = list(verify_many(sig_scheme, paths, "keys/ed25519_pub.pem", workers=2))
+    assert sorted(result.path for result in results) == paths
+    assert all(result.result == (True, []) for result in results)
+
+
+def test_missing_key_fails_before_starting_workers(tmp_path):
+    paths = __write_messages(tmp_path, 2)
+    with pytest.raises(FileNotFoundError):
+        sign_many(SigScheme("Ed25519"), paths, "keys/nonexistent.pem", workers=2, k=1)
+    with pytest.raises(FileNotFoundError):
+        verify_many(SigScheme("Ed25519"), paths, "keys/nonexistent.pem", workers=2)
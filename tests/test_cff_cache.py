@@ -0,0 +1,118 @@
+import functools
+import glob
+import os
+import time
+import multiprocessing
+
+import pytest
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+from mtsssigner import cff_builder, cff_cache
+from mtsssigner.cff import SparseCFF
+from mtsssigner.cff_builder import create_cff, create_1_cff
+from mtsssigner.cff_cache import CFFCache
+from mtsssigner.utils.cff_file_utils import (read_cff_from_binary_file, read_or_build_cff_file,
+                                             write_cff_to_binary_file)
+
+
+def test_cache_counts_hits_and_misses():
+    cache = CFFCache()
+    loads = []
+    loader = lambda: loads.append(1) or create_cff(5, 3)
+    first = cache.get(("polynomial", 25, 125, 2), loader)
+    second = cache.get(("polynomial", 25, 125, 2), loader)
+    assert first is second
+    assert len(loads) == 1
+    assert cache.stats()["hits"] == 1
+    assert cache.stats()["misses"] == 1
+
+
+def test_cache_evicts_least_recently_used_within_budget():
+    cffs = {n: create_1_cff(n) for n in [64, 128, 256]}
+    cache = CFFCache(max_bytes=cffs[128].nbytes + cffs[256].nbytes)
+    for n in [64, 128]:
+        cache.get(n, lambda: cffs[n])
+    cache.get(64, lambda: cffs[64])
+    cache.get(256, lambda: cffs[256])
+    assert 64 in cache and 256 in cache and 128 not in cache
+    assert cache.stats()["evictions"] == 1
+    assert cache.stats()["bytes"] <= cache.max_bytes
+
+
+def test_get_cff_reuses_cached_cff():
+    cff_cache.cache.clear()
+    assert cff_cache.get_cff(5, 3) is cff_cache.get_cff(5, 3)
+    assert cff_cache.get_1_cff(100) is cff_cache.get_1_cff(100)
+    assert ("polynomial", 25, 125, 2, '{"k":3,"q":5}') in cff_cache.cache
+    assert ("sperner", 9, 100, 1, '{"n":100}') in cff_cache.cache
+
+
+def test_get_cff_from_construction_shares_entries():
+    cff_cache.cache.clear()
+    parameters = {"q": 11, "k": 3, "m": 5, "n": 1000}
+    cff = cff_cache.get_cff_from_construction("reed-solomon", parameters)
+    assert (cff.t, cff.n, cff.d) == (55, 1000, 2)
+    assert cff_cache.get_cff_from_construction("reed-solomon", dict(parameters)) is cff
+    assert cff_cache.get_cff_from_construction("polynomial", {"q": 5, "k": 3}) is cff_cache.get_cff(5, 3)
+
+
+def test_built_cffs_are_written_through_to_the_cache_directory(tmp_path, monkeypatch):
+    monkeypatch.setattr(cff_cache, "cache_directory", str(tmp_path))
+    cff_cache.cache.clear()
+    parameters = {"q": 7, "k": 3, "m": 5, "n": 300}
+    built_cff = cff_cache.get_cff_from_construction("reed-solomon", parameters)
+    assert len(glob.glob(str(tmp_path / "reed-solomon-*-2-CFF(35, 300).cff"))) == 1
+
+    cff_cache.cache.clear()
+    monkeypatch.setattr(cff_builder.PolynomialCFF, "__init__", None)
+    read_cff = cff_cache.get_cff_from_construction("reed-solomon", parameters)
+    assert isinstance(read_cff, SparseCFF)
+    assert read_cff.to_dense() == built_cff.to_dense()
+    cff_cache.cache.clear()
+
+
+def test_corrupted_cff_files_are_rebuilt(tmp_path):
+    file_path = str(tmp_path / "2-CFF(25, 125).cff")
+    write_cff_to_binary_file(SparseCFF.from_cff(create_cff(5, 3)), file_path, "polynomial", 5, 3)
+    with open(file_path, "r+b") as file:
+        file.seek(200)
+        file.write(b"\xff")
+    with pytest.raises(ValueError):
+        read_cff_from_binary_file(file_path)
+    cff = read_or_build_cff_file(file_path, lambda: SparseCFF.from_cff(create_cff(5, 3)), "polynomial", 5, 3)
+    assert cff.to_dense() == create_cff(5, 3).to_dense()
+
+
+def build_cff_slowly(builds_path: str) -> SparseCFF:
+    with open(builds_path, "a", encoding="utf-8") as builds_file:
+        builds_file.write("built\n")
+    time.sleep(0.2)
+    return SparseCFF.from_cff(create_1_cff(500))
+
+
+def read_or_build_shared_cff(directory: str) -> int:
+    file_path = os.path.join(directory, "1-CFF(12, 500).cff")
+    builds_path = os.path.join(directory, "builds.txt")
+    return read_or_build_cff_file(file_path, functools.partial(build_cff_slowly, builds_path), "sperner").n
+
+
+def test_concurrent_processes_build_a_cff_once(tmp_path):
+    # spawned, so the workers do not inherit the state of the test process
+    with multiprocessing.get_context("spawn").Pool(4) as process_pool:
+        assert process_pool.map(read_or_build_shared_cff, [str(tmp_path)] * 8) == [500] * 8
+    with open(tmp_path / "builds.txt", encoding="utf-8") as builds_file:
+        assert builds_file.read() == "built\n"
+
+
+@pytest.mark.skipif(fcntl is None, reason="file locks need fcntl")
+def test_cached_cff_is_read_without_waiting_for_the_build_lock(tmp_path):
+    file_path = str(tmp_path / "1-CFF(12, 500).cff")
+    write_cff_to_binary_file(SparseCFF.from_cff(create_1_cff(500)), file_path, "sperner")
+    # held as by a process building the CFF; flock would block this process too
+    with open(f"{file_path}.lock", "ab") as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        assert read_or_build_cff_file(file_path, lambda: pytest.fail("the CFF was rebuilt"), "sperner").n == 500
@@ -0,0 +1,47 @@
+import itertools
+
+from mtsssigner.cff_constructions import get_construction, get_parameters_key
+
+CONSTRUCTIONS = [
+    ("reed-solomon", {"q": 5, "k": 2, "m": 3, "n": 20}),
+    ("reed-solomon", {"q": 4, "k": 3, "m": 4, "n": 64}),
+    ("steiner", {"v": 9, "n": 12}),
+    ("steiner", {"v": 15, "n": 30}),
+    ("kronecker", {"first": {"construction": "sperner", "parameters": {"n": 6}},
+                   "second": {"construction": "polynomial", "parameters": {"q": 3, "k": 2}}}),
+]
+
+
+def is_d_disjunct(cff) -> bool:
+    columns = [set(cff.tests_of_block(block).tolist()) for block in range(cff.n)]
+    for block, column in enumerate(columns):
+        others = [other for other in range(cff.n) if other != block]
+        for covering in itertools.combinations(others, min(cff.d, len(others))):
+            if column <= set().union(*(columns[other] for other in covering)):
+                return False
+    return True
+
+
+def test_constructions_build_d_cffs_with_declared_capabilities():
+    for name, parameters in CONSTRUCTIONS:
+        construction = get_construction(name)
+        cff = construction.create(parameters)
+        t, n, d, incidences = construction.get_capabilities(parameters)
+        assert (cff.t, cff.n, cff.d) == (t, n, d)
+        rows = [cff.blocks_of_test(test).tolist() for test in range(cff.t)]
+        assert sum(len(row) for row in rows) == incidences
+        for block in range(cff.n):
+            assert cff.tests_of_block(block).tolist() == [test for test, row in enumerate(rows) if block in row]
+        assert is_d_disjunct(cff), (name, parameters)
+
+
+def test_offered_parameters_cover_the_blocks():
+    for name in ["sperner", "polynomial", "reed-solomon", "steiner"]:
+        construction = get_construction(name)
+        for parameters in construction.get_parameters(1000, 2, padding=True):
+            t, n, d, _ = construction.get_capabilities(parameters)
+            assert n >= 1000 and d >= 2
+
+
+def test_parameters_key_is_canonical():
+    assert get_parameters_key({"q": 5, "k": 3}) == get_parameters_key({"k": 3, "q": 5})
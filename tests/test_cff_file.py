@@ -3,8 +3,8 @@ from mtsssigner.utils.file_and_block_utils import *
 
 
 def test_1_cff_file():
-    original_cff = create_1_cff(4096)
-    file_cff = read_cff_from_file(15, 4096, 1) 
+    original_cff = create_1_cff(4096).to_dense()
+    file_cff = read_cff_from_file(15, 4096, 1).to_dense()
     assert len(original_cff) == len(file_cff)
     assert len(original_cff[-1]) == len(file_cff[-1])
     print(original_cff)
@@ -12,8 +12,8 @@ def test_1_cff_file():
         assert original_cff[line] == file_cff[line]
     
 def test_2_cff_25_125():
-    original_cff = create_cff(5, 3)
-    file_cff = read_cff_from_file(25, 125, 2)
+    original_cff = create_cff(5, 3).to_dense()
+    file_cff = read_cff_from_file(25, 125, 2).to_dense()
     assert len(original_cff) == len(file_cff)
     assert len(original_cff[-1]) == len(file_cff[-1])
     print(original_cff)
@@ -21,10 +21,25 @@ def test_2_cff_25_125():
         assert original_cff[line] == file_cff[line]
 
 def test_7_cff_64_64():
-    original_cff = create_cff(8, 2)
-    file_cff = read_cff_from_file(64, 64, 7)
+    original_cff = create_cff(8, 2).to_dense()
+    file_cff = read_cff_from_file(64, 64, 7).to_dense()
     assert len(original_cff) == len(file_cff)
     assert len(original_cff[-1]) == len(file_cff[-1])
     print(original_cff)
     for line in range(len(file_cff)):
         assert original_cff[line] == file_cff[line]
+
+
+def test_binary_cff_file_round_trip(tmp_path):
+    from mtsssigner.utils.cff_file_utils import (read_cff_header, read_cff_from_binary_file,
+                                                 write_cff_to_binary_file)
+    original_cff = create_cff(5, 3)
+    file_path = str(tmp_path / "2-CFF(25, 125).cff")
+    write_cff_to_binary_file(original_cff, file_path, "polynomial", 5, 3)
+    header = read_cff_header(file_path)
+    assert (header["construction"], header["t"], header["n"], header["d"]) == ("polynomial", 25, 125, 2)
+    file_cff = read_cff_from_binary_file(file_path)
+    assert file_cff.d == 2
+    assert file_cff.to_dense() == original_cff.to_dense()
+    for block in range(125):
+        assert file_cff.tests_of_block(block).tolist() == original_cff.tests_of_block(block).tolist()
@@ -0,0 +1,86 @@
+import os
+
+from mtsssigner.cff_constructions import get_construction
+from mtsssigner.cff_planner import (AUTO_GROUP_SIZE,
+                                    COST_PROFILE_PATH,
+                                    DEFAULT_COST_PROFILE,
+                                    get_feasible_cffs,
+                                    load_cost_profile,
+                                    plan_cff,
+                                    plan_hierarchical_cff)
+
+DIGEST_SIZE_BYTES = 32
+SIGNATURE_LENGTH_BYTES = 256
+LEGACY_CONSTRUCTIONS = ["sperner", "polynomial"]
+
+
+def test_feasible_cffs_for_prime_power():
+    plans = get_feasible_cffs(4096, DIGEST_SIZE_BYTES, SIGNATURE_LENGTH_BYTES, constructions=LEGACY_CONSTRUCTIONS)
+    assert sorted((plan.construction, plan.t, plan.d) for plan in plans) == [
+        ("polynomial", 64, 2), ("polynomial", 256, 7), ("polynomial", 4096, 63), ("sperner", 15, 1)]
+    for plan in plans:
+        assert plan.signature_size_bytes == (plan.t + 1) * DIGEST_SIZE_BYTES + SIGNATURE_LENGTH_BYTES
+
+
+def test_only_1_cff_is_feasible_for_other_block_numbers():
+    plans = get_feasible_cffs(1000, DIGEST_SIZE_BYTES, SIGNATURE_LENGTH_BYTES, constructions=LEGACY_CONSTRUCTIONS)
+    assert [(plan.construction, plan.parameters, plan.t) for plan in plans] == [("sperner", {"n": 1000}, 13)]
+
+
+def test_plan_respects_target_d_and_signature_size():
+    plan = plan_cff(4096, DIGEST_SIZE_BYTES, SIGNATURE_LENGTH_BYTES, target_d=3)
+    assert plan.d >= 3
+    plan = plan_cff(4096, DIGEST_SIZE_BYTES, SIGNATURE_LENGTH_BYTES, target_d=2, max_size_bytes=4096,
+                    constructions=LEGACY_CONSTRUCTIONS)
+    assert plan.parameters == {"q": 8, "k": 4}
+    try:
+        plan_cff(4096, DIGEST_SIZE_BYTES, SIGNATURE_LENGTH_BYTES, target_d=3, max_size_bytes=4096,
+                 constructions=LEGACY_CONSTRUCTIONS)
+        assert False
+    except ValueError:
+        pass
+
+
+def test_padding_allows_polynomial_cffs_for_other_block_numbers():
+    plans = get_feasible_cffs(1000, DIGEST_SIZE_BYTES, SIGNATURE_LENGTH_BYTES, padding=True,
+                              constructions=["polynomial"])
+    assert sorted((plan.parameters["q"], plan.parameters["k"], plan.n, plan.d) for plan in plans) == [
+        (11, 3, 1331, 5), (32, 2, 1024, 31)]
+    plan = plan_cff(1000, DIGEST_SIZE_BYTES, SIGNATURE_LENGTH_BYTES, target_d=2, padding=True,
+                    constructions=["polynomial"])
+    assert plan.n > 1000 and plan.signature_size_bytes > (plan.t + 1) * DIGEST_SIZE_BYTES + SIGNATURE_LENGTH_BYTES
+
+
+def test_reed_solomon_needs_fewer_tests_than_polynomial_cffs():
+    plans = get_feasible_cffs(4096, DIGEST_SIZE_BYTES, SIGNATURE_LENGTH_BYTES, target_d=3)
+    polynomial = min(plan.t for plan in plans if plan.construction == "polynomial")
+    reed_solomon = min(plan.t for plan in plans if plan.construction == "reed-solomon")
+    assert reed_solomon < polynomial
+
+
+def test_verifying_costs_more_than_signing():
+    profile = {**DEFAULT_COST_PROFILE, "localization_seconds": 1e-6}
+    for plan in get_feasible_cffs(4096, DIGEST_SIZE_BYTES, SIGNATURE_LENGTH_BYTES, profile=profile):
+        incidences = get_construction(plan.construction).get_capabilities(plan.parameters).incidences
+        assert abs(plan.verify_cost_seconds - plan.sign_cost_seconds - incidences * 1e-6) < 1e-9
+
+
+def test_cost_profile_path_does_not_depend_on_working_directory(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    assert os.path.isabs(COST_PROFILE_PATH)
+    profile_path = tmp_path / "profile.json"
+    profile_path.write_text('{"SHA256": {"test_seconds": 1.0}}', encoding="utf-8")
+    assert load_cost_profile("SHA256", str(profile_path)) == {**DEFAULT_COST_PROFILE, "test_seconds": 1.0}
+    assert load_cost_profile("SHA256", "missing.json") == DEFAULT_COST_PROFILE
+
+
+def test_hierarchical_plan_falls_back_to_a_smaller_flat_signature():
+    flat = min(get_feasible_cffs(10 ** 6, DIGEST_SIZE_BYTES, SIGNATURE_LENGTH_BYTES, target_d=2),
+               key=lambda plan: plan.signature_size_bytes)
+    # super-blocks of 1000 blocks: 1000 outer blocks and 1000 inner blocks
+    level = min(get_feasible_cffs(1000, DIGEST_SIZE_BYTES, SIGNATURE_LENGTH_BYTES, target_d=2),
+                key=lambda plan: plan.t)
+    assert flat.t < level.t * (1 + level.t)
+    for group_size in [AUTO_GROUP_SIZE, 1000]:
+        assert plan_hierarchical_cff(10 ** 6, DIGEST_SIZE_BYTES, SIGNATURE_LENGTH_BYTES, target_d=2,
+                                     group_size=group_size) is None
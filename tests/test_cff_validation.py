@@ -0,0 +1,51 @@
+import itertools
+
+import numpy
+
+from mtsssigner.cff import SparseCFF
+from mtsssigner.cff_builder import create_cff
+from mtsssigner.cff_constructions import get_construction
+from mtsssigner.utils.cff_validation_utils import find_d_disjunctness_violation, is_d_disjunct
+
+
+def get_brute_force_violation(cff: SparseCFF, d: int):
+    columns = [set(cff.tests_of_block(block).tolist()) for block in range(cff.n)]
+    for block, column in enumerate(columns):
+        others = [other for other in range(cff.n) if other != block]
+        for size in range(min(d, len(others)) + 1):
+            for covering in itertools.combinations(others, size):
+                if column <= set().union(*(columns[other] for other in covering)):
+                    return block
+    return None
+
+
+def test_validator_matches_brute_force_on_random_matrices():
+    generator = numpy.random.default_rng(7)
+    for _ in range(60):
+        t, n, d = int(generator.integers(4, 12)), int(generator.integers(2, 14)), int(generator.integers(1, 4))
+        cff = SparseCFF.from_dense(generator.random((t, n)) < 0.4, d)
+        violation = find_d_disjunctness_violation(cff)
+        assert (None if violation is None else violation[0]) == get_brute_force_violation(cff, d)
+        if violation is not None:
+            block, covering = violation
+            assert len(covering) <= d and block not in covering
+            covered = set().union(*(cff.tests_of_block(other).tolist() for other in covering))
+            assert set(cff.tests_of_block(block).tolist()) <= covered
+
+
+def test_validator_accepts_constructions_and_reports_exceeded_d():
+    assert is_d_disjunct(create_cff(7, 3))
+    assert is_d_disjunct(get_construction("steiner").create({"v": 21, "n": 70}))
+    # two polynomials of degree < 3 agree on at most 2 of the 7 points, so 4 blocks cover any other
+    assert not is_d_disjunct(create_cff(7, 3), d=4)
+
+
+def test_parallel_validation_reports_the_first_violation():
+    cff = SparseCFF.from_cff(create_cff(17, 3))
+    # block 4000 gets the tests of blocks 3 and 5
+    matrix = numpy.array(cff.to_dense())
+    matrix[:, 4000] = matrix[:, 3] | matrix[:, 5]
+    broken_cff = SparseCFF.from_dense(matrix, cff.d)
+    assert find_d_disjunctness_violation(broken_cff, workers=2) == find_d_disjunctness_violation(broken_cff)
+    block, covering = find_d_disjunctness_violation(broken_cff, workers=2)
+    assert block <= 5 and len(covering) <= cff.d
@@ -0,0 +1,65 @@
+from mtsssigner.cff import SparseCFF
+from mtsssigner.cff_builder import create_cff
+from mtsssigner import digest_matrix
+from mtsssigner.digest_matrix import get_digest_matrix, get_test_concatenations, hash_tests
+from mtsssigner.signature_scheme import SigScheme
+
+SIG_SCHEME = SigScheme("Ed25519", "SHA256")
+BLOCKS = [f"block {block}" for block in range(120)]
+
+
+def test_digest_matrix_pads_with_empty_block_digests():
+    digests = get_digest_matrix(SIG_SCHEME, BLOCKS, 125)
+    assert digests.shape == (125, 32)
+    assert [row.tobytes() for row in digests] == ([SIG_SCHEME.get_digest(block) for block in BLOCKS] +
+                                                  [SIG_SCHEME.get_digest(b"")] * 5)
+
+
+def test_test_concatenations_match_joined_block_digests(monkeypatch):
+    # a few tests per chunk
+    monkeypatch.setattr(digest_matrix, "GATHER_CHUNK_BYTES", 1000)
+    digests = get_digest_matrix(SIG_SCHEME, BLOCKS, 125)
+    block_hashes = [row.tobytes() for row in digests]
+    for cff in [create_cff(5, 3), SparseCFF.from_cff(create_cff(5, 3))]:
+        tests = [3, 0, 24, 7]
+        concatenations = [(test, test_blocks.tolist(), bytes(concatenation))
+                          for test, test_blocks, concatenation in get_test_concatenations(digests, cff, tests)]
+        assert concatenations == [(test, cff.blocks_of_test(test).tolist(),
+                                   b"".join(block_hashes[block] for block in cff.blocks_of_test(test).tolist()))
+                                  for test in tests]
+        assert hash_tests(SIG_SCHEME, digests, cff) == [
+            SIG_SCHEME.get_digest(b"".join(block_hashes[block] for block in cff.blocks_of_test(test).tolist()))
+            for test in range(cff.t)]
+
+
+def test_parallel_test_hashing_matches_serial_hashing(monkeypatch):
+    monkeypatch.setattr(digest_matrix, "GATHER_CHUNK_BYTES", 1000)
+    monkeypatch.setattr(digest_matrix, "PARALLEL_MIN_BYTES", 0)
+    digests = get_digest_matrix(SIG_SCHEME, BLOCKS, 125)
+    tests = [24, 3, 0, 7, 11, 12, 5]
+    for cff in [create_cff(5, 3), SparseCFF.from_cff(create_cff(5, 3))]:
+        serial = hash_tests(SIG_SCHEME, digests, cff, tests, workers=1)
+        monkeypatch.setattr(digest_matrix, "THREADS_MIN_TEST_BYTES", 0)
+        assert hash_tests(SIG_SCHEME, digests, cff, tests, workers=3) == serial
+        monkeypatch.setattr(digest_matrix, "THREADS_MIN_TEST_BYTES", 1 << 62)
+        monkeypatch.setattr(digest_matrix, "PROCESSES_MIN_BYTES", 0)
+        assert hash_tests(SIG_SCHEME, digests, cff, tests, workers=2) == serial
+
+
+def test_execution_mode_thresholds():
+    mib = 1024 * 1024
+    assert digest_matrix.get_execution_mode(mib, 10, 8) == "serial"
+    assert digest_matrix.get_execution_mode(64 * mib, 16, 8) == "threads"
+    assert digest_matrix.get_execution_mode(64 * mib, 1 << 20, 8) == "serial"
+    assert digest_matrix.get_execution_mode(1024 * mib, 1 << 20, 8) == "processes"
+    assert digest_matrix.get_execution_mode(1024 * mib, 16, 1) == "serial"
+
+
+def test_threaded_block_hashing_matches_serial_hashing(monkeypatch):
+    blocks = [f"{block:05d}".encode() * (block % 7 * 900) for block in range(300)]
+    monkeypatch.setattr(digest_matrix, "workers", 1)
+    serial = get_digest_matrix(SIG_SCHEME, blocks, 310)
+    monkeypatch.setattr(digest_matrix, "workers", 3)
+    monkeypatch.setattr(digest_matrix, "PARALLEL_MIN_BYTES", 0)
+    assert (get_digest_matrix(SIG_SCHEME, blocks, 310) == serial).all()
+    assert [row.tobytes() for row in serial[:300]] == [SIG_SCHEME.get_digest(block) for block in blocks]
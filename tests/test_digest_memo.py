@@ -0,0 +1,96 @@
+import threading
+from concurrent.futures import CancelledError
+
+import pytest
+
+from mtsssigner import digest_matrix
+from mtsssigner.digest_matrix import get_digest_matrix
+from mtsssigner.digest_memo import DigestMemo, ENTRY_OVERHEAD_BYTES
+from mtsssigner.signature_scheme import SigScheme
+from mtsssigner.signer import sign
+from mtsssigner.utils.file_and_block_utils import get_signature_file_path, write_signature_to_file
+from mtsssigner.verifier import verify, verify_and_correct
+
+SIG_SCHEME = SigScheme("Ed25519", "SHA256")
+PRIVATE_KEY = "keys/ed25519_priv.pem"
+PUBLIC_KEY = "keys/ed25519_pub.pem"
+
+
+def test_memo_evicts_least_recently_used_blocks():
+    entry_bytes = len("block 0") + 32 + ENTRY_OVERHEAD_BYTES
+    memo = DigestMemo(max_bytes=2 * entry_bytes)
+    memo.put_all("SHA256", ["block 0", "block 1"], [b"0" * 32, b"1" * 32])
+    assert memo.get_all("SHA256", ["block 0", "block 2"]) == [b"0" * 32, None]
+    memo.put_all("SHA256", ["block 2"], [b"2" * 32])
+    assert ("SHA256", "block 1") not in memo
+    assert memo.get_all("SHA256", ["block 0", "block 2"]) == [b"0" * 32, b"2" * 32]
+    # digests are memoized per hash function
+    assert memo.get_all("SHA512", ["block 0"]) == [None]
+    assert memo.stats() == {"entries": 2, "bytes": 2 * entry_bytes, "max_bytes": 2 * entry_bytes,
+                            "hits": 3, "misses": 2, "evictions": 1, "hit_rate": 0.6}
+
+
+def test_repeated_blocks_are_hashed_once(monkeypatch):
+    calls = []
+    get_digests = SigScheme.get_digests
+    monkeypatch.setattr(SigScheme, "get_digests",
+                        lambda self, buffer, offsets, ends=None: calls.append(len(offsets) - (ends is None))
+                        or get_digests(self, buffer, offsets, ends))
+    first = ["", "<p>", "text", "</p>", ""] * 20
+    second = ["", "<p>", "other text", "</p>"] * 10
+
+    digests = get_digest_matrix(SIG_SCHEME, first, 110)
+    assert [row.tobytes() for row in digests] == [SIG_SCHEME.get_digest(block) for block in first + [""] * 10]
+    assert calls == [4]
+
+    memo = DigestMemo()
+    monkeypatch.setattr(digest_matrix, "shared_memo", memo)
+    get_digest_matrix(SIG_SCHEME, first)
+    digests = get_digest_matrix(SIG_SCHEME, second)
+    assert [row.tobytes() for row in digests] == [SIG_SCHEME.get_digest(block) for block in second]
+    assert calls == [4, 4, 1]
+    assert (memo.hits, memo.misses) == (3, 5)
+
+
+def test_correction_tries_memoized_values(tmp_path, monkeypatch):
+    sig_scheme = SigScheme("Ed25519")
+    message_path = str(tmp_path / "message.txt")
+    # far too long to be found by brute force
+    original_value = "a value seen in another document of the batch"
+    lines = [f"line {line}" for line in range(10)]
+    lines[4] = original_value
+    with open(message_path, "w", encoding="utf-8") as message_file:
+        message_file.write("\n".join(lines))
+    write_signature_to_file(sign(sig_scheme, message_path, PRIVATE_KEY, k=1), message_path)
+    with open(message_path, "w", encoding="utf-8") as message_file:
+        message_file.write("\n".join(lines).replace(original_value, "modified"))
+
+    memo = DigestMemo()
+    monkeypatch.setattr(digest_matrix, "shared_memo", memo)
+    get_digest_matrix(sig_scheme, ["other", original_value])
+    result = verify(sig_scheme, message_path, get_signature_file_path(message_path), PUBLIC_KEY)
+    assert result == (True, [4])
+    assert verify_and_correct(result, sig_scheme, message_path)[2] == "\n".join(lines)
+
+
+def test_correction_tries_repeated_values_of_the_document(tmp_path):
+    sig_scheme = SigScheme("Ed25519")
+    message_path = str(tmp_path / "message.txt")
+    lines = ["a repeated line, too long to be found by brute force", "", "other line"] * 5
+    with open(message_path, "w", encoding="utf-8") as message_file:
+        message_file.write("\n".join(lines))
+    write_signature_to_file(sign(sig_scheme, message_path, PRIVATE_KEY, k=1), message_path)
+    modified_lines = list(lines)
+    modified_lines[3] = "modified"
+    with open(message_path, "w", encoding="utf-8") as message_file:
+        message_file.write("\n".join(modified_lines))
+
+    result = verify(sig_scheme, message_path, get_signature_file_path(message_path), PUBLIC_KEY)
+    assert result == (True, [3])
+    assert verify_and_correct(result, sig_scheme, message_path)[2] == "\n".join(lines)
+
+    cancelled = threading.Event()
+    cancelled.set()
+    result = verify(sig_scheme, message_path, get_signature_file_path(message_path), PUBLIC_KEY)
+    with pytest.raises(CancelledError):
+        verify_and_correct(result, sig_scheme, message_path, cancelled)
@@ -0,0 +1,31 @@
+from mtsssigner.signature_scheme import SigScheme
+from mtsssigner.signer import sign
+from mtsssigner.utils.file_and_block_utils import write_signature_to_file
+from mtsssigner.verifier import verify
+
+PRIVATE_KEY = "keys/rsa_2048_priv.pem"
+PUBLIC_KEY = "keys/rsa_2048_pub.pem"
+# 32 super-blocks of 32 blocks, both levels 2-CFFs
+HIERARCHICAL_PARAMETERS = {"first": {"construction": "steiner", "parameters": {"v": 15, "n": 32}},
+                           "second": {"construction": "steiner", "parameters": {"v": 15, "n": 32}}}
+
+
+def test_hierarchical_signature_localizes_modified_blocks(tmp_path):
+    message_path = str(tmp_path / "message.txt")
+    lines = [str(line) for line in range(1000)]
+    with open(message_path, "w", encoding="utf-8") as message_file:
+        message_file.write("\n".join(lines))
+    sig_scheme = SigScheme("PKCS#1 v1.5", "SHA256")
+    signature = sign(sig_scheme, message_path, PRIVATE_KEY, target_d=2, construction="kronecker",
+                     parameters=HIERARCHICAL_PARAMETERS, group_size=32)
+    write_signature_to_file(signature, message_path)
+    signature_path = str(tmp_path / "message_signature.mts")
+    assert verify(sig_scheme, message_path, signature_path, PUBLIC_KEY) == (True, [])
+
+    for modified_blocks in [[7, 900], [40, 41]]:
+        modified_lines = list(lines)
+        for block in modified_blocks:
+            modified_lines[block] = "modified"
+        with open(message_path, "w", encoding="utf-8") as message_file:
+            message_file.write("\n".join(modified_lines))
+        assert verify(sig_scheme, message_path, signature_path, PUBLIC_KEY) == (True, modified_blocks)
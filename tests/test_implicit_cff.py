@@ -0,0 +1,37 @@
+import itertools
+
+from mtsssigner.cff import CFF
+from mtsssigner.cff_builder import (create_1_cff, create_cff, create_implicit_cff,
+                                    KroneckerCFF, PolynomialCFF, SpernerCFF)
+
+
+def test_polynomial_cff_matches_built_cff():
+    for q, k in [(5, 3), (8, 2), (9, 3)]:
+        built_cff = create_cff(q, k)
+        implicit_cff = create_implicit_cff(q, k)
+        assert isinstance(implicit_cff, PolynomialCFF)
+        assert implicit_cff.to_dense() == built_cff.to_dense()
+        for block in range(0, built_cff.n, 7):
+            assert implicit_cff.tests_of_block(block).tolist() == built_cff.tests_of_block(block).tolist()
+
+
+def test_sperner_cff_unranks_lexicographic_subsets():
+    for n in [64, 100, 4096]:
+        implicit_cff = create_1_cff(n)
+        assert isinstance(implicit_cff, SpernerCFF)
+        columns = list(itertools.combinations(range(implicit_cff.t), implicit_cff.t // 2))[:n]
+        for block in range(0, n, 37):
+            assert implicit_cff.tests_of_block(block).tolist() == list(columns[block])
+        for test in range(implicit_cff.t):
+            assert implicit_cff.blocks_of_test(test).tolist() == [block for block, column in enumerate(columns)
+                                                                   if test in column]
+
+
+def test_tests_of_block_ranges_match_tests_of_blocks():
+    for cff in [create_1_cff(100), PolynomialCFF(5, 3, 4, 100),
+                KroneckerCFF(create_implicit_cff(5, 2), create_1_cff(10))]:
+        for start, end in [(0, cff.n), (3, 17), (12, 13), (40, 40)]:
+            indptr, tests = cff.tests_of_blocks(start, end)
+            expected_indptr, expected_tests = CFF.tests_of_blocks(cff, start, end)
+            assert indptr.tolist() == expected_indptr.tolist()
+            assert tests.tolist() == expected_tests.tolist()
@@ -0,0 +1,93 @@
+import asyncio
+import os
+import shutil
+import subprocess
+import sys
+import threading
+import time
+
+import pytest
+
+from mtsssigner.client import ServerError, SigningClient
+from mtsssigner.server import run_server
+from mtsssigner.server_protocol import (SIGN, SOURCE_TXT, Request, decode_request, encode_request,
+                                        get_frame_length_size, parse_address)
+from mtsssigner.signer import sign
+from mtsssigner.signature_scheme import SigScheme
+from mtsssigner.utils.file_and_block_utils import get_raw_message, get_signature_file_path, write_signature_to_file
+
+
+def test_protocol_round_trip():
+    request = Request(7, SIGN, SOURCE_TXT, [b"line 1\nline 2", b""])
+    assert decode_request(encode_request(request)[get_frame_length_size():]) == request
+    with pytest.raises(ValueError):
+        decode_request(encode_request(request)[get_frame_length_size():-1])
+    assert parse_address("localhost:8000")[1] == ("localhost", 8000)
+    assert parse_address(":8000")[1] == ("127.0.0.1", 8000)
+    assert parse_address("[::1]:8000")[1] == ("::1", 8000)
+    for address in ["0.0.0.0:8000", "192.168.0.1:8000", "example.com:8000"]:
+        with pytest.raises(ValueError):
+            parse_address(address)
+    assert parse_address("/tmp/mtss.sock")[1] == "/tmp/mtss.sock"
+
+
+def test_server_signs_verifies_and_locates(tmp_path):
+    sig_scheme = SigScheme("Ed25519")
+    address = str(tmp_path / "mtss.sock")
+    loop = asyncio.new_event_loop()
+    started = threading.Event()
+
+    def run():
+        with pytest.raises(asyncio.CancelledError):
+            loop.run_until_complete(run_server(sig_scheme, address, "keys/ed25519_priv.pem", "keys/ed25519_pub.pem",
+                                               workers=1, started=started.set, k=1))
+
+    server = threading.Thread(target=run)
+    server.start()
+    try:
+        assert started.wait(60)
+        expected = sign(sig_scheme, "msg/sample_message.txt", "keys/ed25519_priv.pem", k=1)
+        content = get_raw_message("msg/sample_message.txt")
+        with SigningClient(address) as client:
+            assert client.sign_file("msg/sample_message.txt") == expected
+            assert client.sign(content) == expected
+            assert client.verify(content, expected) == (True, True)
+            modified = content.split("\n")
+            modified[3] += "changed"
+            assert client.locate("\n".join(modified), expected) == (True, [3])
+            assert client.verify("\n".join(modified), expected) == (True, False)
+            with pytest.raises(ServerError, match="FileNotFoundError"):
+                client.sign_file("msg/missing.txt")
+            # pipelined requests, answered out of order
+            requests = [client.send("sign", f"document {document}\nline", file_type="txt") for document in range(8)]
+            signatures = [client.result(request) for request in reversed(requests)]
+            for document, signature in zip(reversed(range(8)), signatures):
+                assert client.verify(f"document {document}\nline", signature) == (True, True)
+    finally:
+        loop.call_soon_threadsafe(lambda: [task.cancel() for task in asyncio.all_tasks(loop)])
+        server.join(60)
+        loop.close()
+    assert not os.path.exists(address)
+
+
+def test_serve_command(tmp_path):
+    address = str(tmp_path / "mtss.sock")
+    process = subprocess.Popen([sys.executable, "mtss_signer.py", "serve", "ed25519", address,
+                                "keys/ed25519_priv.pem", "-k", "1", "SHA512", "--public-key=keys/ed25519_pub.pem",
+                                "--workers=2"])
+    try:
+        deadline = time.monotonic() + 120
+        while not os.path.exists(address) and process.poll() is None and time.monotonic() < deadline:
+            time.sleep(0.1)
+        with SigningClient(address, timeout=60) as client:
+            message_file_path = str(tmp_path / "message.txt")
+            shutil.copy("msg/sample_message.txt", message_file_path)
+            write_signature_to_file(client.sign_file(message_file_path), message_file_path)
+            assert client.verify_file(message_file_path) == (True, True)
+            with open(message_file_path, "a", encoding="utf-8") as message_file:
+                message_file.write("changed")
+            assert client.locate_file(message_file_path, get_signature_file_path(message_file_path)) == (True, [8])
+    finally:
+        process.terminate()
+        assert process.wait(60) == 0
+    assert not os.path.exists(address)
@@ -0,0 +1,60 @@
+import multiprocessing
+import pickle
+import subprocess
+import sys
+import time
+from multiprocessing import shared_memory
+
+import numpy
+import pytest
+
+from mtsssigner.cff_builder import create_cff
+from mtsssigner.utils.shared_memory_utils import get_shared_cff, share_cff, SharedArrays
+
+# run in a subprocess, which is killed while its segment is published
+CRASHING_PROCESS = """
+import os, signal
+import numpy
+from mtsssigner.utils.shared_memory_utils import SharedArrays
+shared = SharedArrays.create({"digests": numpy.zeros((4, 32), dtype=numpy.uint8)})
+print(shared.memory.name, flush=True)
+os.kill(os.getpid(), signal.SIGKILL)
+"""
+
+
+def read_shared_cff(shared: SharedArrays):
+    cff = get_shared_cff(shared)
+    return cff.to_dense(), cff.test_blocks.flags.owndata
+
+
+def test_workers_map_the_shared_cff():
+    cff = create_cff(7, 3)
+    with share_cff(cff) as shared_cff:
+        with multiprocessing.get_context("spawn").Pool(2) as process_pool:
+            for dense, owns_data in process_pool.map(read_shared_cff, [shared_cff] * 2):
+                assert dense == cff.to_dense()
+                assert not owns_data
+
+
+def test_digests_round_trip_and_segment_is_unlinked_on_close():
+    digests = numpy.arange(320, dtype=numpy.uint8).reshape((10, 32))
+    with SharedArrays.create({"digests": digests}) as shared_digests:
+        attached_digests = pickle.loads(pickle.dumps(shared_digests))
+        assert attached_digests["digests"].tolist() == digests.tolist()
+        attached_digests.close()
+        name = shared_digests.memory.name
+    with pytest.raises(FileNotFoundError):
+        shared_memory.SharedMemory(name=name)
+
+
+def test_segments_of_crashed_processes_are_unlinked():
+    result = subprocess.run([sys.executable, "-c", CRASHING_PROCESS], capture_output=True, text=True, timeout=60)
+    name = result.stdout.strip()
+    assert name
+    for _ in range(100):
+        try:
+            shared_memory.SharedMemory(name=name).close()
+        except FileNotFoundError:
+            return
+        time.sleep(0.1)
+    pytest.fail(f"shared memory segment {name} was not unlinked")
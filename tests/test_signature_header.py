@@ -0,0 +1,22 @@
+from mtsssigner.cff_builder import get_d, get_padded_q
+from mtsssigner.signature_header import encode_signature_header, split_signature_header
+
+CONTENT = bytes(range(96))
+
+
+def test_signature_header_round_trip():
+    metadata = {"k": 3, "n": 1000, "q": 11}
+    assert split_signature_header(encode_signature_header(metadata) + CONTENT) == (metadata, CONTENT)
+
+
+def test_signature_without_header_is_unchanged():
+    assert split_signature_header(CONTENT) == ({}, CONTENT)
+    assert split_signature_header(b"MTSS" + CONTENT) == ({}, b"MTSS" + CONTENT)
+
+
+def test_padded_q():
+    assert get_padded_q(2, 1000) == 32
+    assert get_padded_q(3, 1000) == 11
+    assert get_padded_q(4, 2401) == 7
+    # q = 4 would give d = 1
+    assert get_padded_q(3, 50) == 5 and get_d(5, 3) == 2
@@ -0,0 +1,15 @@
+import numpy
+
+from mtsssigner.signature_scheme import HASHLIB_ALGORITHMS, SigScheme
+
+BLOCKS = [b"", b"a", "ação".encode(), bytes(range(256)) * 40]
+
+
+def test_batch_digests_match_single_digests():
+    buffer = b"".join(BLOCKS)
+    offsets = numpy.cumsum([0] + [len(block) for block in BLOCKS])
+    for hash_function in HASHLIB_ALGORITHMS:
+        sig_scheme = SigScheme("Ed25519", hash_function)
+        digests = sig_scheme.get_digests(buffer, offsets)
+        assert digests.shape == (len(BLOCKS), sig_scheme.digest_size_bytes)
+        assert [row.tobytes() for row in digests] == [sig_scheme.get_digest(block) for block in BLOCKS]
@@ -0,0 +1,31 @@
+from concurrent.futures import ThreadPoolExecutor
+
+from mtsssigner.signer import Signer, sign
+from mtsssigner.signature_scheme import SigScheme
+from mtsssigner.utils.file_and_block_utils import get_message_and_blocks_from_file
+
+
+def test_signer_matches_sign():
+    for algorithm, hash_function, private_key_path in [("PKCS#1 v1.5", "SHA256", "keys/private_openssl1-1.pem"),
+                                                       ("Ed25519", "SHA512", "keys/ed25519_priv.pem")]:
+        sig_scheme = SigScheme(algorithm, hash_function)
+        signer = Signer(sig_scheme, private_key_path, k=2)
+        expected = sign(sig_scheme, "msg/sample_message.txt", private_key_path, k=2)
+        assert signer.sign_file("msg/sample_message.txt") == expected
+        _, blocks = get_message_and_blocks_from_file("msg/sample_message.txt")
+        assert signer.sign(blocks) == expected
+
+
+def test_signer_is_shared_by_threads(tmp_path):
+    sig_scheme = SigScheme("Ed25519")
+    signer = Signer(sig_scheme, "keys/ed25519_priv.pem", padding=True, target_d=2, max_size_bytes=4096)
+    documents = [[f"line {line} of {document}" for line in range(20 + document * 7)] for document in range(12)]
+    with ThreadPoolExecutor(4) as executor:
+        signatures = list(executor.map(signer.sign, documents * 2))
+    assert signatures[:12] == signatures[12:]
+    for document, signature in zip(documents, signatures):
+        message_path = str(tmp_path / "message.txt")
+        with open(message_path, "w", encoding="utf-8") as message_file:
+            message_file.write("\n".join(document))
+        assert signature == sign(sig_scheme, message_path, "keys/ed25519_priv.pem", padding=True, target_d=2,
+                                 max_size_bytes=4096)
@@ -0,0 +1,19 @@
+from mtsssigner.cff import SparseCFF
+from mtsssigner.cff_builder import create_1_cff, create_cff
+
+
+def test_sparse_cff_matches_dense_incidences():
+    for cff in [create_1_cff(64), create_cff(5, 3), create_cff(8, 2)]:
+        dense = cff.to_dense()
+        for test in range(cff.t):
+            assert cff.blocks_of_test(test).tolist() == [block for block in range(cff.n) if dense[test][block] == 1]
+        for block in range(cff.n):
+            assert cff.tests_of_block(block).tolist() == [test for test in range(cff.t) if dense[test][block] == 1]
+
+
+def test_sparse_cff_from_dense_round_trip():
+    original_cff = create_cff(5, 3)
+    rebuilt_cff = SparseCFF.from_dense(original_cff.to_dense(), original_cff.d)
+    assert len(rebuilt_cff) == 25
+    assert rebuilt_cff.d == 2
+    assert rebuilt_cff.to_dense() == original_cff.to_dense()
@@ -0,0 +1,46 @@
+import pytest
+
+from mtsssigner import signer
+from mtsssigner.signer import pre_sign, pre_sign_stream, sign_raw, sign_stream
+from mtsssigner.signature_scheme import SigScheme
+from mtsssigner.utils.file_and_block_utils import count_txt_blocks, iterate_txt_blocks
+
+PRIVATE_KEY = "keys/ed25519_priv.pem"
+
+
+def test_txt_blocks_are_streamed_as_split(tmp_path):
+    message_path = str(tmp_path / "message.txt")
+    for content in ["", "a", "a\n", "a\r\nb\n\nc", "\n\n"]:
+        with open(message_path, "w", encoding="utf-8", newline="") as message_file:
+            message_file.write(content)
+        expected = content.replace("\r\n", "\n").split("\n")
+        assert list(iterate_txt_blocks(message_path)) == expected
+        assert count_txt_blocks(message_path) == len(expected)
+
+
+@pytest.mark.parametrize("options", [{"k": 1}, {"k": 3, "padding": True},
+                                     {"construction": "steiner", "parameters": {"v": 45, "n": 300}},
+                                     {"construction": "kronecker", "group_size": 30, "parameters": {
+                                         "first": {"construction": "steiner", "parameters": {"v": 9, "n": 10}},
+                                         "second": {"construction": "steiner", "parameters": {"v": 15, "n": 30}}}}])
+def test_streamed_signature_matches_in_memory_signature(tmp_path, monkeypatch, options):
+    # several chunks, the last one incomplete
+    monkeypatch.setattr(signer, "STREAM_CHUNK_BLOCKS", 7)
+    message_path = str(tmp_path / "message.txt")
+    with open(message_path, "w", encoding="utf-8") as message_file:
+        message_file.write("\n".join(f"line {line % 40} é" for line in range(300)))
+    sig_scheme = SigScheme("Ed25519")
+    assert (sign_stream(*pre_sign_stream(sig_scheme, message_path, PRIVATE_KEY, **options)) ==
+            sign_raw(*pre_sign(sig_scheme, message_path, PRIVATE_KEY, **options)))
+
+
+def test_stream_must_have_the_announced_number_of_blocks(tmp_path):
+    message_path = str(tmp_path / "message.txt")
+    with open(message_path, "w", encoding="utf-8") as message_file:
+        message_file.write("\n".join(str(line) for line in range(10)))
+    sig_scheme, blocks, n, private_key, cff, header, hierarchical = pre_sign_stream(
+        SigScheme("Ed25519"), message_path, PRIVATE_KEY, k=1)
+    with pytest.raises(ValueError):
+        sign_stream(sig_scheme, iter(list(blocks)[:9]), n, private_key, cff)
+    with pytest.raises(ValueError):
+        sign_stream(sig_scheme, iter([str(line) for line in range(11)]), n, private_key, cff)
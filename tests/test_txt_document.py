@@ -0,0 +1,106 @@
+import os
+
+from mtsssigner.digest_matrix import get_buffer_digest_matrix
+from mtsssigner.signature_scheme import SigScheme
+from mtsssigner.signer import Signer, sign, sign_stream, pre_sign_stream
+from mtsssigner.utils.file_and_block_utils import (count_txt_blocks, get_correction_file_path,
+                                                   get_message_and_blocks_from_file, map_txt_file,
+                                                   write_correction_to_file, write_signature_to_file)
+from mtsssigner.verifier import verify, verify_and_correct
+
+SIG_SCHEME = SigScheme("Ed25519")
+
+
+def __write(path, content: bytes) -> str:
+    with open(path, "wb") as file:
+        file.write(content)
+    return str(path)
+
+
+def test_mapped_document_has_the_blocks_of_the_text(tmp_path, monkeypatch):
+    monkeypatch.setattr("mtsssigner.utils.file_and_block_utils.TXT_SCAN_CHUNK_BYTES", 7)
+    for content in [b"", b"\n", b"a", "first\nsécond\n\nlast line\n".encode(), b"no final line break\nend"]:
+        path = __write(tmp_path / "message.txt", content)
+        _, blocks = get_message_and_blocks_from_file(path)
+        with map_txt_file(path) as document:
+            assert len(document) == count_txt_blocks(path) == len(blocks)
+            assert list(document) == document.get_blocks() == [block.encode() for block in blocks]
+            digests = get_buffer_digest_matrix(SIG_SCHEME, document.buffer, document.starts, document.ends, 10)
+            assert [row.tobytes() for row in digests] == [SIG_SCHEME.get_digest(block)
+                                                          for block in blocks + [""] * (10 - len(blocks))]
+    # "\r\n" and a lone "\r" are line breaks of text files, translated to "\n"
+    for content in [b"a\r\nb\rc", b"\r", b"\r\r\n\n", b"a\xff\r\nb\n"]:
+        path = __write(tmp_path / "message.txt", content)
+        translated = content.replace(b"\r\n", b"\n").replace(b"\r", b"\n")
+        with map_txt_file(path) as document:
+            assert len(document) == count_txt_blocks(path)
+            assert document.get_blocks() == translated.split(b"\n")
+            assert b"".join(document.get_message_chunks()) == translated
+
+
+def test_mapped_signature_is_the_text_signature(tmp_path):
+    content = "\n".join(f"línea {line}" for line in range(120)).encode()
+    path = __write(tmp_path / "message.txt", content)
+    expected = sign(SIG_SCHEME, path, "keys/ed25519_priv.pem", k=2)
+    assert sign_stream(*pre_sign_stream(SIG_SCHEME, path, "keys/ed25519_priv.pem", k=2)) == expected
+    assert Signer(SIG_SCHEME, "keys/ed25519_priv.pem", k=2).sign_file(path) == expected
+    crlf_path = __write(tmp_path / "crlf.txt", content.replace(b"\n", b"\r\n"))
+    assert sign_stream(*pre_sign_stream(SIG_SCHEME, crlf_path, "keys/ed25519_priv.pem", k=2)) == expected
+
+
+def test_binary_lines_are_signed_and_located(tmp_path):
+    lines = [bytes([line, 0xff, 0xfe, line]) for line in range(14, 63)]
+    path = __write(tmp_path / "message.txt", b"\n".join(lines))
+    signer = Signer(SIG_SCHEME, "keys/ed25519_priv.pem", k=2)
+    write_signature_to_file(signer.sign_file(path), path)
+    assert sign(SIG_SCHEME, path, "keys/ed25519_priv.pem", k=2) == signer.sign_file(path)
+    signature_path = str(tmp_path / "message_signature.mts")
+    assert verify(SIG_SCHEME, path, signature_path, "keys/ed25519_pub.pem") == (True, [])
+    lines[5] = b"\x80modified"
+    __write(tmp_path / "message.txt", b"\n".join(lines))
+    assert verify(SIG_SCHEME, path, signature_path, "keys/ed25519_pub.pem") == (True, [5])
+    os.remove(path)
+
+
+def test_binary_lines_are_corrected(tmp_path):
+    lines = [bytes([line, 0xff, line]) for line in range(14, 63)]
+    # the first block is found by brute force, the second among the repeated lines
+    lines[2] = b"\xfe"
+    lines[7] = lines[8] = lines[9] = b"\x80 a repeated line, too long to be found by brute force"
+    original = b"\n".join(lines)
+    path = __write(tmp_path / "message.txt", original)
+    write_signature_to_file(sign(SIG_SCHEME, path, "keys/ed25519_priv.pem", k=2), path)
+    lines[2] = b"\x81"
+    lines[8] = b"m"
+    __write(tmp_path / "message.txt", b"\n".join(lines))
+    result = verify(SIG_SCHEME, path, str(tmp_path / "message_signature.mts"), "keys/ed25519_pub.pem")
+    assert result == (True, [2, 8])
+    correction = verify_and_correct(result, SIG_SCHEME, path)[2]
+    write_correction_to_file(path, correction)
+    with open(get_correction_file_path(path), "rb") as correction_file:
+        assert correction_file.read() == original
+
+
+def test_binary_crlf_lines_are_signed_and_corrected(tmp_path):
+    lines = [bytes([line, 0xff, line]) for line in range(14, 63)]
+    lines[3] = b"\xfe"
+    path = __write(tmp_path / "message.txt", b"\r\n".join(lines))
+    signature = sign(SIG_SCHEME, path, "keys/ed25519_priv.pem", k=2)
+    assert Signer(SIG_SCHEME, "keys/ed25519_priv.pem", k=2).sign_file(path) == signature
+    assert signature == sign(SIG_SCHEME, __write(tmp_path / "lf.txt", b"\n".join(lines)), "keys/ed25519_priv.pem",
+                             k=2)
+    write_signature_to_file(signature, path)
+    signature_path = str(tmp_path / "message_signature.mts")
+    assert verify(SIG_SCHEME, path, signature_path, "keys/ed25519_pub.pem") == (True, [])
+
+    modified_lines = list(lines)
+    modified_lines[3] = b"\x81"
+    __write(tmp_path / "message.txt", b"\r\n".join(modified_lines))
+    result = verify(SIG_SCHEME, path, signature_path, "keys/ed25519_pub.pem")
+    assert result == (True, [3])
+    write_correction_to_file(path, verify_and_correct(result, SIG_SCHEME, path)[2])
+    # the correction is the signed message, whose line breaks are "\n"
+    correction_path = get_correction_file_path(path)
+    with open(correction_path, "rb") as correction_file:
+        assert correction_file.read() == b"\n".join(lines)
+    assert verify(SIG_SCHEME, correction_path, signature_path, "keys/ed25519_pub.pem") == (True, [])
@@ -1,63 +1,66 @@
-import functools
+import argparse
+import glob
+import json
+import os
 import sys
-from multiprocessing import Pool
-from typing import List
-
-from numpy import logical_or
-
-from mtsssigner.cff_builder import *
-
-
-def get_column(i, cff) -> List[int]:
-    return [row[i] for row in cff]
-
-
-def get_columns(cff):
-    columns = []
-    for column in range(len(cff[0])):
-        columns.append(get_column(column, cff))
-    return columns
-
-
-def convert_bool(list):
-    result = []
-    for element in list:
-        result.append(element == 1)
-    return result
-
-
-def test_cff(q, k):
-    d = get_d(q, k)
-    cff = create_cff(q, k)
-    numpy.set_printoptions(threshold=sys.maxsize)
-    assert sorted(set(tuple(map(tuple, cff)))) == sorted(tuple(map(tuple, cff)))
-    result = itertools.combinations(range(len(cff)), d)
-    columns = get_columns(cff)
-    columns = [convert_bool(column) for column in columns]
-    columns_str = [str(column) for column in columns]
-
-    test_combination = functools.partial(
-        test_column_combination,
-        columns=columns)
-
-    with Pool(8) as process_pool:
-        for result in process_pool.imap(
-                test_combination,
-                result):
-            pass
-
-
-def test_column_combination(combination, columns: List[List[int]]) -> bool:
-    test_column = columns[combination[0]]
-    for column in combination[1:]:
-        test_column = logical_or(test_column, columns[column])
-    for index, column in enumerate(columns):
-        if index in combination:
-            continue
-        if (str(logical_or(test_column, column)) == str(test_column)):
-            print(index)
-            print(False)
-
-
-if __name__ == '__main__':
-    test_cff(8, 2)
+from timeit import default_timer as timer
+
+from mtsssigner import cff_cache
+from mtsssigner.cff import CFF
+from mtsssigner.cff_constructions import get_construction
+from mtsssigner.utils.cff_file_utils import CFF_DIRECTORY, CFF_FILE_EXTENSION, read_cff_from_binary_file
+from mtsssigner.utils.cff_validation_utils import find_d_disjunctness_violation, get_default_workers
+
+# Checks that CFFs are d-disjunct: no block is covered by d other blocks.
+# python validate_cff.py [cff files...] [--construction name --parameters json] [--d d] [--workers w]
+# Without files or construction, every CFF of the cffs/ store and of the persistent
+# cache directory is validated. The first violation of each invalid CFF is printed,
+# and the exit code is 1 when any CFF is invalid.
+
+
+def validate(name: str, cff: CFF, d: int, workers: int) -> bool:
+    start = timer()
+    violation = find_d_disjunctness_violation(cff, d, workers)
+    end = timer()
+    if violation is None:
+        print(f"{name}: valid {d or cff.d}-CFF({cff.t}, {cff.n}), {end - start:.3f} s", flush=True)
+        return True
+    block, covering = violation
+    print(f"{name}: invalid, the tests of block {block} are covered by blocks {list(covering)}", flush=True)
+    return False
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Checks that CFFs are d-disjunct")
+    parser.add_argument("files", nargs="*", help="binary CFF files")
+    parser.add_argument("--construction", default="", help="name of a registered CFF construction")
+    parser.add_argument("--parameters", default="{}", help="construction parameters, as JSON")
+    parser.add_argument("--d", type=int, default=0, help="d to check instead of the declared d")
+    parser.add_argument("--workers", type=int, default=get_default_workers(), help="size of the process pool")
+    arguments = parser.parse_args()
+
+    cffs = []
+    if arguments.construction:
+        parameters = json.loads(arguments.parameters)
+        cffs.append((f"{arguments.construction} {arguments.parameters}",
+                     lambda: get_construction(arguments.construction).create(parameters)))
+    files = arguments.files
+    if not files and not arguments.construction:
+        for directory in [CFF_DIRECTORY, cff_cache.cache_directory]:
+            if directory:
+                files.extend(sorted(glob.glob(os.path.join(glob.escape(directory), f"*.{CFF_FILE_EXTENSION}"))))
+    for file_path in files:
+        cffs.append((file_path, lambda file_path=file_path: read_cff_from_binary_file(file_path)))
+
+    invalid = 0
+    for name, read in cffs:
+        try:
+            invalid += not validate(name, read(), arguments.d, arguments.workers)
+        except ValueError as exception:
+            print(f"{name}: {exception}", flush=True)
+            invalid += 1
+    return 1 if invalid else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
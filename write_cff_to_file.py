@@ -1,30 +1,18 @@
 import sys
 
 from mtsssigner.cff_builder import *
+from mtsssigner.utils.cff_file_utils import get_cff_file_path, write_cff_to_binary_file
 
 if __name__ == '__main__':
     q = int(sys.argv[1])
     k = int(sys.argv[2])
 
-    if k == 1:
-        # nesse caso q = n
-        cff = create_1_cff(q)
-        n = q
-        t = len(cff)
-        d = 1
+    if k == 1 or get_d(q, k) == 1:
+        # nesse caso q = n (ou q^k, quando a construção polinomial resulta em d = 1)
+        cff = create_1_cff(q ** k)
+        construction, q, k = "sperner", 0, 0
     else:
-        # seleciona 1-cff ou cff polinomial de acordo com d obtido
         cff = create_cff(q, k)
-        n = q ** k
-        t = q ** 2
-        d = get_d(q, k)
+        construction = "polynomial"
 
-    with open(f"cffs/{d}-CFF({t}, {n}).txt", "w", encoding="utf-8") as file:
-        for line in cff[:-1]:
-            file.write(str(line[0]))
-            for block in line[1:]:
-                file.write(f" {block}")
-            file.write("\n")
-        file.write(str(cff[-1][0]))
-        for block in cff[-1][1:]:
-            file.write(f" {block}")
+    write_cff_to_binary_file(SparseCFF.from_cff(cff), get_cff_file_path(cff.t, cff.n, cff.d), construction, q, k)